@@ -0,0 +1,139 @@
+import os
+import random
+import subprocess
+from typing import Any, Dict
+
+from src.probe import ProbeCache, ProbeInfo
+
+
+class ClipSpec:
+    """
+    一个合成测试片段的参数
+    """
+
+    def __init__(self, name: str, width: int, height: int, duration: float, frame_rate: float = 30.0,
+                 rotation: int = 0, audio_bit_rates: list[int] = None):
+        """
+        :param name: 文件名（不含扩展名）
+        :param width: 宽度
+        :param height: 高度
+        :param duration: 时长（秒）
+        :param frame_rate: 帧率
+        :param rotation: 旋转元信息（度）
+        :param audio_bit_rates: 每条 AAC 音轨的码率（bit/s），为空时没有音频
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.frame_rate = frame_rate
+        self.rotation = rotation
+        self.audio_bit_rates = audio_bit_rates or []
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.name}.mp4"
+
+    def stub_size(self) -> int:
+        """stub 模式下片段文件的字节数，约为 0.1 bit/像素"""
+        return int(self.width * self.height * self.frame_rate * self.duration / 80)
+
+    def to_probe(self, file_size: int) -> ProbeInfo:
+        """stub 模式下代替 MediaInfo 的探测结果"""
+        info: Dict[str, Any] = {
+            "file_size": file_size,
+            "has_video": True,
+            "duration": self.duration,
+            "width": self.width,
+            "height": self.height,
+            "frame_rate": self.frame_rate,
+            "frame_count": int(self.duration * self.frame_rate),
+            "rotation": float(self.rotation),
+            "video_codec": "AVC",
+            "bit_rate": int(file_size * 8 / self.duration),
+            "audio_tracks": [{"codec": "AAC", "profile": "LC", "bit_rate": bit_rate, "channels": 2,
+                              "sampling_rate": 48000} for bit_rate in self.audio_bit_rates],
+        }
+        return ProbeInfo(info)
+
+
+# 覆盖不同分辨率、时长、旋转与音轨组合：96 kbps 的 AAC 走直接复制，192 kbps 的会重新编码
+CLIPS = [
+    ClipSpec("sd_short", 640, 360, 20, audio_bit_rates=[96000]),
+    ClipSpec("hd_reencode_audio", 1280, 720, 60, audio_bit_rates=[192000]),
+    ClipSpec("hd_rotated", 1280, 720, 30, rotation=90, audio_bit_rates=[96000]),
+    ClipSpec("hd_two_tracks", 1280, 720, 30, audio_bit_rates=[96000, 192000]),
+    ClipSpec("fhd_silent", 1920, 1080, 30),
+    ClipSpec("vertical_60fps", 720, 1280, 15, frame_rate=60, audio_bit_rates=[128000]),
+]
+
+
+def generate_stub_clip(spec: ClipSpec, directory: str) -> str:
+    """
+    写出一个内容确定的伪视频文件，只用于 stub 编码器
+    :param spec: 片段参数
+    :param directory: 输出目录
+    :return: 文件路径
+    """
+    path = os.path.join(directory, spec.file_name)
+    rng = random.Random(spec.name)
+    block = rng.randbytes(1 << 16)
+    remaining = spec.stub_size()
+    with open(path, "wb") as f:
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+    return path
+
+
+def generate_real_clip(spec: ClipSpec, directory: str, ffmpeg: str) -> str:
+    """
+    用 ffmpeg 的 lavfi 测试源生成一个真实的 H.264/AAC 片段
+    :param spec: 片段参数
+    :param directory: 输出目录
+    :param ffmpeg: ffmpeg 路径
+    :return: 文件路径
+    """
+    path = os.path.join(directory, spec.file_name)
+    command = [ffmpeg, '-y', '-v', 'error', '-f', 'lavfi',
+               '-i', f"testsrc2=size={spec.width}x{spec.height}:rate={spec.frame_rate}:duration={spec.duration}"]
+    for i, _ in enumerate(spec.audio_bit_rates):
+        command += ['-f', 'lavfi', '-i', f"sine=frequency={440 * (i + 1)}:duration={spec.duration}"]
+    command += ['-map', '0:v']
+    for i, bit_rate in enumerate(spec.audio_bit_rates):
+        command += ['-map', f'{i + 1}:a', f'-c:a:{i}', 'aac', f'-b:a:{i}', str(bit_rate)]
+    command += ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p']
+    if spec.rotation:
+        command += ['-metadata:s:v:0', f'rotate={spec.rotation}']
+    subprocess.run(command + [path], check=True)
+    return path
+
+
+def generate_clips(directory: str, stub: bool, ffmpeg: str = "ffmpeg") -> list[str]:
+    """
+    Generate the benchmark clips
+
+    Args:
+        directory: Directory the clips are written to
+        stub: Write placeholder files for the stub encoders instead of real videos
+        ffmpeg: ffmpeg used to generate real clips
+
+    Returns:
+        Paths of the clips
+    """
+    os.makedirs(directory, exist_ok=True)
+    if stub:
+        return [generate_stub_clip(spec, directory) for spec in CLIPS]
+    return [generate_real_clip(spec, directory, ffmpeg) for spec in CLIPS]
+
+
+def seed_probe_cache(cache_dir: str, clip_paths: list[str]):
+    """
+    将 stub 片段的探测结果写入探测缓存，处理流程因此不会调用 MediaInfo
+    :param cache_dir: 缓存目录，与 compression_files 的 cache_dir 相同
+    :param clip_paths: generate_clips 返回的路径，与 CLIPS 一一对应
+    """
+    cache = ProbeCache(os.path.join(cache_dir, "probes.json"))
+    for spec, path in zip(CLIPS, clip_paths):
+        cache.put(path, spec.to_probe(os.path.getsize(path)))
+    cache.save()
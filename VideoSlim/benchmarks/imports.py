@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+VideoSlim - startup benchmark
+
+Imports each entry point in a fresh interpreter with -X importtime and reports the time spent
+importing it and the heavy third-party modules it pulled in. Those are only allowed to load on
+first use, so finding one at startup counts as a regression. Run from the VideoSlim directory:
+
+    python -m benchmarks.imports --output imports.json       # record a baseline
+    python -m benchmarks.imports --baseline imports.json     # compare with it
+
+Nothing but Python is needed: the heavy modules do not even have to be installed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from src.settings import META_INFO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口名 -> 启动时导入的模块
+ENTRY_POINTS = {
+    "gui": ["tkinter", "src.controller", "src.view"],
+    "cli": ["cli"],
+    "logic": ["src.logic"],
+}
+
+# 只能在第一次使用时导入的第三方模块
+LAZY_MODULES = ["requests", "pymediainfo", "windnd", "wx"]
+
+
+def measure_imports(modules: list[str]) -> dict:
+    """
+    在新的解释器中导入模块，解析 -X importtime 的输出
+    :param modules: 要导入的模块
+    :return: 导入耗时（秒）与导入的全部模块名
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {', '.join(modules)} 失败:\n{result.stderr}")
+
+    imported = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"，缩进表示嵌套层级
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported.append(name.strip())
+        if not name[1:].startswith(" "):
+            # 顶层导入的累计时间已包含其嵌套导入
+            total_us += int(cumulative)
+    return {"seconds": total_us / 1e6, "modules": imported}
+
+
+def run_entry_point(modules: list[str], repeat: int) -> dict:
+    """
+    Measure one entry point
+
+    Args:
+        modules: Modules imported at startup
+        repeat: Number of fresh interpreters, the median is reported
+
+    Returns:
+        Import time, number of modules and the lazy modules that were imported
+    """
+    runs = [measure_imports(modules) for _ in range(max(1, repeat))]
+    imported = runs[0]["modules"]
+    eager = sorted({name.split(".")[0] for name in imported} & set(LAZY_MODULES))
+    return {
+        "import_seconds": round(statistics.median(run["seconds"] for run in runs), 4),
+        "modules": len(imported),
+        "eager_imports": eager,
+        "runs": len(runs),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare a run with a baseline
+
+    Args:
+        results: Results of this run
+        baseline: Results of an earlier run
+        tolerance: Allowed relative slowdown of the import time, e.g. 0.2 for 20%
+
+    Returns:
+        One line per regression, empty when there is none
+    """
+    regressions = []
+    for name, current in results["entry_points"].items():
+        previous = baseline.get("entry_points", {}).get(name)
+        if not previous:
+            continue
+        ratio = current["import_seconds"] / previous["import_seconds"] if previous["import_seconds"] else 1.0
+        print(f"{name:8} {previous['import_seconds'] * 1000:8.1f}ms -> {current['import_seconds'] * 1000:8.1f}ms "
+              f"({ratio - 1:+.1%})")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: import time {ratio - 1:+.1%}")
+    return regressions
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="VideoSlim startup benchmark")
+    parser.add_argument("-e", "--entry-point", action="append", choices=list(ENTRY_POINTS),
+                        help="entry point to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters per entry point, the median is reported")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with results written earlier by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed import-time slowdown against the baseline (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    results = {
+        "version": META_INFO["VERSION"],
+        "python": platform.python_version(),
+        "machine": {"system": platform.system(), "cpu_count": os.cpu_count()},
+        "entry_points": {},
+    }
+    failed = False
+    for name in args.entry_point or ENTRY_POINTS:
+        summary = run_entry_point(ENTRY_POINTS[name], args.repeat)
+        results["entry_points"][name] = summary
+        print(f"{name:8} {summary['import_seconds'] * 1000:8.1f}ms  {summary['modules']:5} modules")
+        for module in summary["eager_imports"]:
+            print(f"  error: {module} is imported at startup")
+            failed = True
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
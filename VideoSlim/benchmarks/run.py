@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+VideoSlim - pipeline benchmarks
+
+Generates synthetic clips, compresses them with compression_files under a few scenarios and
+reports wall time, per-stage time, temporary bytes written and files per hour. Run from the
+VideoSlim directory:
+
+    python -m benchmarks.run --output bench.json                 # stub encoders, no tools needed
+    python -m benchmarks.run --baseline bench.json               # compare with an earlier run
+    python -m benchmarks.run --real --tool x264=/usr/bin/x264 ...  # real encoders
+
+Stub mode needs nothing but Python and a POSIX shell: no GPU, no network, no encoders.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from queue import Queue
+
+from benchmarks.clips import CLIPS, generate_clips, seed_probe_cache
+from src.config import Config
+from src.logic import compression_files, is_output_file
+from src.message import CompressionErrorMessage, ErrorMessage
+from src.metrics import get_stage_kind
+from src.settings import META_INFO
+
+STUB_TOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_tool.py")
+
+# 场景名 -> 在默认配置之上覆盖的参数
+SCENARIOS = {
+    "serial": {"max_parallel_jobs": 1},
+    "parallel": {"max_parallel_jobs": 4},
+    "temp_files": {"max_parallel_jobs": 1, "streaming": False},
+    "cost_schedule": {"max_parallel_jobs": 4, "schedule": {"mode": "cost"}},
+}
+
+
+class _MetricsHandler(logging.Handler):
+    """收集处理流程日志中附带的阶段耗时与临时文件字节数"""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.stage_seconds: dict[str, float] = {}
+        self.temp_bytes = 0
+
+    def emit(self, record: logging.LogRecord):
+        if hasattr(record, "stage_seconds"):
+            stage = get_stage_kind(record.stage)
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + record.stage_seconds
+        if hasattr(record, "temp_bytes"):
+            self.temp_bytes += record.temp_bytes
+
+
+def write_stub_tools(directory: str) -> dict[str, str]:
+    """
+    为每个工具写一个调用 stub_tool.py 的 shell 脚本
+    :param directory: 脚本所在目录
+    :return: 工具名 -> 脚本路径
+    """
+    tools = {}
+    for name in META_INFO["TOOLS"]:
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{STUB_TOOL}" {name} "$@"\n')
+        os.chmod(path, 0o755)
+        tools[name] = path
+    return tools
+
+
+def remove_outputs(directory: str):
+    """删除上一次运行生成的 *_x264.mp4"""
+    for name in os.listdir(directory):
+        if is_output_file(name):
+            os.remove(os.path.join(directory, name))
+
+
+def run_scenario(overrides: dict, clip_dir: str, clip_paths: list[str], work_dir: str, tools: dict[str, str],
+                 stub: bool) -> dict:
+    """
+    Compress all clips once under one scenario
+
+    Args:
+        overrides: Config values of the scenario
+        clip_dir: Directory holding the clips
+        clip_paths: The clips
+        work_dir: Scratch directory of the run
+        tools: Paths of the external tools
+        stub: Whether stub encoders are used; their probe results are seeded into the cache
+
+    Returns:
+        Metrics of the run
+    """
+    remove_outputs(clip_dir)
+    cache_dir = tempfile.mkdtemp(prefix="cache_", dir=work_dir)
+    temp_root = tempfile.mkdtemp(prefix="temp_", dir=work_dir)
+    if stub:
+        seed_probe_cache(cache_dir, clip_paths)
+
+    handler = _MetricsHandler()
+    logging.getLogger().addHandler(handler)
+    queue = Queue()
+    try:
+        start = time.perf_counter()
+        # 不向工作目录追加指标记录
+        config = Config(dict({"metrics": {"records_file": ""}}, **overrides))
+        compression_files(queue, config, False, False, clip_paths, False,
+                          META_INFO["VIDEO_EXTENSIONS"], temp_root, cache_dir, tools)
+        wall = time.perf_counter() - start
+    finally:
+        logging.getLogger().removeHandler(handler)
+
+    errors = []
+    while not queue.empty():
+        message = queue.get()
+        if isinstance(message, (ErrorMessage, CompressionErrorMessage)):
+            errors.append(message.message)
+
+    output_bytes = sum(os.path.getsize(os.path.join(clip_dir, name))
+                       for name in os.listdir(clip_dir) if is_output_file(name))
+    return {
+        "wall_seconds": wall,
+        "files": len(clip_paths),
+        "files_per_hour": len(clip_paths) / wall * 3600,
+        "temp_bytes": handler.temp_bytes,
+        "output_bytes": output_bytes,
+        "stage_seconds": handler.stage_seconds,
+        "errors": errors,
+    }
+
+
+def summarize(runs: list[dict]) -> dict:
+    """取多次运行的中位数，减小偶然波动"""
+    wall = statistics.median(run["wall_seconds"] for run in runs)
+    stages = {stage: statistics.median(run["stage_seconds"].get(stage, 0.0) for run in runs)
+              for stage in sorted({stage for run in runs for stage in run["stage_seconds"]})}
+    return {
+        "wall_seconds": round(wall, 4),
+        "files": runs[0]["files"],
+        "files_per_hour": round(runs[0]["files"] / wall * 3600, 1),
+        "temp_bytes": runs[0]["temp_bytes"],
+        "output_bytes": runs[0]["output_bytes"],
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "runs": len(runs),
+        "errors": sorted({error for run in runs for error in run["errors"]}),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare a run with a baseline
+
+    Args:
+        results: Results of this run
+        baseline: Results of an earlier run
+        tolerance: Allowed relative slowdown of the wall time, e.g. 0.1 for 10%
+
+    Returns:
+        One line per regression, empty when there is none
+    """
+    if baseline.get("mode") != results["mode"]:
+        print(f"warning: baseline was recorded in {baseline.get('mode')} mode, this run is {results['mode']}")
+
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        ratio = current["wall_seconds"] / previous["wall_seconds"] if previous["wall_seconds"] else 1.0
+        print(f"{name:16} {previous['wall_seconds']:9.3f}s -> {current['wall_seconds']:9.3f}s ({ratio - 1:+.1%})")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: wall time {ratio - 1:+.1%}")
+        if current["temp_bytes"] > previous["temp_bytes"]:
+            regressions.append(f"{name}: temp bytes {previous['temp_bytes']} -> {current['temp_bytes']}")
+    return regressions
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="VideoSlim pipeline benchmarks")
+    parser.add_argument("--real", action="store_true",
+                        help="use real encoders and MediaInfo instead of the stub tools")
+    parser.add_argument("--tool", action="append", default=[], metavar="NAME=PATH",
+                        help=f"tool path in --real mode, NAME is one of: {', '.join(META_INFO['TOOLS'])}")
+    parser.add_argument("-s", "--scenario", action="append", choices=list(SCENARIOS),
+                        help="scenario to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the median is reported")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with results written earlier by --output")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed wall-time slowdown against the baseline (default: 0.1)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated clips and scratch files")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    # INFO 记录要交给 _MetricsHandler，终端只显示警告与错误
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    logging.getLogger().addHandler(console)
+    logging.getLogger().setLevel(logging.INFO)
+
+    work_dir = tempfile.mkdtemp(prefix="videoslim_bench_")
+    try:
+        if args.real:
+            tools = {"ffmpeg": "ffmpeg", "x264": "x264", "neroaacenc": "neroAacEnc", "mp4box": "MP4Box"}
+            for tool in args.tool:
+                name, _, path = tool.partition("=")
+                tools[name] = path
+        else:
+            tools = write_stub_tools(tempfile.mkdtemp(prefix="bin_", dir=work_dir))
+
+        clip_dir = os.path.join(work_dir, "clips")
+        clip_paths = generate_clips(clip_dir, not args.real, tools["ffmpeg"])
+
+        results = {
+            "mode": "real" if args.real else "stub",
+            "version": META_INFO["VERSION"],
+            "python": platform.python_version(),
+            "machine": {"system": platform.system(), "cpu_count": os.cpu_count()},
+            "clips": [spec.name for spec in CLIPS],
+            "scenarios": {},
+        }
+        for name in args.scenario or SCENARIOS:
+            runs = [run_scenario(SCENARIOS[name], clip_dir, clip_paths, work_dir, tools, not args.real)
+                    for _ in range(max(1, args.repeat))]
+            summary = summarize(runs)
+            results["scenarios"][name] = summary
+            stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in summary["stage_seconds"].items())
+            print(f"{name:16} {summary['wall_seconds']:9.3f}s  {summary['files_per_hour']:10.0f} files/h  "
+                  f"temp {summary['temp_bytes']:>12} B  [{stages}]")
+            for error in summary["errors"]:
+                print(f"  error: {error}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    failed = any(summary["errors"] for summary in results["scenarios"].values())
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Stand-in for ffmpeg, x264, neroAacEnc and MP4Box in stub-mode benchmarks
+
+Invoked as ``stub_tool.py <tool> <args of the real tool>``. Each stub understands just the
+command lines VideoSlim builds, moves a deterministic amount of data through the same pipes
+and files the real tool would, and prints x264-style progress, so the orchestration cost of
+a batch can be measured without any encoder installed.
+"""
+
+import hashlib
+import os
+import sys
+
+CHUNK_SIZE = 1 << 16
+
+# 输出体积相对于输入的比例
+RAW_VIDEO_FACTOR = 4
+X264_RATIO = 8
+AUDIO_RATIO = 16
+
+# VideoSlim 传给 x264 的不带值的选项，其余选项都带一个值
+X264_FLAGS = {"--opencl"}
+
+
+def _read_input(path: str):
+    """逐块读取输入文件，"-" 表示 stdin"""
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def _write_output(path: str, size: int):
+    """写出 size 字节，"-" 表示 stdout"""
+    stream = sys.stdout.buffer if path == "-" else open(path, "wb")
+    block = b"\0" * CHUNK_SIZE
+    try:
+        while size > 0:
+            stream.write(block[:min(size, CHUNK_SIZE)])
+            size -= CHUNK_SIZE
+        stream.flush()
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+
+
+def _option(args: list[str], name: str, default: str = None) -> str:
+    return args[args.index(name) + 1] if name in args else default
+
+
+def _positionals(args: list[str], flags: set[str]) -> list[str]:
+    """
+    取出不属于任何选项的参数；除 flags 中的开关外，每个选项都带一个值，"-" 本身是参数（stdin）
+    :param args: 命令行参数
+    :param flags: 不带值的选项
+    :return: 按顺序排列的位置参数
+    """
+    positionals = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("-") and arg != "-":
+            i += 1 if arg in flags else 2
+        else:
+            positionals.append(arg)
+            i += 1
+    return positionals
+
+
+def ffmpeg(args: list[str]):
+    source = os.path.getsize(_option(args, "-i"))
+    output = args[-1]
+    fmt = _option(args, "-f")
+
+    if fmt == "segment":
+        _write_output(output % 0, source)
+    elif fmt == "yuv4mpegpipe":
+        _write_output(output, source * RAW_VIDEO_FACTOR)
+    elif fmt == "wav":
+        _write_output(output, source // AUDIO_RATIO * 4)
+    else:
+        # -c copy of one audio track
+        _write_output(output, max(1, source // AUDIO_RATIO))
+
+
+def x264(args: list[str]):
+    output = _option(args, "-o")
+    digest = hashlib.sha1()
+    total = 0
+    source = _positionals(args, X264_FLAGS)[0]
+    for frames, chunk in enumerate(_read_input(source), 1):
+        # 哈希让耗时与数据量成正比，近似编码器的工作量
+        digest.update(chunk)
+        total += len(chunk)
+        sys.stderr.write(f"{frames} frames: 100.00 fps, 1000.00 kb/s\r")
+    sys.stderr.flush()
+    _write_output(output, max(1, total // X264_RATIO))
+
+
+def neroaacenc(args: list[str]):
+    total = sum(len(chunk) for chunk in _read_input(_option(args, "-if")))
+    _write_output(_option(args, "-of"), max(1, total // 4))
+
+
+def mp4box(args: list[str]):
+    inputs = [args[i + 1].split("#")[0] for i, arg in enumerate(args) if arg in ("-add", "-cat")]
+    _write_output(_option(args, "-new"), sum(os.path.getsize(path) for path in inputs))
+
+
+TOOLS = {"ffmpeg": ffmpeg, "x264": x264, "neroaacenc": neroaacenc, "mp4box": mp4box}
+
+
+if __name__ == '__main__':
+    TOOLS[sys.argv[1]](sys.argv[2:])
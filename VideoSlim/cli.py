@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+VideoSlim - headless batch runner
+
+Runs the same compression pipeline as the GUI without tkinter and prints every message
+as one JSON object per line on stdout, e.g.:
+
+    python cli.py --config default --recurse /data/videos
+    python cli.py --manifest batch.txt --tool x264=/usr/bin/x264 --tool ffmpeg=/usr/bin/ffmpeg
+    python cli.py --watch /data/ingest --settle 30
+    python cli.py --serve 0.0.0.0:9300 --token secret --recurse /data/videos   # coordinator
+    python cli.py --worker coordinator:9300 --token secret                     # on every worker
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from queue import Empty
+from typing import Iterable, Iterator
+
+from src.controller import Controller
+from src.distributed import parse_address, run_worker
+from src.message import CompressionErrorMessage, ErrorMessage, ExitMessage, Message
+from src.settings import META_INFO, setup_logging
+from src.watch import FolderWatcher
+
+
+def iter_manifest(manifest: str) -> Iterator[str]:
+    """
+    Read the input paths listed in a manifest, lazily
+
+    A ".json" manifest holds a list of paths or an object with a "files" list. Any other
+    manifest is a text file with one path per line; "-" reads such a list from stdin.
+
+    Args:
+        manifest: Path of the manifest
+
+    Yields:
+        Input paths
+    """
+    if manifest.lower().endswith(".json"):
+        with open(manifest, encoding="utf-8") as f:
+            data = json.load(f)
+        yield from data["files"] if isinstance(data, dict) else data
+        return
+
+    stream = sys.stdin if manifest == "-" else open(manifest, encoding="utf-8")
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def iter_inputs(paths: list[str], manifests: list[str]) -> Iterable[str]:
+    """按顺序给出命令行路径与所有清单中的路径"""
+    yield from paths
+    for manifest in manifests:
+        yield from iter_manifest(manifest)
+
+
+def read_tools(config_file: str, overrides: list[str]) -> dict[str, str]:
+    """
+    External tool paths: the defaults, then the "tools" section of the config file, then --tool
+
+    Args:
+        config_file: Path of config.json; a missing or unreadable file is skipped
+        overrides: "NAME=PATH" values of --tool
+
+    Returns:
+        Tool name -> path
+
+    Raises:
+        ValueError: An override names an unknown tool or has no path
+    """
+    tools = dict(META_INFO["TOOLS"])
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, encoding="utf-8") as f:
+                tools.update(json.load(f).get("tools", {}))
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"读取配置文件 {config_file} 中的工具路径失败: {e}")
+    for tool in overrides:
+        name, _, path = tool.partition("=")
+        if name not in tools or not path:
+            raise ValueError(f"无效的工具参数: {tool}")
+        tools[name] = path
+    return tools
+
+
+def write_message(message: Message):
+    """将一条消息以 JSON 行的形式写到 stdout"""
+    sys.stdout.write(json.dumps(message.to_dict(), ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="VideoSlim headless batch runner")
+    parser.add_argument("paths", nargs="*", help="video files or directories to compress")
+    parser.add_argument("-m", "--manifest", action="append", default=[],
+                        help="file listing input paths (one per line, or a .json list); '-' reads stdin")
+    parser.add_argument("-c", "--config", help="name of the config in the config file (default: the first one)")
+    parser.add_argument("--config-file", default=META_INFO["CONFIG_FILE"], help="path of config.json")
+    parser.add_argument("-r", "--recurse", action="store_true", help="walk directories recursively")
+    parser.add_argument("--delete-audio", action="store_true", help="drop audio tracks")
+    parser.add_argument("--delete-source", action="store_true", help="delete sources after compression")
+    parser.add_argument("--tool", action="append", default=[], metavar="NAME=PATH",
+                        help=f"override an encoder tool path, NAME is one of: {', '.join(META_INFO['TOOLS'])}")
+    parser.add_argument("-w", "--watch", action="append", default=[], metavar="DIR",
+                        help="keep running and compress new or changed videos under DIR (Ctrl+C stops)")
+    parser.add_argument("--settle", type=float, default=10.0,
+                        help="seconds a watched file must stay unchanged before it is queued (default: 10)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between checks in watch mode (default: 2)")
+    parser.add_argument("--backlog", type=int, default=100,
+                        help="maximum number of ready files queued in watch mode (default: 100)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="distribute the batch to workers that connect to this address instead of encoding here")
+    parser.add_argument("--worker", metavar="HOST:PORT",
+                        help="run as a worker: encode files leased from the coordinator at this address")
+    parser.add_argument("--shared", action="store_true",
+                        help="with --serve: workers reach the sources under the same paths (shared storage), "
+                             "otherwise sources and outputs are streamed over the connection")
+    parser.add_argument("--token", default="", help="token workers must present to the coordinator")
+    parser.add_argument("--lease", type=float, default=60.0,
+                        help="with --serve: seconds without a heartbeat before a job is re-queued (default: 60)")
+    parser.add_argument("--name", help="with --worker: name reported to the coordinator (default: host name)")
+    parser.add_argument("--log-file", default="log.txt",
+                        help="path of the log file, rotated by size; JSON records go to the same name with .jsonl")
+    parser.add_argument("--job-log-dir", default=META_INFO["JOB_LOG_DIR"],
+                        help="directory of the per-file logs of the external tools' output, empty to disable")
+    parser.add_argument("--check-updates", action="store_true", help="check GitHub for a newer release")
+    return parser.parse_args(argv)
+
+
+def run_worker_mode(args: argparse.Namespace) -> int:
+    """
+    Process files leased from a coordinator; the config comes from the coordinator
+
+    Returns:
+        Process exit code: 0 once the coordinator has no files left, 1 if it cannot be reached,
+        2 if a --tool value is invalid
+    """
+    try:
+        tools = read_tools(args.config_file, args.tool)
+    except ValueError as e:
+        write_message(ErrorMessage("错误", str(e)))
+        return 2
+    try:
+        run_worker(parse_address(args.worker, "127.0.0.1"), tools, META_INFO["TEMP_DIR"], args.name, args.token)
+    except (ConnectionError, OSError) as e:
+        write_message(ErrorMessage("错误", f"无法连接协调节点 {args.worker}: {e}"))
+        return 1
+    return 0
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Run one batch and stream its messages to stdout
+
+    Returns:
+        Process exit code: 0 on success, 1 if any error was reported, 2 if the arguments are invalid
+    """
+    if args.serve and args.watch:
+        # 协调节点先列出全部输入再开始分配，而监视目录的输入永远不会结束
+        write_message(ErrorMessage("错误", "--serve 不能与 --watch 同时使用"))
+        return 2
+
+    meta_info = dict(META_INFO, CONFIG_FILE=args.config_file)
+    controller = Controller(meta_info, check_updates=args.check_updates)
+    failed = False
+
+    try:
+        controller.tools = read_tools(args.config_file, args.tool)
+    except ValueError as e:
+        write_message(ErrorMessage("错误", str(e)))
+        return 2
+
+    watcher = None
+    inputs = iter_inputs(args.paths, args.manifest)
+    if args.watch:
+        watcher = FolderWatcher(args.watch, meta_info["VIDEO_EXTENSIONS"], settle_time=args.settle,
+                                poll_interval=args.poll_interval, backlog=args.backlog)
+        inputs = watcher
+
+    bus = controller.queue
+    done = False
+
+    def on_error(message: Message):
+        nonlocal failed
+        failed = True
+
+    def on_exit(message: ExitMessage):
+        nonlocal done
+        done = True
+
+    bus.subscribe(Message, write_message)
+    bus.subscribe(ErrorMessage, on_error)
+    bus.subscribe(CompressionErrorMessage, on_error)
+    bus.subscribe(ExitMessage, on_exit)
+
+    thread = None
+    if controller.configs_name_list:
+        config_name = args.config or controller.configs_name_list[0]
+        if args.serve:
+            thread = controller.serve(config_name, args.delete_audio, args.delete_source, inputs, args.recurse,
+                                      parse_address(args.serve), args.shared, args.token, args.lease)
+        else:
+            thread = controller.compression(config_name, args.delete_audio, args.delete_source, inputs,
+                                            args.recurse, watch=watcher is not None)
+        failed = thread is None
+
+    # Dispatch messages until the worker is done and nothing is left on the bus
+    while not done:
+        try:
+            bus.dispatch(bus.get(timeout=0.2))
+        except Empty:
+            if thread is None or not thread.is_alive():
+                break
+        except KeyboardInterrupt:
+            if watcher is None:
+                raise
+            # Stop watching, let the jobs already started finish
+            watcher.stop()
+            watcher = None
+
+    return 1 if failed or not controller.configs_name_list else 0
+
+
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    setup_logging(args.log_file, args.job_log_dir)
+    if args.worker:
+        return run_worker_mode(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,2 @@
 from .config import *
 from .controller import *
-from .view import *
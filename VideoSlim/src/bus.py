@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from collections import deque
+from queue import Empty
+from typing import Callable, Optional
+
+from .message import Message
+
+
+class MessageBus:
+    """
+    Thread-safe message bus between the workers and the UI or a headless consumer
+
+    Producers call put(), so it can replace a queue.Queue wherever send_message() is used.
+    Messages with a coalesce key (e.g. encoder progress) replace the pending message with the
+    same key instead of queueing behind it, so a fast producer never grows the backlog. A
+    consumer either subscribes handlers per message type and calls dispatch_pending(), or reads
+    messages one by one with get().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        # 待处理的消息，合并消息在队列中只占一个位置，值保存在 _latest 中
+        self._pending: deque = deque()
+        self._latest: dict[tuple, Message] = {}
+        self._handlers: dict[type, list[Callable[[Message], None]]] = {}
+        self._waker: Optional[Callable[[], None]] = None
+
+    def subscribe(self, message_type: type, handler: Callable[[Message], None]):
+        """
+        注册消息处理函数，子类消息也会交给父类的处理函数
+        :param message_type: 消息类型
+        :param handler: 处理函数，在调用 dispatch_pending 的线程中执行
+        """
+        self._handlers.setdefault(message_type, []).append(handler)
+
+    def set_waker(self, waker: Optional[Callable[[], None]]):
+        """
+        设置唤醒函数：总线由空变为非空时在发送消息的线程中调用，用于通知消费者尽快处理
+        :param waker: 唤醒函数，None 表示取消
+        """
+        self._waker = waker
+
+    def put(self, message: Message):
+        """
+        发送一条消息，可在任意线程调用
+        :param message: 消息
+        """
+        key = message.coalesce_key()
+        with self._lock:
+            was_empty = not self._pending
+            if key is None:
+                self._pending.append(message)
+            else:
+                if key not in self._latest:
+                    self._pending.append(key)
+                self._latest[key] = message
+            self._not_empty.notify()
+
+        waker = self._waker
+        if was_empty and waker:
+            try:
+                waker()
+            except Exception as e:
+                logging.debug(f"唤醒消息消费者失败: {e}")
+
+    def _pop(self) -> Message:
+        item = self._pending.popleft()
+        return self._latest.pop(item) if isinstance(item, tuple) else item
+
+    def get(self, timeout: float = None) -> Message:
+        """
+        Take the next message, waiting for one if the bus is empty
+
+        Args:
+            timeout: Longest wait in seconds, None waits forever
+
+        Raises:
+            queue.Empty: If no message arrived in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while not self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._not_empty.wait(remaining)
+            return self._pop()
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not self._pending
+
+    def drain(self) -> list[Message]:
+        """取出当前所有待处理的消息"""
+        with self._lock:
+            messages = [self._pop() for _ in range(len(self._pending))]
+        return messages
+
+    def dispatch(self, message: Message):
+        """
+        将一条消息交给已注册的处理函数
+        :param message: 消息
+        """
+        for message_type in type(message).__mro__:
+            for handler in self._handlers.get(message_type, ()):
+                handler(message)
+
+    def dispatch_pending(self) -> int:
+        """
+        处理当前所有待处理的消息，应在消费者线程（如 Tk 主线程）中调用
+        :return: 处理的消息数
+        """
+        messages = self.drain()
+        for message in messages:
+            try:
+                self.dispatch(message)
+            except Exception as e:
+                # 一个处理函数出错不影响其余消息
+                logging.error(f"处理消息 {type(message).__name__} 失败: {e}")
+        return len(messages)
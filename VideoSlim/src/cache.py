@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional
+
+from .config import Config
+from .tools import save_json_atomic
+
+# 部分哈希只读取文件开头和结尾各 1 MiB，避免为大文件读完整内容
+PARTIAL_HASH_BLOCK = 1024 * 1024
+
+
+def get_partial_hash(file_path: str, size: int) -> str:
+    """
+    计算文件的部分内容哈希（开头、结尾各一块以及文件大小）
+    :param file_path: 文件路径
+    :param size: 文件大小
+    :return: 十六进制哈希字符串
+    """
+    digest = hashlib.sha1(str(size).encode())
+    with open(file_path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BLOCK))
+        if size > PARTIAL_HASH_BLOCK:
+            f.seek(max(size - PARTIAL_HASH_BLOCK, PARTIAL_HASH_BLOCK))
+            digest.update(f.read(PARTIAL_HASH_BLOCK))
+    return digest.hexdigest()
+
+
+def get_encode_key(config: Config, delete_audio: bool) -> str:
+    """
+    将所有影响输出内容的参数汇总为一个键，参数变化后旧的结果不会被复用
+    :param config: 压缩配置
+    :param delete_audio: 是否删除音频轨道
+    :return: 十六进制哈希字符串
+    """
+    params = {
+        "crf": config.X264.crf,
+        "preset": config.X264.preset,
+        "I": config.X264.I,
+        "r": config.X264.r,
+        "b": config.X264.b,
+        "opencl_acceleration": config.X264.opencl_acceleration,
+        "delete_audio": delete_audio,
+        "audio_copy": config.audio_copy,
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    持久化的压缩结果索引
+
+    以源文件指纹（大小、修改时间、部分内容哈希）加编码参数为键记录已生成的输出。
+    源文件的 stat 与上次一致时直接复用记录的哈希，命中判断无需读取文件内容。
+    可被多个工作线程同时调用。
+    """
+
+    # 累积这么多条新记录后写一次磁盘
+    SAVE_INTERVAL = 20
+
+    def __init__(self, cache_file: str):
+        """
+        :param cache_file: 索引文件路径，不存在时会自动创建
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        # 路径 -> {size, mtime_ns, hash}
+        self._sources: Dict[str, Dict[str, Any]] = {}
+        # 指纹 + 编码参数 -> {output, output_size}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            self._sources = data.get("sources", {})
+            self._results = data.get("results", {})
+            logging.info(f"已加载压缩结果缓存，共 {len(self._results)} 条记录")
+        except Exception as e:
+            logging.warning(f"读取压缩结果缓存 {self.cache_file} 失败，将重新建立: {e}")
+
+    def _fingerprint(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        with self._lock:
+            source = self._sources.get(key)
+        if source and source["size"] == stat.st_size and source["mtime_ns"] == stat.st_mtime_ns:
+            partial_hash = source["hash"]
+        else:
+            partial_hash = get_partial_hash(file_path, stat.st_size)
+            with self._lock:
+                self._sources[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": partial_hash}
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{partial_hash}"
+
+    def lookup(self, file_path: str, output_path: str, encode_key: str) -> bool:
+        """
+        Check whether the source has already been encoded with the same parameters
+
+        When the recorded output lives at another path (e.g. the source was copied), it is
+        copied to output_path instead of being encoded again.
+
+        Args:
+            file_path: Source video path
+            output_path: Expected output path for the source
+            encode_key: Key returned by get_encode_key
+
+        Returns:
+            True if output_path now holds a valid result
+        """
+        try:
+            key = f"{self._fingerprint(file_path)}|{encode_key}"
+            with self._lock:
+                result = self._results.get(key)
+            if not result:
+                return False
+
+            if os.path.exists(output_path) and os.path.getsize(output_path) == result["output_size"]:
+                return True
+
+            recorded = result["output"]
+            if os.path.exists(recorded) and os.path.getsize(recorded) == result["output_size"]:
+                logging.info(f"复用已有的压缩结果 {recorded} -> {output_path}")
+                shutil.copy2(recorded, output_path)
+                return True
+        except Exception as e:
+            logging.warning(f"查询压缩结果缓存失败 {file_path}: {e}")
+        return False
+
+    def has_result(self, file_path: str, encode_key: str) -> bool:
+        """
+        只根据 stat 判断源文件是否可能已有结果，不读取文件内容也不复制输出
+        :param file_path: 源文件路径
+        :param encode_key: get_encode_key 返回的键
+        :return: 源文件与记录一致且有对应参数的结果时为 True；为 False 时仍可能由 lookup 命中
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        with self._lock:
+            source = self._sources.get(os.path.abspath(file_path))
+            if not source or source["size"] != stat.st_size or source["mtime_ns"] != stat.st_mtime_ns:
+                return False
+            return f"{stat.st_size}:{stat.st_mtime_ns}:{source['hash']}|{encode_key}" in self._results
+
+    def record(self, file_path: str, output_path: str, encode_key: str):
+        """
+        记录一次成功的压缩
+        :param file_path: 源文件路径
+        :param output_path: 生成的输出文件路径
+        :param encode_key: get_encode_key 返回的键
+        """
+        try:
+            fingerprint = self._fingerprint(file_path)
+            with self._lock:
+                self._results[f"{fingerprint}|{encode_key}"] = {
+                    "output": os.path.abspath(output_path),
+                    "output_size": os.path.getsize(output_path),
+                }
+                self._unsaved += 1
+                should_save = self._unsaved >= self.SAVE_INTERVAL
+            if should_save:
+                self.save()
+        except Exception as e:
+            logging.warning(f"记录压缩结果失败 {file_path}: {e}")
+
+    def save(self):
+        """将索引原子地写入磁盘"""
+        with self._lock:
+            data = {"sources": dict(self._sources), "results": dict(self._results)}
+            self._unsaved = 0
+        try:
+            with self._save_lock:
+                save_json_atomic(self.cache_file, data)
+        except Exception as e:
+            logging.warning(f"保存压缩结果缓存失败: {e}")
+
+
+def open_result_cache(cache_dir: Optional[str]) -> Optional[ResultCache]:
+    """
+    打开缓存目录下的压缩结果索引
+    :param cache_dir: 缓存目录，为空时不使用缓存
+    :return: ResultCache 或 None
+    """
+    if not cache_dir:
+        return None
+    return ResultCache(os.path.join(cache_dir, "results.json"))
@@ -0,0 +1,223 @@
+from typing import Any, Dict
+
+from .config import Config
+from .settings import META_INFO
+
+# AAC 音轨的编码码率（bit/s）
+AUDIO_BIT_RATE = 128000
+
+
+def get_x264_command(config: Config, input_path: str, output_path: str, demuxer: str = None,
+                     tools: dict[str, str] = None, threads: int = 0) -> list[str]:
+    """
+    Build the x264 command line for a video stream
+
+    Args:
+        config: Compression configuration
+        input_path: Source file read by x264, or "-" for stdin
+        output_path: File x264 writes the encoded stream to
+        demuxer: Input demuxer to force, required when reading raw frames from stdin
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        threads: Encoder threads, 0 leaves x264's default (1.5 per core)
+
+    Returns:
+        Argument list of the x264 command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    command = [
+        tools["x264"],
+        '--crf', str(config.X264.crf), '--preset', str(config.X264.preset),
+        '-I', str(config.X264.I), '-r', str(config.X264.r), '-b', str(config.X264.b),
+        '--me', 'umh', '-i', '1', '--scenecut', '60', '-f', '1:1', '--qcomp', '0.5', '--psy-rd', '0.3:0',
+        '--aq-mode', '2', '--aq-strength', '0.8', '-o', output_path, input_path
+    ]
+    if demuxer:
+        command[1:1] = ['--demuxer', demuxer]
+    if threads:
+        command[1:1] = ['--threads', str(threads)]
+    if config.X264.opencl_acceleration:
+        command.append('--opencl')
+    return command
+
+
+def get_y4m_decode_command(input_path: str, tools: dict[str, str] = None, threads: int = 0,
+                           start: float = None, duration: float = None) -> list[str]:
+    """
+    Build an ffmpeg command that decodes the video to Y4M on stdout
+
+    ffmpeg applies the rotation from the container metadata while decoding, so the frames
+    it writes are already upright.
+
+    Args:
+        input_path: Source file
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        threads: Decoder threads, 0 leaves ffmpeg's default
+        start: Seek to this time (seconds) before decoding
+        duration: Decode only this many seconds
+
+    Returns:
+        Argument list of the ffmpeg command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    command = [tools['ffmpeg'], '-v', '0']
+    if threads:
+        command += ['-threads', str(threads)]
+    if start is not None:
+        command += ['-ss', f"{start:.3f}"]
+    command += ['-i', input_path]
+    if duration is not None:
+        command += ['-t', f"{duration:.3f}"]
+    return command + ['-an', '-sn', '-pix_fmt', 'yuv420p', '-f', 'yuv4mpegpipe', '-']
+
+
+def get_video_encode_commands(config: Config, input_path: str, output_path: str, rotate: bool,
+                              tools: dict[str, str] = None, threads: int = 0) -> list[list[str]]:
+    """
+    Build the pipeline that encodes the video stream of a file
+
+    Args:
+        config: Compression configuration
+        input_path: Source file
+        output_path: File the encoded stream is written to
+        rotate: Whether the source carries rotation metadata; the frames are then decoded
+            and rotated by ffmpeg and piped into x264 instead of being read by x264 directly
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        threads: Thread budget of the encode, 0 leaves the tools' defaults
+
+    Returns:
+        Argument lists of the pipeline, see run_pipeline
+    """
+    if rotate:
+        return [get_y4m_decode_command(input_path, tools, threads),
+                get_x264_command(config, '-', output_path, demuxer='y4m', tools=tools, threads=threads)]
+    return [get_x264_command(config, input_path, output_path, tools=tools, threads=threads)]
+
+
+def can_copy_audio(track: Dict[str, Any]) -> bool:
+    """
+    Check whether an audio track can go into the output as it is
+
+    Only AAC-LC at or below the bitrate the track would be re-encoded at qualifies. A track
+    whose bitrate MediaInfo cannot report is re-encoded to be safe.
+
+    Args:
+        track: Audio track from the probe result, see ProbeInfo.audio_tracks
+
+    Returns:
+        True if the track can be stream-copied
+    """
+    return (track.get("codec") == "AAC" and track.get("profile", "") in ("", "LC")
+            and 0 < track.get("bit_rate", 0) <= AUDIO_BIT_RATE)
+
+
+def get_audio_copy_command(input_path: str, track: int, output_path: str, tools: dict[str, str] = None) -> list[str]:
+    """
+    Build an ffmpeg command that demuxes one audio track without re-encoding it
+
+    Args:
+        input_path: Source file
+        track: Index of the track among the source's audio tracks
+        output_path: MP4 file the track is written to
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the ffmpeg command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    return [tools['ffmpeg'], '-v', '0', '-i', input_path, '-map', f'0:a:{track}', '-c', 'copy',
+            '-f', 'mp4', '-y', output_path]
+
+
+def get_audio_decode_command(input_path: str, track: int, output_path: str = '-',
+                             tools: dict[str, str] = None) -> list[str]:
+    """
+    Build an ffmpeg command that decodes one audio track to 16-bit PCM WAV
+
+    Args:
+        input_path: Source file
+        track: Index of the track among the source's audio tracks
+        output_path: WAV file to write, or "-" for stdout
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the ffmpeg command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    return [tools['ffmpeg'], '-i', input_path, '-map', f'0:a:{track}', '-vn', '-sn', '-v', '0',
+            '-c:a', 'pcm_s16le', '-f', 'wav', output_path]
+
+
+def get_aac_encode_command(input_path: str, output_path: str, tools: dict[str, str] = None) -> list[str]:
+    """
+    Build a neroAacEnc command that encodes WAV to AAC-LC at AUDIO_BIT_RATE
+
+    Args:
+        input_path: WAV file to read, or "-" for stdin
+        output_path: MP4 file the AAC stream is written to
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the neroAacEnc command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    return [tools['neroaacenc'], '-ignorelength', '-lc', '-br', str(AUDIO_BIT_RATE),
+            '-of', output_path, '-if', input_path]
+
+
+def get_mux_command(video_path: str, audio_paths: list[str], output_path: str,
+                    tools: dict[str, str] = None) -> list[str]:
+    """
+    Build an mp4box command that muxes a video stream and audio tracks into a new file
+
+    Args:
+        video_path: MP4 file holding the encoded video
+        audio_paths: MP4 files holding one audio track each, in output order
+        output_path: File to create
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the mp4box command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    command = [tools['mp4box'], '-add', f'{video_path}#trackID=1:name=']
+    for audio_path in audio_paths:
+        command += ['-add', f'{audio_path}#trackID=1:name=']
+    return command + ['-new', output_path]
+
+
+def get_split_command(input_path: str, segment_duration: float, output_pattern: str,
+                      tools: dict[str, str] = None) -> list[str]:
+    """
+    Build an ffmpeg command that copies the video stream into segments cut at keyframes
+
+    Args:
+        input_path: Source file
+        segment_duration: Target length of a segment in seconds
+        output_pattern: Segment file name pattern, e.g. "seg_%05d.mp4"
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the ffmpeg command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    return [tools['ffmpeg'], '-v', '0', '-i', input_path, '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-segment_time', str(segment_duration), '-reset_timestamps', '1', output_pattern]
+
+
+def get_join_command(input_paths: list[str], output_path: str, tools: dict[str, str] = None) -> list[str]:
+    """
+    Build an mp4box command that concatenates encoded segments losslessly
+
+    Args:
+        input_paths: Segment files in playback order
+        output_path: File to create
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+
+    Returns:
+        Argument list of the mp4box command
+    """
+    tools = tools or META_INFO["TOOLS"]
+    command = [tools['mp4box'], '-add', input_paths[0]]
+    for path in input_paths[1:]:
+        command += ['-cat', path]
+    return command + ['-new', output_path]
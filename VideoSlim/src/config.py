@@ -14,6 +14,7 @@ def get_default_configs():
         "configs": {
             "default": get_default_config(),
             "custom_template": {
+                "max_parallel_jobs": 2,
                 "x264": {
                     "crf": 30,
                     "preset": 8,
@@ -48,13 +49,89 @@ def _get_default_x264_config() -> Dict[str, Any]:
     }
 
 
+def _get_default_schedule_config() -> Dict[str, Any]:
+    return {
+        "mode": "fifo",
+        "priorities": {}
+    }
+
+
+def _get_default_segment_config() -> Dict[str, Any]:
+    return {
+        "enabled": False,
+        "min_duration": 1800,
+        "segment_duration": 300,
+        "max_workers": 0
+    }
+
+
+def _get_default_predict_config() -> Dict[str, Any]:
+    return {
+        "enabled": False,
+        "samples": 3,
+        "sample_duration": 10,
+        "min_saving": 0.1
+    }
+
+
+def _get_default_metrics_config() -> Dict[str, Any]:
+    return {
+        "records_file": "",
+        "prometheus_file": ""
+    }
+
+
+def _get_default_scratch_config() -> Dict[str, Any]:
+    return {
+        "hot_dir": "",
+        "dirs": [],
+        "reserve_mb": 1024
+    }
+
+
+def _get_default_governor_config() -> Dict[str, Any]:
+    return {
+        "enabled": True,
+        "threads": 0,
+        "affinity": False,
+        "nice": 0
+    }
+
+
+def _get_default_throughput_config() -> Dict[str, Any]:
+    return {
+        "mode": "off",
+        "files_per_hour": 0,
+        "deadline": "",
+        "min_preset": 0
+    }
+
+
+def _get_default_dedup_config() -> Dict[str, Any]:
+    return {
+        "enabled": False,
+        "link": "hardlink"
+    }
+
+
 def get_default_config() -> Dict[str, Any]:
     """
     默认配置
     :return:
     """
     return {
-        "x264": _get_default_x264_config()
+        "max_parallel_jobs": 1,
+        "streaming": True,
+        "audio_copy": True,
+        "x264": _get_default_x264_config(),
+        "schedule": _get_default_schedule_config(),
+        "segment": _get_default_segment_config(),
+        "predict": _get_default_predict_config(),
+        "metrics": _get_default_metrics_config(),
+        "scratch": _get_default_scratch_config(),
+        "governor": _get_default_governor_config(),
+        "throughput": _get_default_throughput_config(),
+        "dedup": _get_default_dedup_config()
     }
 
 
@@ -108,6 +185,180 @@ class _X264Config:
         self._preset = clamp(value, 0, 9)
 
 
+class _ScheduleConfig:
+    """
+    ScheduleConfig类用于管理批次内文件的处理顺序。
+    """
+
+    MODES = ("fifo", "cost")
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化ScheduleConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_schedule_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # fifo: 按发现顺序边扫描边处理；cost: 扫描并探测完全部文件后按预计耗时从长到短处理
+        self.mode = fixed_config_dict["mode"] if fixed_config_dict["mode"] in self.MODES else "fifo"
+        # 路径通配符 -> 优先级，数值越大越先处理，未匹配的文件优先级为 0
+        self.priorities: Dict[str, int] = {pattern: int(priority)
+                                           for pattern, priority in fixed_config_dict["priorities"].items()}
+
+
+class _SegmentConfig:
+    """
+    SegmentConfig类用于管理长视频的分段并行编码。
+    """
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化SegmentConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_segment_config()
+        fixed_config_dict.update(config_dict or {})
+
+        self.enabled = bool(fixed_config_dict["enabled"])
+        # 时长达到该值（秒）的视频才分段
+        self.min_duration = float(fixed_config_dict["min_duration"])
+        # 每段的目标时长（秒），实际在其后的第一个关键帧处切分
+        self.segment_duration = max(1.0, float(fixed_config_dict["segment_duration"]))
+        # 同时编码的分段数，0 表示按 CPU 核数与 max_parallel_jobs 自动决定
+        self.max_workers = max(0, int(fixed_config_dict["max_workers"]))
+
+
+class _PredictConfig:
+    """
+    PredictConfig类用于管理压缩前的抽样预测。
+    """
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化PredictConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_predict_config()
+        fixed_config_dict.update(config_dict or {})
+
+        self.enabled = bool(fixed_config_dict["enabled"])
+        # 抽样编码的片段数与每段时长（秒）
+        self.samples = max(1, int(fixed_config_dict["samples"]))
+        self.sample_duration = max(1.0, float(fixed_config_dict["sample_duration"]))
+        # 预计体积节省比例低于该值（0-1）的文件不压缩，保留源文件
+        self.min_saving = clamp(float(fixed_config_dict["min_saving"]), 0, 1)
+
+
+class _MetricsConfig:
+    """
+    MetricsConfig类用于管理各处理阶段资源使用指标的导出。
+    """
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化MetricsConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_metrics_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # 每个文件与每个批次的指标以 JSON 行追加到该文件，为空时不写
+        self.records_file = str(fixed_config_dict["records_file"] or "")
+        # 批次结束时写出的 Prometheus textfile，为空时不写
+        self.prometheus_file = str(fixed_config_dict["prometheus_file"] or "")
+
+
+class _ScratchConfig:
+    """
+    ScratchConfig类用于管理中间文件的存放位置与剩余空间。
+    """
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化ScratchConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_scratch_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # 优先使用的高速临时目录，例如 Linux 的 tmpfs（/dev/shm）或本地 SSD，为空时不使用
+        self.hot_dir = str(fixed_config_dict["hot_dir"] or "")
+        # 其余临时目录，按顺序尝试，最后才使用默认临时目录
+        self.dirs = [str(directory) for directory in fixed_config_dict["dirs"]]
+        # 每个临时目录所在磁盘至少保留的剩余空间（MB）
+        self.reserve_mb = max(0, int(fixed_config_dict["reserve_mb"]))
+
+
+class _GovernorConfig:
+    """
+    GovernorConfig类用于管理各任务的编码器线程数、CPU 绑定与优先级。
+    """
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化GovernorConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_governor_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # 是否在并行任务之间分配 CPU，关闭后各编码器使用默认线程数
+        self.enabled = bool(fixed_config_dict["enabled"])
+        # 每个任务的编码器线程数，0 表示按核心数与并行任务数自动分配
+        self.threads = max(0, int(fixed_config_dict["threads"]))
+        # 是否将每个任务绑定到分配给它的 CPU 上
+        self.affinity = bool(fixed_config_dict["affinity"])
+        # 编码进程的 nice 值（-20 ~ 19），Windows 下换算为进程优先级类别
+        self.nice = clamp(int(fixed_config_dict["nice"]), -20, 19)
+
+
+class _ThroughputConfig:
+    """
+    ThroughputConfig类用于管理按吞吐目标自动选择 preset。
+    """
+
+    MODES = ("off", "files_per_hour", "deadline")
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化ThroughputConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_throughput_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # off: 使用固定的 preset；files_per_hour: 达到每小时文件数；deadline: 在截止时间前完成批次
+        self.mode = fixed_config_dict["mode"] if fixed_config_dict["mode"] in self.MODES else "off"
+        # 目标每小时完成的文件数
+        self.files_per_hour = max(0.0, float(fixed_config_dict["files_per_hour"]))
+        # 批次截止时间，"HH:MM" 或 ISO 8601 时间
+        self.deadline = str(fixed_config_dict["deadline"] or "")
+        # 自动选择时允许的最快 preset，x264 中配置的 preset 是最慢（压缩率最高）的一档
+        self.min_preset = clamp(int(fixed_config_dict["min_preset"]), 0, 9)
+
+
+class _DedupConfig:
+    """
+    DedupConfig类用于管理批次内内容相同文件的去重。
+    """
+
+    LINK_MODES = ("hardlink", "copy")
+
+    def __init__(self, config_dict: Dict[str, Any] = None):
+        """
+        初始化DedupConfig对象，从配置字典中获取参数，并设置默认值。
+        :param config_dict:
+        """
+        fixed_config_dict = _get_default_dedup_config()
+        fixed_config_dict.update(config_dict or {})
+
+        # 是否在开始前找出内容完全相同的文件，每组只压缩一次
+        self.enabled = bool(fixed_config_dict["enabled"])
+        # hardlink: 副本的输出硬链接到同一份结果，不支持时改为复制；copy: 总是复制
+        self.link = fixed_config_dict["link"] if fixed_config_dict["link"] in self.LINK_MODES else "hardlink"
+
+
 class Config:
     """Configuration class for VideoSlim"""
 
@@ -125,4 +376,21 @@ class Config:
         self.name = fixed_config_dict.get("name", "default")
         logging.debug(f"配置名称设置为: {self.name}")
 
+        # 同时压缩的文件数量，至少为 1
+        self.max_parallel_jobs = max(1, int(fixed_config_dict["max_parallel_jobs"]))
+
+        # 是否用管道连接各处理阶段，关闭后会像旧版本一样先写出 WAV 临时文件
+        self.streaming = bool(fixed_config_dict["streaming"])
+
+        # 源音轨已是码率不高于目标码率的 AAC-LC 时直接复制，不再解码重编码
+        self.audio_copy = bool(fixed_config_dict["audio_copy"])
+
         self.X264 = _X264Config(fixed_config_dict["x264"])
+        self.schedule = _ScheduleConfig(fixed_config_dict["schedule"])
+        self.segment = _SegmentConfig(fixed_config_dict["segment"])
+        self.predict = _PredictConfig(fixed_config_dict["predict"])
+        self.metrics = _MetricsConfig(fixed_config_dict["metrics"])
+        self.scratch = _ScratchConfig(fixed_config_dict["scratch"])
+        self.governor = _GovernorConfig(fixed_config_dict["governor"])
+        self.throughput = _ThroughputConfig(fixed_config_dict["throughput"])
+        self.dedup = _DedupConfig(fixed_config_dict["dedup"])
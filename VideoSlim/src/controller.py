@@ -1,22 +1,38 @@
 import json
 import logging
 import threading
+from typing import Iterable, Optional
 
+from .bus import MessageBus
+from .distributed import Coordinator, is_loopback
 from .config import *
 from .message import *
 from .logic import *
 
+# 启动后等待多少秒再检查更新
+UPDATE_CHECK_DELAY = 3.0
+
 
 class Controller:
-    def __init__(self, meta_info: dict[str, Any]):
-        self.queue = Queue()
+    def __init__(self, meta_info: dict[str, Any], check_updates: bool = True):
+        # 后台线程发给界面或命令行的消息总线，与 queue.Queue 一样用 put() 发送
+        self.queue = MessageBus()
         self.configs_name_list = []
         self.meta_info = meta_info
         self.configs_dict = {}
+        # 各配置在配置文件中的原始参数，分布式模式下原样发给工作节点
+        self.configs_params = {}
+        # 外部工具路径，config.json 中的 "tools" 会覆盖默认值
+        self.tools = dict(meta_info["TOOLS"])
 
         self._read_config()
 
-        threading.Thread(target=check_for_updates, args=(self.queue, self.meta_info["VERSION"]), daemon=True).start()
+        if check_updates:
+            # 推迟检查，启动阶段不与窗口创建争抢时间
+            timer = threading.Timer(UPDATE_CHECK_DELAY, check_for_updates,
+                                    args=(self.queue, self.meta_info["VERSION"], self.meta_info["CACHE_DIR"]))
+            timer.daemon = True
+            timer.start()
 
     def _read_config(self):
         """Read configuration from file or create default configuration"""
@@ -36,7 +52,9 @@ class Controller:
                 # Load configs from file
                 logging.info(f"正在从配置文件加载配置: {self.meta_info['CONFIG_FILE']}")
                 with open(self.meta_info["CONFIG_FILE"], encoding="utf-8") as f:
-                    configs = json.load(f)["configs"]
+                    data = json.load(f)
+                configs = data["configs"]
+                self.tools.update(data.get("tools", {}))
                 logging.info(f"成功从配置文件加载了 {len(configs)} 个配置")
 
             # Process each config
@@ -51,6 +69,7 @@ class Controller:
                 # Register valid config
                 params["name"] = name
                 self.configs_dict[name] = Config(params)
+                self.configs_params[name] = params
                 self.configs_name_list.append(name)
                 logging.info(f"成功注册配置: {name}")
 
@@ -70,18 +89,62 @@ class Controller:
             send_message(self.queue, ErrorMessage("错误", f"读取配置文件失败: {e}"))
             send_message(self.queue, ExitMessage())
 
-    def compression(self, config_name: str, delete_audio: bool, delete_source: bool, file_paths: list[str],
-                    recurse: bool):
-        """Start video compression process"""
+    def compression(self, config_name: str, delete_audio: bool, delete_source: bool, file_paths: Iterable[str],
+                    recurse: bool, watch: bool = False) -> Optional[threading.Thread]:
+        """
+        Start video compression process
+
+        Args:
+            watch: file_paths is a FolderWatcher that never ends
+
+        Returns:
+            The worker thread, or None if the config does not exist
+        """
         if not config_name in self.configs_name_list:
             send_message(self.queue, WarningMessage("错误", f"配置文件 {config_name} 不存在"))
-            return
+            return None
 
         logging.info(f"加载了配置：{self.configs_dict[config_name]}")
 
         config = self.configs_dict[config_name]
 
-        threading.Thread(target=compression_files,
-                         args=(self.queue, config, delete_audio, delete_source, file_paths, recurse,
-                               self.meta_info["VIDEO_EXTENSIONS"], self.meta_info["TEMP_FILES"]),
-                         daemon=True).start()
+        thread = threading.Thread(target=compression_files,
+                                  args=(self.queue, config, delete_audio, delete_source, file_paths, recurse,
+                                        self.meta_info["VIDEO_EXTENSIONS"], self.meta_info["TEMP_DIR"],
+                                        self.meta_info["CACHE_DIR"], self.tools, watch),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, config_name: str, delete_audio: bool, delete_source: bool, file_paths: Iterable[str],
+              recurse: bool, address: tuple[str, int], shared: bool = False, token: str = "",
+              lease_seconds: float = 60.0) -> Optional[threading.Thread]:
+        """
+        Start a distributed batch: the files are handed to worker processes that connect to address
+
+        Returns:
+            The coordinator thread, or None if the config does not exist or the address is reachable
+            from other machines without a token
+        """
+        if not config_name in self.configs_name_list:
+            send_message(self.queue, WarningMessage("错误", f"配置文件 {config_name} 不存在"))
+            return None
+        if not token and not is_loopback(address[0]):
+            # 任何能连接的人都可以下载源文件
+            send_message(self.queue, WarningMessage("错误", f"监听 {address[0]} 时必须用 --token 设置口令"))
+            return None
+
+        coordinator = Coordinator(self.queue, self.configs_params[config_name], delete_audio, delete_source,
+                                  shared, token, lease_seconds, cache_dir=self.meta_info["CACHE_DIR"])
+
+        def run():
+            try:
+                coordinator.add_files(file_paths, recurse, self.meta_info["VIDEO_EXTENSIONS"])
+                coordinator.run(address)
+            except Exception as e:
+                logging.error(f"分布式压缩失败: {e}")
+                send_message(self.queue, CompressionErrorMessage("错误", f"发生错误！\n{e}"))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
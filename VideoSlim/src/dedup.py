@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import os
+import shutil
+from typing import Callable, Dict, List, Tuple
+
+from .cache import get_partial_hash
+
+# 计算完整哈希时每次读取的字节数
+_HASH_CHUNK = 4 * 1024 * 1024
+
+
+def get_full_hash(file_path: str) -> str:
+    """
+    计算文件完整内容的 SHA-256
+    :param file_path: 文件路径
+    :return: 十六进制哈希字符串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _split_groups(groups: List[List[str]], key: Callable[[str], str]) -> List[List[str]]:
+    """按 key 把每组再细分，只保留仍有多个文件的组；无法读取的文件单独成组（即不参与去重）"""
+    result = []
+    for group in groups:
+        buckets: Dict[str, List[str]] = {}
+        for path in group:
+            try:
+                buckets.setdefault(key(path), []).append(path)
+            except OSError as e:
+                logging.warning(f"读取文件 {path} 失败，不参与去重: {e}")
+        result += [bucket for bucket in buckets.values() if len(bucket) > 1]
+    return result
+
+
+def find_duplicates(file_paths: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Find byte-identical files in a batch
+
+    Files are grouped by size first, which costs one stat per file. Only files sharing a size
+    are hashed, first over their head and tail (see get_partial_hash) and, when those match
+    too, over their whole content. Most batches therefore read little or nothing.
+
+    Args:
+        file_paths: Files of the batch
+
+    Returns:
+        The files to encode, in their original order, and a map from each of them to the
+        later files with identical content
+    """
+    sizes: Dict[int, List[str]] = {}
+    for path in file_paths:
+        try:
+            sizes.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:
+            # 无法读取的文件照常交给处理流程，由它报告错误
+            pass
+
+    groups = [group for group in sizes.values() if len(group) > 1]
+    groups = _split_groups(groups, lambda path: get_partial_hash(path, os.path.getsize(path)))
+    groups = _split_groups(groups, get_full_hash)
+
+    order = {path: i for i, path in enumerate(file_paths)}
+    duplicates: Dict[str, List[str]] = {}
+    for group in groups:
+        group.sort(key=order.get)
+        duplicates[group[0]] = group[1:]
+
+    skipped = {path for copies in duplicates.values() for path in copies}
+    if skipped:
+        logging.info(f"发现 {len(skipped)} 个与其他文件内容相同的文件，每组只压缩一次")
+    return [path for path in file_paths if path not in skipped], duplicates
+
+
+def link_output(source: str, target: str, mode: str = "hardlink"):
+    """
+    Make a finished output available under another path
+
+    Args:
+        source: The encoded output
+        target: Path the copy should appear at; an existing file there is replaced
+        mode: "hardlink" links the file and falls back to copying when the file system
+            cannot (e.g. across drives or on FAT), "copy" always copies
+
+    Raises:
+        OSError: If neither linking nor copying works
+    """
+    temp = f"{target}.part"
+    if os.path.exists(temp):
+        os.remove(temp)
+    if mode == "hardlink":
+        try:
+            os.link(source, temp)
+        except OSError as e:
+            logging.debug(f"无法建立硬链接 {temp}，改为复制: {e}")
+            shutil.copy2(source, temp)
+    else:
+        shutil.copy2(source, temp)
+    os.replace(temp, target)
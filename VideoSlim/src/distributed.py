@@ -0,0 +1,615 @@
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from queue import Queue
+from typing import Any, Dict, IO, Iterable, List, Optional
+
+from .cache import get_encode_key, open_result_cache
+from .config import Config
+from .governor import CpuGovernor
+from .logic import (clean_temp_dir, create_job_temp_dir, get_output_filename, iter_video_files, process_single_file,
+                    send_message)
+from .message import *
+
+PROTOCOL_VERSION = 1
+
+# 一行 JSON 头的最大长度，防止异常连接占用内存
+_MAX_HEADER = 64 * 1024
+# 传输文件时每次读写的字节数
+_CHUNK = 1024 * 1024
+# 全部任务结束后继续应答的最长时间（秒），让等待重试的工作节点收到 done 后自行断开
+SHUTDOWN_GRACE = 10.0
+
+
+def parse_address(address: str, default_host: str = "0.0.0.0") -> tuple[str, int]:
+    """
+    解析 "HOST:PORT" 或 "PORT" 形式的地址
+    :param address: 地址
+    :param default_host: 只给出端口时使用的主机
+    :return: (主机, 端口)
+    """
+    host, _, port = address.rpartition(":")
+    return host or default_host, int(port)
+
+
+def is_loopback(host: str) -> bool:
+    """
+    判断监听地址是否只能从本机访问
+    :param host: 主机名或 IP
+    :return: 为本机回环地址时为 True
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _send(wfile: IO[bytes], header: Dict[str, Any], payload: IO[bytes] = None):
+    """
+    发送一条消息：一行 JSON 头，若头中有 size 则其后紧跟 size 个字节的数据
+    :param wfile: 连接的写端
+    :param header: 消息头
+    :param payload: 数据来源，从当前位置读取 header["size"] 个字节
+    """
+    wfile.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+    if payload is not None:
+        _copy(payload, wfile, header["size"])
+    wfile.flush()
+
+
+def _receive(rfile: IO[bytes]) -> Dict[str, Any]:
+    """
+    读取一条消息头，数据部分（如有）留在连接中由调用者读取
+    :param rfile: 连接的读端
+    :return: 消息头
+    :raises ConnectionError: 连接已关闭或消息头无效
+    """
+    line = rfile.readline(_MAX_HEADER)
+    if not line.endswith(b"\n"):
+        raise ConnectionError("连接已关闭")
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise ConnectionError(f"无效的消息: {e}")
+
+
+def _copy(source: IO[bytes], target: Optional[IO[bytes]], size: int):
+    """从 source 复制恰好 size 个字节到 target，target 为 None 时丢弃"""
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(min(_CHUNK, remaining))
+        if not chunk:
+            raise ConnectionError("传输中断")
+        if target is not None:
+            target.write(chunk)
+        remaining -= len(chunk)
+
+
+def _receive_file(rfile: IO[bytes], size: int, path: str):
+    """接收 size 个字节写入 path，先写临时文件，完整收到后再改名"""
+    temp = f"{path}.part"
+    try:
+        with open(temp, "wb") as f:
+            _copy(rfile, f, size)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+class _Job:
+    """
+    分发给工作节点的一个文件
+    """
+
+    def __init__(self, index: int, file_path: str):
+        """
+        :param index: 文件序号，同时作为任务编号
+        :param file_path: 文件在协调节点上的路径
+        """
+        self.index = index
+        self.file_path = file_path
+        # 已分配的次数，工作节点失联后会重新分配
+        self.attempts = 0
+        # 持有租约的工作节点，None 表示等待分配
+        self.worker: Optional[str] = None
+        self.expires = 0.0
+        # 正在传输文件时租约不会过期，连接断开时会立即重新排队
+        self.transferring = False
+
+
+class Coordinator:
+    """
+    Hand the files of a batch to worker processes over TCP
+
+    The coordinator expands the inputs with the same discovery logic as compression_files and
+    leases one file at a time to each worker that asks. A worker keeps its lease alive with
+    heartbeats while it encodes. When a lease expires, or the worker's connection drops, the
+    file goes back into the queue, up to max_attempts times. With shared storage the workers
+    open the sources by the coordinator's path and write outputs next to them. Otherwise the
+    coordinator streams each source to its worker and receives the output back.
+
+    The protocol is one JSON header per line, optionally followed by "size" raw bytes:
+
+        hello {token, name}         -> {ok, version, config, delete_audio, delete_source, shared, lease_seconds}
+        lease                       -> {job, name, size} or {job: null, done, retry}
+        fetch {job}                 -> {ok, size} + source bytes
+        heartbeat {job}             -> {ok}, false once the lease is lost
+        complete {job, status, reason, size} + output bytes -> {ok}
+        fail {job, error}           -> {ok}
+    """
+
+    def __init__(self, queue: Queue, config_params: Dict[str, Any], delete_audio: bool, delete_source: bool,
+                 shared: bool = False, token: str = "", lease_seconds: float = 60.0, max_attempts: int = 3,
+                 cache_dir: str = None):
+        """
+        :param queue: 消息队列
+        :param config_params: 压缩配置的原始参数，原样发给工作节点
+        :param delete_audio: 是否删除音频
+        :param delete_source: 输出完成后是否删除源文件
+        :param shared: 工作节点能否按相同路径访问源文件（共享存储）
+        :param token: 工作节点连接时必须提供的口令，为空时不检查
+        :param lease_seconds: 租约时长（秒），超过该时间没有心跳的任务会重新分配
+        :param max_attempts: 每个文件最多分配的次数
+        :param cache_dir: 压缩结果缓存所在目录，为空时不跳过已压缩的文件
+        """
+        self.queue = queue
+        self.config_params = config_params
+        self.config = Config(config_params)
+        self.delete_audio = delete_audio
+        self.delete_source = delete_source
+        self.shared = shared
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_cache = open_result_cache(cache_dir)
+        self.encode_key = get_encode_key(self.config, delete_audio)
+
+        # 实际监听的地址，serve 开始后可用
+        self.address: Optional[tuple[str, int]] = None
+        self.jobs: Dict[int, _Job] = {}
+        self._pending: List[int] = []
+        self._remaining = 0
+        # 当前连接的工作节点数
+        self._connections = 0
+        self._cond = threading.Condition()
+
+    def add_files(self, file_paths: Iterable[str], recurse: bool, video_extensions: List[str]) -> int:
+        """
+        将输入展开为视频文件并加入任务队列，已使用相同参数压缩过的文件直接跳过
+        :param file_paths: 要处理的文件与目录
+        :param recurse: 是否递归处理子目录
+        :param video_extensions: 视频文件扩展名
+        :return: 加入的文件数（含跳过的）
+        """
+        paths = list(iter_video_files(file_paths, recurse, video_extensions))
+        total = len(self.jobs) + len(paths)
+        for file_path in paths:
+            job = _Job(len(self.jobs) + 1, file_path)
+            self.jobs[job.index] = job
+            if self.result_cache and self.result_cache.lookup(file_path, get_output_filename(file_path),
+                                                              self.encode_key):
+                send_message(self.queue, CompressionSkippedMessage(job.index, total, file_path, "已使用相同参数压缩过"))
+                if self.delete_source:
+                    os.remove(file_path)
+                continue
+            with self._cond:
+                self._pending.append(job.index)
+                self._remaining += 1
+        return len(paths)
+
+    def hello(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        token = str(request.get("token") or "")
+        if self.token and not hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8")):
+            return {"ok": False, "error": "口令错误"}
+        return {"ok": True, "version": PROTOCOL_VERSION, "config": self.config_params,
+                "delete_audio": self.delete_audio, "delete_source": self.delete_source, "shared": self.shared,
+                "lease_seconds": self.lease_seconds}
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        with self._cond:
+            if not self._pending:
+                return {"job": None, "done": self._remaining == 0, "retry": 1.0}
+            job = self.jobs[self._pending.pop(0)]
+            job.worker = worker
+            job.attempts += 1
+            job.expires = time.monotonic() + self.lease_seconds
+
+        try:
+            size = os.path.getsize(job.file_path)
+        except OSError as e:
+            self.requeue(job, str(e))
+            return {"job": None, "done": False, "retry": 0.0}
+
+        logging.info(f"文件 {job.file_path} 分配给工作节点 {worker}（第 {job.attempts} 次）")
+        send_message(self.queue, CompressionProgressMessage(job.index, len(self.jobs), job.file_path))
+        path = job.file_path if self.shared else os.path.basename(job.file_path)
+        return {"job": job.index, "name": path, "size": size}
+
+    def _get_leased(self, worker: str, index: int) -> Optional[_Job]:
+        job = self.jobs.get(index)
+        return job if job is not None and job.worker == worker else None
+
+    def heartbeat(self, worker: str, index: int) -> Dict[str, Any]:
+        with self._cond:
+            job = self._get_leased(worker, index)
+            if job:
+                job.expires = time.monotonic() + self.lease_seconds
+        return {"ok": job is not None}
+
+    def set_transferring(self, worker: str, index: int, transferring: bool) -> Optional[_Job]:
+        """标记任务正在传输文件，返回该工作节点持有的任务"""
+        with self._cond:
+            job = self._get_leased(worker, index)
+            if job:
+                job.transferring = transferring
+                job.expires = time.monotonic() + self.lease_seconds
+            return job
+
+    def _finish(self, job: _Job):
+        # 调用者持有 self._cond
+        job.worker = None
+        self._remaining -= 1
+        self._cond.notify_all()
+
+    def complete(self, worker: str, index: int, status: str, reason: str = ""):
+        """
+        记录工作节点完成的任务，输出已在协调节点上（共享存储或已接收）
+        :param worker: 工作节点
+        :param index: 任务编号
+        :param status: 工作节点上 process_single_file 的结果
+        :param reason: 跳过的原因
+        """
+        with self._cond:
+            job = self._get_leased(worker, index)
+            if job is None:
+                return
+            self._finish(job)
+
+        output_path = get_output_filename(job.file_path)
+        if status == "ok" and os.path.exists(output_path):
+            logging.info(f"工作节点 {worker} 完成文件 {job.file_path}")
+            # 源文件只由协调节点在确认租约仍有效后删除，且先记录缓存（缓存需要读取源文件的指纹）
+            if self.result_cache and os.path.exists(job.file_path):
+                self.result_cache.record(job.file_path, output_path, self.encode_key)
+            if self.delete_source and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+        elif status == "skipped":
+            send_message(self.queue, CompressionSkippedMessage(job.index, len(self.jobs), job.file_path, reason))
+        elif status == "failed":
+            send_message(self.queue, CompressionErrorMessage("错误", f"处理文件 {job.file_path} 失败: {reason}"))
+
+    def requeue(self, job: _Job, reason: str):
+        """
+        将工作节点失联或失败的任务重新排队，超过最大次数后记为失败
+        :param job: 任务
+        :param reason: 原因
+        """
+        with self._cond:
+            if job.worker is None:
+                return
+            worker, job.worker, job.transferring = job.worker, None, False
+            if job.attempts < self.max_attempts:
+                self._pending.insert(0, job.index)
+                self._cond.notify_all()
+                retry = True
+            else:
+                self._finish(job)
+                retry = False
+
+        if retry:
+            logging.warning(f"文件 {job.file_path} 在工作节点 {worker} 上未完成（{reason}），重新排队")
+        else:
+            logging.error(f"文件 {job.file_path} 已分配 {job.attempts} 次仍未完成: {reason}")
+            send_message(self.queue, CompressionErrorMessage("错误", f"处理文件 {job.file_path} 失败: {reason}"))
+
+    def release_worker(self, worker: str, reason: str):
+        """工作节点断开连接，其持有的任务立即重新排队"""
+        for job in [job for job in self.jobs.values() if job.worker == worker]:
+            self.requeue(job, reason)
+
+    def reap_expired(self):
+        """将租约已过期的任务重新排队"""
+        now = time.monotonic()
+        with self._cond:
+            expired = [job for job in self.jobs.values()
+                       if job.worker is not None and not job.transferring and job.expires < now]
+        for job in expired:
+            self.requeue(job, "租约过期")
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        等待全部任务结束
+        :param timeout: 最长等待时间（秒）
+        :return: 全部结束时为 True
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._remaining == 0, timeout)
+
+    def serve(self, address: tuple[str, int]):
+        """
+        Accept workers until every job has finished
+
+        Workers still connected then get "done" on their next lease request. The server keeps
+        answering until they have all disconnected, or for at most SHUTDOWN_GRACE seconds.
+
+        Args:
+            address: (host, port) to listen on
+
+        Raises:
+            ValueError: If the address is reachable from other machines and no token is set;
+                anyone who can connect could otherwise download the sources
+        """
+        if not self.token and not is_loopback(address[0]):
+            raise ValueError(f"监听 {address[0]} 时必须设置口令（--token）")
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.handle_connection(self.rfile, self.wfile, "%s:%d" % self.client_address[:2])
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with Server(address, Handler) as server:
+            self.address = server.server_address
+            logging.info(f"协调节点监听 {self.address[0]}:{self.address[1]}，共 {len(self.jobs)} 个文件")
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                while not self.wait(1.0):
+                    self.reap_expired()
+                with self._cond:
+                    self._cond.wait_for(lambda: self._connections == 0, SHUTDOWN_GRACE)
+            finally:
+                server.shutdown()
+
+        if self.result_cache:
+            self.result_cache.save()
+
+    def handle_connection(self, rfile: IO[bytes], wfile: IO[bytes], peer: str):
+        """
+        处理一个工作节点连接上的全部请求，连接断开时其任务重新排队
+        :param rfile: 连接的读端
+        :param wfile: 连接的写端
+        :param peer: 对端地址
+        """
+        worker = peer
+        with self._cond:
+            self._connections += 1
+        try:
+            request = _receive(rfile)
+            reply = self.hello(request) if request.get("op") == "hello" else {"ok": False, "error": "需要先发送 hello"}
+            _send(wfile, reply)
+            if not reply["ok"]:
+                return
+            worker = f"{request.get('name') or 'worker'}@{peer}"
+            logging.info(f"工作节点 {worker} 已连接")
+
+            while True:
+                request = _receive(rfile)
+                op = request.get("op")
+                if op == "lease":
+                    _send(wfile, self.lease(worker))
+                elif op == "heartbeat":
+                    _send(wfile, self.heartbeat(worker, request["job"]))
+                elif op == "fetch":
+                    self._send_source(wfile, worker, request["job"])
+                elif op == "complete":
+                    self._receive_output(rfile, wfile, worker, request)
+                elif op == "fail":
+                    job = self._get_leased(worker, request["job"])
+                    if job:
+                        self.requeue(job, request.get("error", ""))
+                    _send(wfile, {"ok": job is not None})
+                else:
+                    _send(wfile, {"ok": False, "error": f"未知的请求: {op}"})
+        except (ConnectionError, OSError) as e:
+            logging.debug(f"工作节点 {worker} 的连接中断: {e}")
+        finally:
+            self.release_worker(worker, "连接断开")
+            with self._cond:
+                self._connections -= 1
+                self._cond.notify_all()
+            logging.info(f"工作节点 {worker} 已断开")
+
+    def _send_source(self, wfile: IO[bytes], worker: str, index: int):
+        job = self.set_transferring(worker, index, True)
+        if job is None:
+            _send(wfile, {"ok": False, "error": "没有持有该任务的租约"})
+            return
+        with open(job.file_path, "rb") as f:
+            _send(wfile, {"ok": True, "size": os.fstat(f.fileno()).st_size}, f)
+        self.set_transferring(worker, index, False)
+
+    def _receive_output(self, rfile: IO[bytes], wfile: IO[bytes], worker: str, request: Dict[str, Any]):
+        size = request.get("size", 0)
+        job = self.set_transferring(worker, request["job"], True) if size else self._get_leased(worker, request["job"])
+        if job is None:
+            # 租约已转给其他工作节点，丢弃迟到的结果
+            _copy(rfile, None, size)
+            _send(wfile, {"ok": False, "error": "没有持有该任务的租约"})
+            return
+        if size:
+            _receive_file(rfile, size, get_output_filename(job.file_path))
+            self.set_transferring(worker, job.index, False)
+        self.complete(worker, job.index, request["status"], request.get("reason", ""))
+        _send(wfile, {"ok": True})
+
+    def run(self, address: tuple[str, int]):
+        """执行整个分布式批次并发送开始、结束消息"""
+        total = len(self.jobs)
+        if total == 0:
+            send_message(self.queue, CompressionErrorMessage("错误", "没有找到可处理的视频文件"))
+            return
+        send_message(self.queue, CompressionStartMessage(total))
+        self.serve(address)
+        send_message(self.queue, CompressionFinishedMessage(total))
+
+
+class _WorkerConnection:
+    """
+    工作节点到协调节点的连接，请求与应答成对进行，可被心跳线程与处理线程共用
+    """
+
+    def __init__(self, address: tuple[str, int], timeout: float = 30.0):
+        self.sock = socket.create_connection(address, timeout=timeout)
+        self.rfile = self.sock.makefile("rb")
+        self.wfile = self.sock.makefile("wb")
+        self.lock = threading.Lock()
+
+    def request(self, header: Dict[str, Any], payload: IO[bytes] = None) -> Dict[str, Any]:
+        with self.lock:
+            _send(self.wfile, header, payload)
+            return _receive(self.rfile)
+
+    def fetch(self, index: int, path: str):
+        """下载任务的源文件到 path"""
+        with self.lock:
+            _send(self.wfile, {"op": "fetch", "job": index})
+            reply = _receive(self.rfile)
+            if not reply.get("ok"):
+                raise ConnectionError(reply.get("error", "下载源文件失败"))
+            _receive_file(self.rfile, reply["size"], path)
+
+    def close(self):
+        for stream in (self.rfile, self.wfile):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        self.sock.close()
+
+
+def _process_job(conn: _WorkerConnection, lease: Dict[str, Any], settings: Dict[str, Any], config: Config,
+                 local_dir: Optional[str], temp_root: str, tools: dict[str, str]) -> Dict[str, Any]:
+    """
+    在本机处理一个任务
+    :param conn: 到协调节点的连接
+    :param lease: lease 请求的应答
+    :param settings: hello 请求的应答
+    :param config: 压缩配置
+    :param local_dir: 没有共享存储时存放下载的源文件与输出的目录
+    :param temp_root: 各任务临时目录的父目录
+    :param tools: 外部工具路径
+    :return: 发给协调节点的 complete 请求，需要上传输出时 output 为本地输出路径
+    """
+    index = lease["job"]
+    if local_dir:
+        file_path = os.path.join(local_dir, os.path.basename(lease["name"]))
+        conn.fetch(index, file_path)
+    else:
+        file_path = lease["name"]
+
+    # 源文件由协调节点在接受 complete 后删除：租约过期后文件可能已交给其他工作节点
+    governor = CpuGovernor(config) if config.governor.enabled else None
+    messages = Queue()
+    status = process_single_file(messages, file_path, config, settings["delete_audio"], False, index, 1,
+                                 temp_root, tools=tools, governor=governor)
+
+    reason = ""
+    while not messages.empty():
+        message = messages.get()
+        if isinstance(message, CompressionSkippedMessage):
+            reason = message.reason
+        elif isinstance(message, CompressionErrorMessage):
+            reason = message.message
+
+    request = {"op": "complete", "job": index, "status": status, "reason": reason}
+    output_path = get_output_filename(file_path)
+    if local_dir and status == "ok":
+        request["size"] = os.path.getsize(output_path)
+        request["output"] = output_path
+    return request
+
+
+def run_worker(address: tuple[str, int], tools: dict[str, str], temp_root: str, name: str = None,
+               token: str = "") -> int:
+    """
+    Process files leased from a coordinator until it has none left
+
+    Args:
+        address: (host, port) of the coordinator
+        tools: Paths of the external tools on this machine
+        temp_root: Directory for downloaded sources and the jobs' temporary files
+        name: Name the worker reports, the host name by default
+        token: Token the coordinator expects
+
+    Returns:
+        Number of files processed
+    """
+    conn = _WorkerConnection(address)
+    processed = 0
+    try:
+        settings = conn.request({"op": "hello", "version": PROTOCOL_VERSION, "token": token,
+                                 "name": name or socket.gethostname()})
+        if not settings.get("ok"):
+            raise ConnectionError(settings.get("error", "协调节点拒绝连接"))
+        config = Config(settings["config"])
+        # 工作节点一次只处理一个文件，CPU 分配与分段并行按整台机器计算，而不是按协调节点配置的并行数均分
+        config.max_parallel_jobs = 1
+        interval = max(1.0, settings["lease_seconds"] / 3)
+
+        while True:
+            lease = conn.request({"op": "lease"})
+            if lease["job"] is None:
+                if lease["done"]:
+                    break
+                time.sleep(lease.get("retry", 1.0))
+                continue
+
+            index = lease["job"]
+            stop = threading.Event()
+
+            lost = threading.Event()
+
+            def heartbeat():
+                while not stop.wait(interval):
+                    try:
+                        reply = conn.request({"op": "heartbeat", "job": index})
+                    except (ConnectionError, OSError) as e:
+                        logging.error(f"与协调节点的连接中断: {e}")
+                        lost.set()
+                        return
+                    if not reply.get("ok"):
+                        logging.warning(f"任务 {index} 的租约已失效")
+                        return
+
+            heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+            heartbeat_thread.start()
+            local_dir = None if settings["shared"] else create_job_temp_dir(temp_root, index)
+            try:
+                try:
+                    request = _process_job(conn, lease, settings, config, local_dir, temp_root, tools)
+                except Exception as e:
+                    logging.error(f"处理任务 {index} 失败: {e}")
+                    request = {"op": "fail", "job": index, "error": str(e)}
+                finally:
+                    stop.set()
+                    heartbeat_thread.join()
+
+                if lost.is_set():
+                    # 协调节点已不可达，结果无法交回，文件会在协调节点上重新排队
+                    raise ConnectionError(f"与协调节点的连接中断，放弃任务 {index} 的结果")
+                output = request.pop("output", None)
+                if output:
+                    with open(output, "rb") as f:
+                        conn.request(request, f)
+                else:
+                    conn.request(request)
+            finally:
+                if local_dir:
+                    clean_temp_dir(local_dir)
+            processed += 1
+    finally:
+        conn.close()
+    logging.info(f"协调节点已没有待处理的文件，本节点共处理 {processed} 个")
+    return processed
@@ -0,0 +1,184 @@
+import logging
+import os
+import subprocess
+import threading
+from subprocess import Popen
+from typing import Callable, Dict, List, Optional
+
+from .config import Config
+
+
+def get_available_cpus() -> List[int]:
+    """
+    获取本进程可以使用的 CPU 编号，Linux 下会考虑容器或 taskset 的限制
+    :return: CPU 编号列表
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _get_priority_class(nice: int) -> int:
+    """将 nice 值换算为 Windows 的进程优先级类别，其他平台返回 0"""
+    if nice >= 15:
+        return getattr(subprocess, "IDLE_PRIORITY_CLASS", 0)
+    if nice > 0:
+        return getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0)
+    if nice < 0:
+        return getattr(subprocess, "ABOVE_NORMAL_PRIORITY_CLASS", 0)
+    return 0
+
+
+def _get_thread_ids(pid: int) -> List[int]:
+    """列出进程的全部线程（Linux 的 /proc/<pid>/task），无法列出时只返回进程本身"""
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        return [pid]
+
+
+def _for_each_thread(pid: int, apply: Callable[[int], None]):
+    """
+    Apply a per-thread setting to every thread of a process
+
+    On Linux, sched_setaffinity() and setpriority(PRIO_PROCESS) change a single thread, and a
+    thread only inherits them from the thread that creates it. The process's main thread is
+    set first; the threads the encoder already started are then set one by one, round after
+    round, until a round finds no thread that was not set yet.
+
+    Args:
+        pid: Process ID
+        apply: Called with the ID of every thread
+
+    Raises:
+        OSError: If the setting cannot be applied to the main thread
+    """
+    apply(pid)
+    done = {pid}
+    while True:
+        threads = [tid for tid in _get_thread_ids(pid) if tid not in done]
+        if not threads:
+            return
+        for tid in threads:
+            try:
+                apply(tid)
+            except ProcessLookupError:
+                # 线程已经退出
+                pass
+            done.add(tid)
+
+
+def _set_affinity_windows(process: Popen, cpus: List[int]):
+    import ctypes
+    from ctypes import wintypes
+
+    mask = sum(1 << cpu for cpu in cpus)
+    kernel32 = ctypes.WinDLL("kernel32")
+    if not kernel32.SetProcessAffinityMask(wintypes.HANDLE(int(process._handle)), ctypes.c_size_t(mask)):
+        raise ctypes.WinError()
+
+
+class CpuAllotment:
+    """
+    分配给一个任务的 CPU 资源：编码器线程数、可用的 CPU 与优先级
+    """
+
+    def __init__(self, threads: int = 0, cpus: Optional[List[int]] = None, nice: int = 0):
+        """
+        :param threads: 编码器线程数，0 表示使用编码器的默认值
+        :param cpus: 绑定的 CPU 编号，None 表示不绑定
+        :param nice: nice 值，0 表示不调整优先级
+        """
+        self.threads = threads
+        self.cpus = cpus
+        self.nice = nice
+
+    def split(self, parts: int) -> "CpuAllotment":
+        """
+        将资源平分给同时运行的多个编码器（如并行的分段或抽样），CPU 绑定与优先级保持不变
+        :param parts: 编码器数量
+        :return: 每个编码器的资源
+        """
+        threads = self.threads or len(self.cpus or get_available_cpus())
+        return CpuAllotment(max(1, threads // max(1, parts)), self.cpus, self.nice)
+
+    def creation_flags(self) -> int:
+        """启动子进程时附加的 creationflags，用于在 Windows 下设置优先级"""
+        return _get_priority_class(self.nice) if os.name == "nt" else 0
+
+    def apply(self, process: Popen):
+        """
+        对已启动的子进程及其已创建的全部线程应用 CPU 绑定与 nice 值，失败时只记录日志
+        :param process: 子进程
+        """
+        try:
+            if self.cpus:
+                if hasattr(os, "sched_setaffinity"):
+                    _for_each_thread(process.pid, lambda tid: os.sched_setaffinity(tid, self.cpus))
+                elif os.name == "nt":
+                    _set_affinity_windows(process, self.cpus)
+            if self.nice and hasattr(os, "setpriority"):
+                _for_each_thread(process.pid, lambda tid: os.setpriority(os.PRIO_PROCESS, tid, self.nice))
+        except OSError as e:
+            # 进程可能已经退出，或没有权限提高优先级
+            logging.debug(f"无法设置进程 {process.pid} 的 CPU 绑定或优先级: {e}")
+
+    def __repr__(self):
+        return f"CpuAllotment(threads={self.threads}, cpus={self.cpus}, nice={self.nice})"
+
+
+class CpuGovernor:
+    """
+    Partition the CPU between concurrently running encodes
+
+    Every job asks for an allotment when it starts encoding. The cores not held by running jobs
+    are divided evenly between the job slots still free, so N parallel encoders get about
+    1/N of the machine each instead of every one of them starting a thread per core. With
+    affinity enabled, each job is also pinned to its own cores, which keeps an encoder's
+    threads on warm caches. A job that has the whole machine to itself keeps the encoder's
+    default threading.
+    """
+
+    def __init__(self, config: Config, cpus: List[int] = None):
+        """
+        :param config: 压缩配置
+        :param cpus: 可分配的 CPU 编号，默认为本进程可用的全部 CPU
+        """
+        self.config = config
+        self.cpus = cpus or get_available_cpus()
+        self._free = list(self.cpus)
+        self._active = 0
+        # id(CpuAllotment) -> 该任务占用的 CPU
+        self._held: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> CpuAllotment:
+        """
+        为一个开始编码的任务分配 CPU 资源
+        :return: 该任务的资源，任务结束时交给 release 归还
+        """
+        settings = self.config.governor
+        with self._lock:
+            slots = max(1, self.config.max_parallel_jobs - self._active)
+            threads = settings.threads or max(1, len(self._free) // slots)
+            # 不绑定 CPU 时也从空闲核心中扣除，之后开始的任务才能分到剩余的份额
+            taken = self._free[:threads]
+            self._free = self._free[len(taken):]
+            self._active += 1
+
+            if not settings.threads and len(taken) == len(self.cpus):
+                # 独占整台机器时不限制线程数，x264 默认的线程数更多，帧级并行效率更高
+                threads = 0
+            allotment = CpuAllotment(threads, taken if settings.affinity and taken else None, settings.nice)
+            self._held[id(allotment)] = taken
+        logging.info(f"分配 CPU 资源: {allotment}")
+        return allotment
+
+    def release(self, allotment: CpuAllotment):
+        """
+        归还任务的 CPU 资源
+        :param allotment: acquire 返回的资源
+        """
+        with self._lock:
+            self._free = sorted(self._free + self._held.pop(id(allotment), []))
+            self._active -= 1
@@ -0,0 +1,147 @@
+import tkinter as tk
+from tkinter import font as tkfont
+
+from .manifest import Manifest
+
+
+class VirtualListView(tk.Frame):
+    """
+    A scrollable list that draws only the rows currently visible
+
+    The rows live in a Manifest; the canvas holds one text item and one background item per
+    visible row and rebinds them to other rows while scrolling. Redraw cost therefore depends
+    on the height of the widget, not on the size of the batch. Rows can be selected with the
+    mouse (Shift/Ctrl extend the selection) and removed with Delete.
+    """
+
+    # 行高（像素）
+    ROW_HEIGHT = 18
+    # 行内文字的左边距（像素）
+    PADDING = 4
+    # 选中行的背景色
+    SELECT_COLOR = "#cce4f7"
+
+    def __init__(self, master, manifest: Manifest, **kwargs):
+        """
+        :param master: 父控件
+        :param manifest: 要显示的文件列表
+        """
+        super().__init__(master, **kwargs)
+        self.manifest = manifest
+        # 第一行可见行的行号
+        self._top = 0
+        self._selected: set[int] = set()
+        self._anchor = None
+        # 可见行复用的画布元素：(背景矩形, 文本)
+        self._pool: list[tuple[int, int]] = []
+        self._redraw_scheduled = False
+
+        self.canvas = tk.Canvas(self, background="white", highlightthickness=1, highlightbackground="#a0a0a0",
+                                takefocus=True)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._font = tkfont.nametofont("TkDefaultFont")
+
+        self.canvas.bind("<Configure>", lambda event: self.schedule_redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Shift-Button-1>", lambda event: self._on_click(event, extend=True))
+        self.canvas.bind("<Control-Button-1>", lambda event: self._on_click(event, toggle=True))
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self._scroll_to(self._top - 3))
+        self.canvas.bind("<Button-5>", lambda event: self._scroll_to(self._top + 3))
+        self.canvas.bind("<Delete>", lambda event: self.remove_selected())
+        self.canvas.bind("<Control-a>", lambda event: self._select_all())
+
+        manifest.subscribe(self._on_manifest_change)
+
+    def _get_visible_rows(self) -> int:
+        """画布能完整或部分显示的行数"""
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT + 1)
+
+    def _on_manifest_change(self):
+        # 模型只在 Tk 线程中修改；行号改变后原来的选择不再有效
+        self._selected.clear()
+        self._anchor = None
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        """合并短时间内的多次刷新请求，空闲时只重绘一次"""
+        if not self._redraw_scheduled:
+            self._redraw_scheduled = True
+            self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self._redraw_scheduled = False
+        total = len(self.manifest)
+        visible = self._get_visible_rows()
+        self._top = max(0, min(self._top, total - visible + 1))
+        width = self.canvas.winfo_width()
+
+        while len(self._pool) < visible:
+            background = self.canvas.create_rectangle(0, 0, 0, 0, width=0)
+            text = self.canvas.create_text(0, 0, anchor=tk.W, font=self._font)
+            self._pool.append((background, text))
+
+        for i, (background, text) in enumerate(self._pool):
+            row = self._top + i
+            if i >= visible or row >= total:
+                self.canvas.itemconfigure(background, state=tk.HIDDEN)
+                self.canvas.itemconfigure(text, state=tk.HIDDEN)
+                continue
+            y = i * self.ROW_HEIGHT
+            fill = self.SELECT_COLOR if row in self._selected else ""
+            self.canvas.coords(background, 0, y, width, y + self.ROW_HEIGHT)
+            self.canvas.itemconfigure(background, fill=fill, state=tk.NORMAL)
+            self.canvas.coords(text, self.PADDING, y + self.ROW_HEIGHT // 2)
+            self.canvas.itemconfigure(text, text=self.manifest[row], state=tk.NORMAL)
+
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll_to(self, top: int):
+        self._top = max(0, top)
+        self.schedule_redraw()
+
+    def _on_scrollbar(self, action, *args):
+        # 滚动条的 yview 协议："moveto 比例" 或 "scroll 数量 units/pages"
+        if action == tk.MOVETO:
+            self._scroll_to(int(float(args[0]) * len(self.manifest)))
+        elif action == tk.SCROLL:
+            step = self._get_visible_rows() - 1 if args[1] == tk.PAGES else 1
+            self._scroll_to(self._top + int(args[0]) * max(1, step))
+
+    def _on_mouse_wheel(self, event):
+        # Windows 下每格滚轮 delta 为 120
+        self._scroll_to(self._top - event.delta // 120 * 3)
+
+    def _on_click(self, event, extend: bool = False, toggle: bool = False):
+        self.canvas.focus_set()
+        row = self._top + event.y // self.ROW_HEIGHT
+        if row >= len(self.manifest):
+            self._selected.clear()
+            self._anchor = None
+        elif extend and self._anchor is not None:
+            low, high = sorted((self._anchor, row))
+            self._selected = set(range(low, high + 1))
+        elif toggle:
+            self._selected ^= {row}
+            self._anchor = row
+        else:
+            self._selected = {row}
+            self._anchor = row
+        self.schedule_redraw()
+
+    def _select_all(self):
+        self._selected = set(range(len(self.manifest)))
+        self.schedule_redraw()
+        return "break"
+
+    def remove_selected(self) -> int:
+        """
+        从列表中删除选中的行
+        :return: 删除的数量
+        """
+        return self.manifest.remove(self._selected)
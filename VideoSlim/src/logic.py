@@ -1,15 +1,37 @@
+import json
 import logging
 import os
-import subprocess
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
-from typing import List, Tuple, Any
-
-import requests
-from pymediainfo import MediaInfo
+from typing import Iterable, Iterator, List, Optional
 
+from .commands import (can_copy_audio, get_aac_encode_command, get_audio_copy_command, get_audio_decode_command,
+                       get_mux_command, get_video_encode_commands)
 from .config import Config
+from .dedup import find_duplicates, link_output
+from .governor import CpuGovernor
+from .logs import bind_log_context, open_encoder_log, reset_log_context
+from .metrics import BatchMetrics, JobMetrics
+from .pipeline import Stage, run_stage_graph
+from .predict import is_worth_predicting, predict_output_size
+from .cache import ResultCache, get_encode_key, open_result_cache
+from .probe import PROBE_WORKERS, Prober, open_prober, probe_file
+from .scheduler import schedule_files
+from .scratch import ScratchManager, estimate_scratch_bytes, open_scratch
+from .segment import encode_segmented, should_segment
+from .settings import META_INFO
+from .progress import BatchProgress, parse_x264_progress
+from .throughput import PresetSelector, with_preset
+from .tools import get_dir_size, save_json_atomic
 from .message import *
 
+# 更新检查结果的缓存有效期（秒）
+UPDATE_CHECK_TTL = 24 * 3600
+
 
 def is_video_file(file_path: str, video_extensions: list[str]) -> bool:
     """
@@ -25,14 +47,28 @@ def is_video_file(file_path: str, video_extensions: list[str]) -> bool:
     return os.path.isfile(file_path) and ext.lower() in video_extensions
 
 
-def clean_temp_files(temp_file_names: list[str]):
-    """Clean up temporary files"""
-    for temp_file in temp_file_names:
-        if os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except Exception as e:
-                logging.warning(f"删除临时文件 {temp_file} 失败: {e}")
+def create_job_temp_dir(temp_root: str, index: int) -> str:
+    """
+    Create an isolated temporary directory for a single compression job
+
+    Args:
+        temp_root: Directory under which job directories are created
+        index: Index of the file the job belongs to
+
+    Returns:
+        Path of the created directory
+    """
+    os.makedirs(temp_root, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"videoslim_{index}_", dir=temp_root)
+
+
+def clean_temp_dir(temp_dir: str):
+    """Clean up a job's temporary directory"""
+    if os.path.exists(temp_dir):
+        try:
+            shutil.rmtree(temp_dir)
+        except Exception as e:
+            logging.warning(f"删除临时目录 {temp_dir} 失败: {e}")
 
 
 def get_output_filename(input_path: str) -> str:
@@ -49,32 +85,109 @@ def get_output_filename(input_path: str) -> str:
     return f"{file_name}_x264.mp4"
 
 
-def scan_directory(directory: str, extensions: List[str]) -> Tuple[List[str], List[str]]:
+def is_output_file(file_path: str) -> bool:
+    """
+    Check if file is an output previously written by get_output_filename
+
+    Args:
+        file_path: File path to check
+
+    Returns:
+        True if the file name ends with "_x264.mp4"
+    """
+    return os.path.basename(file_path).lower().endswith("_x264.mp4")
+
+
+def _get_file_key(path: str, versioned: bool = False):
     """
-    Recursively scan directory for files with specific extensions
+    Identify a file or directory independently of the path used to reach it
 
     Args:
-        directory: Directory to scan
-        extensions: List of file extensions to include
+        path: Path of the file or directory
+        versioned: Also include size and mtime, so a file rewritten in place gets a new key
 
     Returns:
-        Tuple of (subfolders, files)
+        (device, inode) when the file system provides inodes, the real path otherwise
     """
-    subfolders, files = [], []
+    stat = os.stat(path)
+    key = (stat.st_dev, stat.st_ino) if stat.st_ino else (os.path.normcase(os.path.realpath(path)),)
+    if versioned:
+        key += (stat.st_size, stat.st_mtime_ns)
+    return key
 
-    for entry in os.scandir(directory):
-        if entry.is_dir():
-            subfolders.append(entry.path)
-        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
-            files.append(entry.path)
 
-    # Recursively scan subfolders
-    for folder in list(subfolders):
-        sf, f = scan_directory(folder, extensions)
-        subfolders.extend(sf)
-        files.extend(f)
+def _walk_directory(directory: str, extensions: List[str], seen_dirs: set, seen_files: set) -> Iterator[str]:
+    """
+    Iteratively walk a directory tree and yield video files as soon as they are found
 
-    return subfolders, files
+    Only the directories still waiting to be visited are kept in memory, so the walk works on
+    trees of any depth and size. Directories reached twice (symlink loops) are visited once.
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            key = _get_file_key(current)
+            if key in seen_dirs:
+                logging.info(f"跳过重复访问的目录（符号链接循环）: {current}")
+                continue
+            seen_dirs.add(key)
+
+            subfolders = []
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subfolders.append(entry.path)
+                    elif (entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions
+                          and not is_output_file(entry.path)):
+                        file_key = _get_file_key(entry.path, versioned=True)
+                        if file_key not in seen_files:
+                            seen_files.add(file_key)
+                            yield entry.path
+        except OSError as e:
+            logging.warning(f"扫描目录 {current} 失败: {e}")
+            continue
+
+        # Reversed so that subfolders are visited in directory order
+        stack.extend(reversed(subfolders))
+
+
+def iter_video_files(file_paths: Iterable[str], recurse: bool, video_extensions: List[str],
+                     unique: bool = True) -> Iterator[str]:
+    """
+    Expand the input paths into video files, lazily
+
+    Directories are walked only when recurse is set. Every file is yielded once even when it is
+    reachable through several inputs or links, and earlier "_x264.mp4" outputs inside scanned
+    directories are skipped.
+
+    Args:
+        file_paths: Files and directories to process
+        recurse: Whether to walk directories
+        video_extensions: Extensions of video files
+        unique: Whether a file is yielded once across all inputs. The record of yielded files grows
+            with every file, so a never-ending input that already yields each version of a file once
+            (FolderWatcher) passes False and files are then only deduplicated within one input
+
+    Yields:
+        Paths of video files, in discovery order
+    """
+    seen_dirs, seen_files = set(), set()
+
+    for file_path in file_paths:
+        if not unique:
+            seen_dirs, seen_files = set(), set()
+        if not file_path or not os.path.exists(file_path):
+            continue
+
+        if os.path.isdir(file_path):
+            if recurse:
+                yield from _walk_directory(file_path, video_extensions, seen_dirs, seen_files)
+        elif is_video_file(file_path, video_extensions):
+            file_key = _get_file_key(file_path, versioned=True)
+            if file_key not in seen_files:
+                seen_files.add(file_key)
+                yield file_path
 
 
 def send_message(queue: Queue, message: Message):
@@ -82,7 +195,11 @@ def send_message(queue: Queue, message: Message):
 
 
 def process_single_file(queue: Queue, file_path: str, config: Config, delete_audio: bool,
-                        delete_source: bool, index: int, total: int, temp_file_names: list[str]):
+                        delete_source: bool, index: int, total: int, temp_root: str,
+                        progress: BatchProgress = None, result_cache: ResultCache = None,
+                        prober: Prober = None, tools: dict[str, str] = None, metrics: BatchMetrics = None,
+                        scratch: ScratchManager = None, governor: CpuGovernor = None,
+                        presets: PresetSelector = None) -> str:
     """
     Process a single video file
 
@@ -92,116 +209,334 @@ def process_single_file(queue: Queue, file_path: str, config: Config, delete_aud
         delete_audio: Whether to delete audio tracks
         delete_source: Whether to delete source files
         index: Index of current file
-        total: Total number of files
+        total: Total number of files; superseded by progress.total, which grows while files are discovered
+        temp_root: Directory under which the job's temporary directory is created
+        progress: Batch progress tracker that receives the encoder's live output
+        result_cache: Index of earlier results; a hit skips the file
+        prober: Prober that has usually probed the file already
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        metrics: Batch metrics that receive the time and resource usage of every stage
+        scratch: Places the temporary directory and waits until there is room for it; without it
+            the directory is created under temp_root unchecked
+        governor: Assigns the job its encoder threads, CPU affinity and priority; without it the
+            encoders run with their default threading
+        presets: Chooses the file's x264 preset for the batch's throughput goal; without it the
+            configured preset is used
+
+    Returns:
+        "ok", "failed" or "skipped"
         :param queue:
     """
+    tools = tools or META_INFO["TOOLS"]
+    temp_dir = None
+    cpu = None
+    encoder_log = None
+    progress = progress or BatchProgress(total)
+    job = JobMetrics(file_path)
+    # 本任务产生的日志记录（包括各阶段线程中的）都带有文件路径与序号
+    log_token = bind_log_context(file_path=file_path, job=index)
     try:
-        # Clean up any existing temporary files
-        clean_temp_files(temp_file_names)
-
-        # Notify start of processing
-        send_message(queue, CompressionProgressMessage(index, total, file_path))
-
         # Generate output filename
         output_path = get_output_filename(file_path)
+        encode_key = get_encode_key(config, delete_audio)
+
+        if result_cache and result_cache.lookup(file_path, output_path, encode_key):
+            logging.info(f"文件 {file_path} 已使用相同参数压缩过，跳过")
+            job.status = "skipped"
+            send_message(queue, CompressionSkippedMessage(index, progress.total, file_path, "已使用相同参数压缩过"))
+            if prober:
+                prober.discard(file_path)
+            if delete_source:
+                os.remove(file_path)
+            return job.status
+
+        # Notify start of processing
+        send_message(queue, CompressionProgressMessage(index, progress.total, file_path))
 
         # Get media info
-        media_info = MediaInfo.parse(file_path)
-        current_file = file_path
-        commands = []
-
-        # Handle video rotation if needed
-        if (hasattr(media_info.video_tracks[0], "other_rotation") and
-                media_info.video_tracks[0].other_rotation):
-            logging.info("视频元信息含有旋转，进行预处理")
-            pre_temp = "./pre_temp.mp4"
-            commands.append(
-                f'./tools/ffmpeg.exe -i "{current_file}" "{pre_temp}"'
-            )
-            current_file = pre_temp
+        probe_start = time.perf_counter()
+        probe = prober.get(file_path) if prober else probe_file(file_path)
+        # 预探测通常早已完成，这里记录的是任务实际等待探测结果的时间
+        job.add_stage("probe", time.perf_counter() - probe_start)
+        if not probe.has_video:
+            raise ValueError("没有找到视频轨道")
+        progress.start(index, file_path, probe.frame_count)
+
+        if presets:
+            # 按吞吐目标选择本文件的 preset，CRF 保持不变；结果缓存仍以配置中的参数为键
+            config = with_preset(config, presets.select(file_path, probe, progress.remaining_files()))
+
+        def report_progress(frames_done: int, fps: float, bitrate: float):
+            message = progress.update(index, frames_done, fps, bitrate)
+            if message:
+                send_message(queue, message)
+
+        def on_x264_output(line: str):
+            parsed = parse_x264_progress(line)
+            if parsed:
+                report_progress(*parsed)
+
+        # 处理流程按依赖关系组织，互不依赖的阶段会同时执行
+        stages = []
+
+        if probe.rotation:
+            # ffmpeg 解码时会按元信息自动旋转画面，旋转后的原始帧经管道直接送入 x264，
+            # 不再单独进行一次完整的预编码
+            logging.info("视频元信息含有旋转，解码时直接旋转画面")
 
         # Generate compression commands based on audio presence
-        has_audio = len(media_info.audio_tracks) > 0 and not delete_audio
+        audio_tracks = [] if delete_audio else probe.audio_tracks
+        has_audio = len(audio_tracks) > 0
 
-        if has_audio:
-            # Process with audio
-            commands.extend([
-                # Extract audio to WAV
-                f'./tools/ffmpeg.exe -i "{current_file}" -vn -sn -v 0 -c:a pcm_s16le -f wav "./old_atemp.wav"',
-                # Encode audio with AAC
-                './tools/neroAacEnc.exe -ignorelength -lc -br 128000 -if "./old_atemp.wav" -of "./old_atemp.mp4"',
-                # Encode video with x264
-                f'./tools/x264_64-8bit.exe --crf {config.X264.crf} --preset {config.X264.preset} '
-                f'-I {config.X264.I} -r {config.X264.r} -b {config.X264.b} '
-                f'--me umh -i 1 --scenecut 60 -f 1:1 --qcomp 0.5 --psy-rd 0.3:0 '
-                f'--aq-mode 2 --aq-strength 0.8 -o "./old_vtemp.mp4" "{current_file}"'
-                + (' --opencl' if config.X264.opencl_acceleration else ''),
-                # Mux video and audio
-                f'./tools/mp4box.exe -add "./old_vtemp.mp4#trackID=1:name=" '
-                f'-add "./old_atemp.mp4#trackID=1:name=" -new "{output_path}"'
-            ])
+        # Every job gets its own temporary directory so parallel jobs never collide
+        if scratch:
+            temp_dir = scratch.acquire(estimate_scratch_bytes(probe, config, audio_tracks), index)
+        else:
+            temp_dir = create_job_temp_dir(temp_root, index)
+        video_mp4 = os.path.join(temp_dir, "old_vtemp.mp4")
+        cpu = governor.acquire() if governor else None
+        threads = cpu.threads if cpu else 0
+        # 外部工具的输出写入本任务单独的日志，编码失败时可以查看
+        encoder_log = open_encoder_log(file_path, index)
+
+        # mp4box needs a seekable file, so the video goes to disk first when it has to be muxed
+        video_output = video_mp4 if has_audio else output_path
+
+        if is_worth_predicting(probe, config):
+            # 先抽样编码几段预估输出体积，节省太少的文件不做完整编码
+            predicted_size = predict_output_size(file_path, probe, config, temp_dir, audio_tracks, tools, job, cpu,
+                                                 encoder_log)
+            saving = 1 - predicted_size / probe.file_size
+            if saving < config.predict.min_saving:
+                logging.info(f"文件 {file_path} 预计仅节省 {saving:.1%}，跳过压缩并保留源文件")
+                job.status = "skipped"
+                send_message(queue, CompressionNotWorthMessage(index, progress.total, file_path, probe.file_size,
+                                                               predicted_size, saving))
+                return job.status
+
+        if should_segment(probe, config):
+            # Long videos are split at keyframes and the segments encoded in parallel
+            video_stage = Stage("video", action=lambda: encode_segmented(
+                file_path, probe, config, temp_dir, video_output, report_progress, tools, video_stage.processes, cpu,
+                encoder_log))
         else:
-            # Process without audio
-            commands.append(
-                f'./tools/x264_64-8bit.exe --crf {config.X264.crf} --preset {config.X264.preset} '
-                f'-I {config.X264.I} -r {config.X264.r} -b {config.X264.b} '
-                f'--me umh -i 1 --scenecut 60 -f 1:1 --qcomp 0.5 --psy-rd 0.3:0 '
-                f'--aq-mode 2 --aq-strength 0.8 -o "{output_path}" "{current_file}"'
-                + (' --opencl' if config.X264.opencl_acceleration else '')
-            )
-
-        # Execute commands
-        for command in commands:
-            logging.info(f"执行命令: {command}")
-            subprocess.check_call(
-                command,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
+            video_stage = Stage("video", get_video_encode_commands(config, file_path, video_output,
+                                                                   bool(probe.rotation), tools, threads),
+                                on_output=on_x264_output, cpu=cpu)
+        stages.append(video_stage)
+
+        if has_audio:
+            # Process with audio, every track of the source goes into the output
+            audio_stages = []
+            audio_mp4s = []
+            for i, track in enumerate(audio_tracks):
+                stage = f"audio_{i}"
+                audio_wav = os.path.join(temp_dir, f"old_atemp_{i}.wav")
+                audio_mp4 = os.path.join(temp_dir, f"old_atemp_{i}.mp4")
+                audio_stages.append(stage)
+                audio_mp4s.append(audio_mp4)
+
+                if config.audio_copy and can_copy_audio(track):
+                    # Already AAC-LC at no more than the target bitrate: demux it, no decode or encode
+                    logging.info(f"音轨 {i} 为 {track['bit_rate']} bit/s 的 AAC，直接复制")
+                    stages.append(Stage(stage, [get_audio_copy_command(file_path, i, audio_mp4, tools)], cpu=cpu))
+                    continue
+
+                if config.streaming:
+                    # PCM goes straight from ffmpeg into the AAC encoder's stdin
+                    stages.append(Stage(stage, [get_audio_decode_command(file_path, i, '-', tools),
+                                                get_aac_encode_command('-', audio_mp4, tools)], cpu=cpu))
+                else:
+                    stages.extend([
+                        # Extract audio to WAV
+                        Stage(f"extract_{stage}", [get_audio_decode_command(file_path, i, audio_wav, tools)],
+                              cpu=cpu),
+                        # Encode audio with AAC
+                        Stage(stage, [get_aac_encode_command(audio_wav, audio_mp4, tools)], [f"extract_{stage}"],
+                              cpu=cpu)
+                    ])
+
+            # Mux video and audio once all branches are done
+            stages.append(Stage("mux", [get_mux_command(video_mp4, audio_mp4s, output_path, tools)],
+                                ["video"] + audio_stages, cpu=cpu))
+
+        # Execute commands, every stage writes its tools' output to the job's encoder log
+        for stage in stages:
+            stage.log = encoder_log
+        run_stage_graph(stages, job)
+        if presets:
+            presets.record(probe, config.X264.preset, video_stage.elapsed)
+
+        temp_bytes = get_dir_size(temp_dir)
+        logging.info(f"文件 {file_path} 的中间文件共写入 {temp_bytes} 字节",
+                     extra={"file_path": file_path, "temp_bytes": temp_bytes})
+
+        if result_cache and os.path.exists(output_path):
+            result_cache.record(file_path, output_path, encode_key)
 
         # Delete source if requested
         if delete_source and os.path.exists(output_path):
             os.remove(file_path)
 
     except Exception as e:
-        logging.error(f"处理文件 {file_path} 失败: {e}")
-        send_message(queue, CompressionErrorMessage("错误", f"处理文件 {file_path} 失败: {e}"))
+        log_hint = f"，外部工具的输出见 {encoder_log.path}" if encoder_log else ""
+        logging.error(f"处理文件 {file_path} 失败: {e}{log_hint}")
+        job.status = "failed"
+        send_message(queue, CompressionErrorMessage("错误", f"处理文件 {file_path} 失败: {e}{log_hint}"))
 
     finally:
+        progress.finish(index)
+        if encoder_log:
+            encoder_log.close()
+        if cpu:
+            governor.release(cpu)
+        if metrics:
+            metrics.add_job(job)
         # Always clean up temp files
-        clean_temp_files(temp_file_names)
+        if temp_dir and scratch:
+            scratch.release(temp_dir)
+        elif temp_dir:
+            clean_temp_dir(temp_dir)
+        reset_log_context(log_token)
+    return job.status
 
 
-def get_file_paths_from_list(file_paths: list[str], files_to_process: list[Any], recurse: bool,
-                             video_extensions: list[str]):
-    for file_path in file_paths:
-        if not file_path or not os.path.exists(file_path):
-            continue
+def share_duplicate_outputs(queue: Queue, file_path: str, status: str, copies: list[tuple[int, str]], config: Config,
+                            delete_audio: bool, delete_source: bool, progress: BatchProgress,
+                            result_cache: ResultCache = None, metrics: BatchMetrics = None):
+    """
+    Give the byte-identical copies of a file the result of encoding it once
 
-        if os.path.isdir(file_path) and recurse:
-            # Recursively scan directory for video files
-            _, video_files = scan_directory(file_path, video_extensions)
-            files_to_process.extend(video_files)
-        elif is_video_file(file_path, video_extensions):
-            files_to_process.append(file_path)
+    Every copy gets its own output, hardlinked or copied from the file's output, and is then
+    treated as if it had been encoded itself: it is recorded in the result cache and its source
+    is deleted when delete_source is set. When the file produced no output, the copies are not
+    touched.
+
+    Args:
+        file_path: The file that was encoded
+        status: Result of process_single_file for the file
+        copies: (index, path) of every copy
+        config: Compression configuration
+        delete_audio: Whether audio tracks were deleted
+        delete_source: Whether source files are deleted once their output exists
+        progress: Batch progress tracker, every copy is finished in it
+        result_cache: Index of results the copies are recorded in
+        metrics: Batch metrics that receive a record per copy
+        :param queue:
+    """
+    output_path = get_output_filename(file_path)
+    encode_key = get_encode_key(config, delete_audio)
+    for index, copy_path in copies:
+        job = JobMetrics(copy_path)
+        job.status = "skipped"
+        try:
+            if status == "failed" or not os.path.exists(output_path):
+                # 没有可复用的输出，副本与源文件保持原样
+                if status == "failed":
+                    job.status = "failed"
+                reason = "压缩失败" if status == "failed" else "未压缩"
+                send_message(queue, CompressionSkippedMessage(index, progress.total, copy_path,
+                                                              f"与 {file_path} 内容相同，该文件{reason}"))
+                continue
+
+            copy_output = get_output_filename(copy_path)
+            link_output(output_path, copy_output, config.dedup.link)
+            logging.info(f"文件 {copy_path} 与 {file_path} 内容相同，复用其压缩结果")
+            if result_cache:
+                result_cache.record(copy_path, copy_output, encode_key)
+            if delete_source:
+                os.remove(copy_path)
+            send_message(queue, CompressionDuplicateMessage(index, progress.total, copy_path, file_path))
+
+        except Exception as e:
+            logging.error(f"处理文件 {copy_path} 失败: {e}")
+            job.status = "failed"
+            send_message(queue, CompressionErrorMessage("错误", f"处理文件 {copy_path} 失败: {e}"))
+
+        finally:
+            progress.finish(index)
+            if metrics:
+                metrics.add_job(job)
+
+
+def process_file_group(copies: list[tuple[int, str]], **kwargs) -> str:
+    """
+    Encode a file once and share the result with its byte-identical copies
+
+    Args:
+        copies: (index, path) of the copies, see find_duplicates
+        **kwargs: Arguments of process_single_file
+
+    Returns:
+        Result of process_single_file for the file
+    """
+    status = process_single_file(**kwargs)
+    if copies:
+        share_duplicate_outputs(kwargs["queue"], kwargs["file_path"], status, copies, kwargs["config"],
+                                kwargs["delete_audio"], kwargs["delete_source"], kwargs["progress"],
+                                kwargs.get("result_cache"), kwargs.get("metrics"))
+    return status
 
 
-def check_for_updates(queue, version):
-    """Check for newer versions on GitHub"""
+def _read_update_cache(cache_file: str, ttl: float) -> Optional[str]:
+    """
+    读取缓存的最新版本号
+    :param cache_file: 缓存文件路径
+    :param ttl: 缓存有效期（秒）
+    :return: 最新版本号，缓存不存在、已过期或无法读取时返回 None
+    """
     try:
-        url = "https://api.github.com/repos/mainite/VideoSlim/releases"
-        response = requests.get(url, timeout=10)
-        data = response.json()
-
-        if data and len(data) > 0:
-            latest_release = data[0]
-            if latest_release['tag_name'] != version:
-                send_message(queue, UpdateMessage())
-    except Exception as e:
-        logging.warning(f"检查更新失败: {e}")
+        with open(cache_file, encoding="utf-8") as f:
+            data = json.load(f)
+        if 0 <= time.time() - data["checked_at"] < ttl:
+            return data["latest"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def check_for_updates(queue, version, cache_dir: str = None, ttl: float = UPDATE_CHECK_TTL):
+    """
+    Check for newer versions on GitHub
+
+    The latest release tag is cached in cache_dir, so the network is used at most once per ttl
+    seconds however often the program is started.
+
+    Args:
+        queue: Message queue, receives an UpdateMessage when a newer version exists
+        version: Version of this program
+        cache_dir: Directory of the cache file, None to always ask GitHub
+        ttl: Seconds a cached answer stays valid
+    """
+    cache_file = os.path.join(cache_dir, "update.json") if cache_dir else None
+    latest = _read_update_cache(cache_file, ttl) if cache_file else None
+
+    if latest is None:
+        try:
+            # requests 导入较慢，只在缓存过期、真正需要联网时导入
+            import requests
+
+            url = "https://api.github.com/repos/mainite/VideoSlim/releases"
+            response = requests.get(url, timeout=10)
+            data = response.json()
+            latest = data[0]['tag_name'] if data else ""
+        except Exception as e:
+            logging.warning(f"检查更新失败: {e}")
+            return
+
+        if cache_file:
+            try:
+                save_json_atomic(cache_file, {"checked_at": time.time(), "latest": latest})
+            except OSError as e:
+                logging.warning(f"写入更新检查缓存失败: {e}")
+
+    if latest and latest != version:
+        send_message(queue, UpdateMessage())
 
 
 def compression_files(queue: Queue, config: Config, delete_audio: bool, delete_source: bool,
-                      file_paths: list[str], recurse: bool, video_extensions: list[str], temp_file_names: list[str]):
+                      file_paths: Iterable[str], recurse: bool, video_extensions: list[str], temp_root: str,
+                      cache_dir: str = None, tools: dict[str, str] = None, watch: bool = False):
     """
     压缩处理视频文件的主函数
     参数:
@@ -209,49 +544,121 @@ def compression_files(queue: Queue, config: Config, delete_audio: bool, delete_s
         config: 压缩配置对象，包含压缩参数
         delete_audio: 是否删除原始音频文件的布尔值
         delete_source: 是否删除源文件的布尔值
-        file_paths: 要处理的文件路径列表
+        file_paths: 要处理的文件与目录，可以是惰性的可迭代对象
         recurse: 是否递归处理子目录的布尔值
+        temp_root: 各任务临时目录的父目录
+        cache_dir: 压缩结果缓存所在目录，为空时不跳过已压缩的文件
+        tools: 外部工具路径，默认为 META_INFO["TOOLS"]
+        watch: file_paths 是否为不会结束的目录监视（FolderWatcher），此时不能等待完整的文件列表
     返回:
         None
     """
 
+    progress = BatchProgress(0)
+    result_cache = None
+    prober = None
+    metrics = None
+    scratch = None
     try:
-        # Preprocess file list (expand directories if needed)
-        files_to_process = []
-
-        for file_path in file_paths:
-            if not file_path or not os.path.exists(file_path):
-                continue
-
-            if os.path.isdir(file_path) and recurse:
-                # Recursively scan directory for video files
-                _, video_files = scan_directory(file_path, video_extensions)
-                files_to_process.extend(video_files)
-            elif is_video_file(file_path, video_extensions):
-                files_to_process.append(file_path)
+        if watch and config.schedule.mode == "cost":
+            # 按耗时排序需要完整的文件列表，监视目录时永远拿不到
+            send_message(queue, CompressionErrorMessage(
+                "错误", '监视目录时不能使用 schedule.mode = "cost"，请改用 "fifo"'))
+            return
+        if watch and config.throughput.mode == "deadline":
+            # 截止时间按批次剩余的文件数分配，监视目录的批次没有终点
+            send_message(queue, CompressionErrorMessage(
+                "错误", '监视目录时不能使用 throughput.mode = "deadline"，可改用 "files_per_hour"'))
+            return
 
-        if not files_to_process:
+        result_cache = open_result_cache(cache_dir)
+        encode_key = get_encode_key(config, delete_audio)
+        prober = open_prober(cache_dir)
+        metrics = BatchMetrics(config.metrics.records_file, config.metrics.prometheus_file)
+        scratch = open_scratch(config, temp_root)
+        governor = CpuGovernor(config) if config.governor.enabled else None
+        presets = PresetSelector(config) if config.throughput.mode != "off" else None
+        # 发现、探测与编码同时进行：发现的文件先提交探测，再交给编码线程池。
+        # 待处理的任务数有上限，发现速度超过编码速度时扫描会暂停，内存占用不会随目录规模增长
+        window = threading.Semaphore(config.max_parallel_jobs + PROBE_WORKERS)
+        logging.info(f"使用 {config.max_parallel_jobs} 个并行任务处理文件")
+
+        files = iter_video_files(file_paths, recurse, video_extensions, unique=not watch)
+        duplicates = {}
+        if config.dedup.enabled and watch:
+            logging.warning("监视目录时文件列表不会结束，不查找内容相同的文件")
+            send_message(queue, WarningMessage("警告", "监视目录时不支持 dedup（相同文件只压缩一次），已忽略该选项"))
+        elif config.dedup.enabled:
+            # 需要完整的文件列表才能找出内容相同的文件，每组只压缩第一个
+            files, duplicates = find_duplicates(list(files))
+        if config.schedule.mode == "cost":
+            # 需要先拿到完整的文件列表与探测结果，才能按预计耗时从长到短排序
+            plan = schedule_files(list(files), config, prober)
+            files = plan.file_paths
+            if files:
+                send_message(queue, SchedulePlanMessage(len(files), config.max_parallel_jobs, plan.makespan))
+        # 截止时间模式按尚未结束的文件数分配时间，需要事先知道批次的全部文件，边扫描边计数会低估
+        counted = presets is not None and config.throughput.mode == "deadline"
+        if counted:
+            files = list(files)
+            progress.add_files(len(files) + sum(len(copies) for copies in duplicates.values()))
+
+        with ThreadPoolExecutor(max_workers=config.max_parallel_jobs) as executor:
+            index = 0
+            for file_path in files:
+                # 内容相同的副本紧跟在被压缩的文件之后编号
+                copies = [(index + i, path) for i, path in enumerate(duplicates.get(file_path, []), 2)]
+                index += 1
+                if not counted:
+                    progress.add_files(1 + len(copies))
+                if index == 1:
+                    send_message(queue, CompressionStartMessage(progress.total))
+
+                # 已有结果的文件会被跳过，不必探测
+                if not (result_cache and result_cache.has_result(file_path, encode_key)):
+                    prober.submit(file_path)
+                window.acquire()
+                future = executor.submit(
+                    process_file_group,
+                    copies,
+                    queue=queue,
+                    file_path=file_path,
+                    config=config,
+                    delete_audio=delete_audio,
+                    delete_source=delete_source,
+                    index=index,
+                    total=progress.total,
+                    temp_root=temp_root,
+                    progress=progress,
+                    result_cache=result_cache,
+                    prober=prober,
+                    tools=tools,
+                    metrics=metrics,
+                    scratch=scratch,
+                    governor=governor,
+                    presets=presets
+                )
+                future.add_done_callback(lambda _: window.release())
+                index += len(copies)
+
+        if progress.total == 0:
             send_message(queue, CompressionErrorMessage("错误", "没有找到可处理的视频文件"))
             return
 
-        send_message(queue, CompressionStartMessage(len(files_to_process)))
-
-        # Process each file
-        for index, file_path in enumerate(files_to_process, 1):
-            process_single_file(
-                queue=queue,
-                file_path=file_path,
-                config=config,
-                delete_audio=delete_audio,
-                delete_source=delete_source,
-                index=index,
-                total=len(files_to_process),
-                temp_file_names=temp_file_names
-            )
-
         # Signal completion
-        send_message(queue, CompressionFinishedMessage(len(files_to_process)))
+        send_message(queue, CompressionFinishedMessage(progress.total))
 
     except Exception as e:
         logging.error(f"压缩处理失败: {e}")
         send_message(queue, CompressionErrorMessage("错误", f"发生错误！\n{e}"))
+
+    finally:
+        # 监视目录时文件列表不会自然结束，停止监视、出错或中断时同样要保存缓存并写出批次汇总
+        if prober:
+            prober.close()
+        if result_cache:
+            result_cache.save()
+        if metrics and progress.total:
+            metrics.finish()
+        if scratch:
+            scratch.close()
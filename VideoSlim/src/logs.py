@@ -0,0 +1,221 @@
+import contextvars
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from datetime import datetime
+from logging.handlers import QueueHandler
+from typing import Callable, Optional
+
+# 单个编码器日志的大小上限（字节），超出时只保留开头与最后的输出
+JOB_LOG_MAX_BYTES = 1024 * 1024
+# 编码器日志目录中最多保留的文件数，更早的被删除
+JOB_LOG_KEEP = 200
+
+# LogRecord 自带的属性；其余属性来自 extra=... 或日志上下文，写入结构化日志
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+# 当前线程（或 Context）所处的文件、阶段等信息，由 ContextFilter 附加到日志记录上
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+# 编码器日志目录，为 None 时不记录，见 configure_job_logs
+_job_log_dir: Optional[str] = None
+_job_log_lock = threading.Lock()
+
+
+def bind_log_context(**fields) -> contextvars.Token:
+    """
+    为之后的日志记录附加字段（如 file_path、stage），直到 reset_log_context
+    :param fields: 字段
+    :return: 交给 reset_log_context 的令牌
+    """
+    return _context.set({**_context.get(), **fields})
+
+
+def reset_log_context(token: contextvars.Token):
+    """
+    恢复 bind_log_context 之前的日志上下文
+    :param token: bind_log_context 的返回值
+    """
+    _context.reset(token)
+
+
+def submit_with_context(executor: Executor, fn: Callable, *args) -> Future:
+    """
+    与 executor.submit 相同，但任务在提交时的日志上下文中执行，线程池中的日志也能带上所属文件
+    :param executor: 线程池
+    :param fn: 任务函数
+    :param args: 任务参数
+    :return: Future
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class ContextFilter(logging.Filter):
+    """
+    把日志上下文附加到日志记录上，需要在产生日志的线程中执行（即添加到 LogQueueHandler 上）
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    把日志记录放入队列，由后台线程写入文件
+
+    标准的 QueueHandler 会把异常并入消息文本并丢弃 exc_info，结构化日志因此没有 exception 字段。
+    这里在产生日志的线程中把异常格式化为 exc_text 保留下来（不保留 traceback 对象，避免其引用的栈帧
+    在队列中存活），消息只合并参数；ContextFilter 附加的字段随记录的副本一起传递。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# 只用于格式化异常，结果与 logging.Formatter 写入文本日志的相同
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    将日志记录格式化为一行 JSON，包含 extra=... 与日志上下文中的字段
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in _STANDARD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class EncoderLog:
+    """
+    Captured output of the external tools of one job
+
+    The file stays within about max_bytes. The start of the output (the commands and the
+    encoder's settings) is written as it arrives. Once half the budget is used, only the most
+    recent lines are kept in memory and written when the log is closed, so the error that ended
+    a failed encode is always in the file.
+    """
+
+    def __init__(self, path: str, max_bytes: int = JOB_LOG_MAX_BYTES):
+        """
+        :param path: 日志文件路径
+        :param max_bytes: 文件大小上限（字节）
+        :raises OSError: 无法创建文件
+        """
+        self.path = path
+        self._head_limit = max_bytes // 2
+        self._tail_limit = max_bytes - self._head_limit
+        self._file = open(path, "w", encoding="utf-8", errors="replace")
+        self._written = 0
+        self._tail: deque[str] = deque()
+        self._tail_bytes = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def write(self, line: str, source: str = ""):
+        """
+        写入一行输出，可以在多个线程中同时调用
+        :param line: 输出内容
+        :param source: 产生该行的程序名
+        """
+        text = f"[{source}] {line}\n" if source else f"{line}\n"
+        size = len(text.encode("utf-8", errors="replace"))
+        with self._lock:
+            if self._file is None:
+                return
+            if not self._tail and self._written + size <= self._head_limit:
+                self._file.write(text)
+                self._written += size
+                return
+            self._tail.append(text)
+            self._tail_bytes += size
+            while self._tail_bytes > self._tail_limit and len(self._tail) > 1:
+                self._tail_bytes -= len(self._tail.popleft().encode("utf-8", errors="replace"))
+                self._dropped += 1
+
+    def close(self):
+        """写入保留的最后输出并关闭文件"""
+        with self._lock:
+            if self._file is None:
+                return
+            if self._dropped:
+                self._file.write(f"... 省略 {self._dropped} 行 ...\n")
+            self._file.writelines(self._tail)
+            self._file.close()
+            self._file = None
+
+
+def _prune_job_logs(directory: str, keep: int):
+    """删除最早的编码器日志，只保留 keep 个"""
+    try:
+        paths = [entry.path for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(".log")]
+    except OSError:
+        return
+    # 文件名以时间开头，按名称排序即按时间排序
+    paths.sort()
+    for path in paths[:max(0, len(paths) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def configure_job_logs(directory: Optional[str]):
+    """
+    设置编码器日志目录
+    :param directory: 目录，为 None 或空时不记录编码器输出
+    """
+    global _job_log_dir
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _job_log_dir = directory or None
+
+
+def open_encoder_log(file_path: str, index: int) -> Optional[EncoderLog]:
+    """
+    为一个任务创建编码器日志
+    :param file_path: 任务处理的文件
+    :param index: 任务序号
+    :return: 编码器日志，未设置目录或无法创建时返回 None
+    """
+    directory = _job_log_dir
+    if not directory:
+        return None
+    stem = re.sub(r'[\\/:*?"<>|\s]+', "_", os.path.splitext(os.path.basename(file_path))[0])[:64]
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{index:04d}_{stem}.log"
+    try:
+        with _job_log_lock:
+            _prune_job_logs(directory, JOB_LOG_KEEP - 1)
+        return EncoderLog(os.path.join(directory, name))
+    except OSError as e:
+        logging.warning(f"无法创建编码器日志 {name}: {e}")
+        return None
@@ -0,0 +1,106 @@
+import os
+import threading
+from typing import Callable, Iterable, Iterator
+
+
+def get_path_key(path: str) -> str:
+    """
+    路径去重用的键：规范化分隔符、相对路径与 Windows 下的大小写
+    :param path: 路径
+    :return: 键
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+class Manifest:
+    """
+    An ordered, de-duplicated list of input paths
+
+    The GUI keeps the batch here instead of in a text widget, so a batch of any size costs one
+    string and one set entry per path. Appending is O(1); removals rebuild the list once per
+    call, whatever the number of rows removed. iter_paths() streams the paths to the worker
+    without copying them: appends only grow the list, and removals and clear() swap in a new
+    list, so a stream already running is never disturbed.
+    """
+
+    def __init__(self):
+        self._paths: list[str] = []
+        self._keys: set[str] = set()
+        self._listeners: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[], None]):
+        """
+        注册内容变化时的回调，在修改模型的线程中调用
+        :param listener: 回调函数
+        """
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __getitem__(self, row: int) -> str:
+        return self._paths[row]
+
+    def extend(self, paths: Iterable[str]) -> int:
+        """
+        追加路径，已在列表中的路径与空行被忽略
+        :param paths: 路径
+        :return: 实际追加的数量
+        """
+        added = 0
+        with self._lock:
+            for path in paths:
+                path = path.strip()
+                if not path:
+                    continue
+                key = get_path_key(path)
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+                self._paths.append(path)
+                added += 1
+        if added:
+            self._notify()
+        return added
+
+    def remove(self, rows: Iterable[int]) -> int:
+        """
+        删除指定行
+        :param rows: 行号
+        :return: 删除的数量
+        """
+        with self._lock:
+            rows = {row for row in rows if 0 <= row < len(self._paths)}
+            if not rows:
+                return 0
+            kept = [path for row, path in enumerate(self._paths) if row not in rows]
+            for row in rows:
+                self._keys.discard(get_path_key(self._paths[row]))
+            self._paths = kept
+        self._notify()
+        return len(rows)
+
+    def clear(self):
+        """清空列表"""
+        with self._lock:
+            self._paths = []
+            self._keys = set()
+        self._notify()
+
+    def iter_paths(self) -> Iterator[str]:
+        """
+        Stream the paths present at the time of the call
+
+        Rows added or removed afterwards do not affect the returned iterator.
+
+        Returns:
+            An iterator over the paths, in the order they were added
+        """
+        with self._lock:
+            paths, count = self._paths, len(self._paths)
+        return (paths[row] for row in range(count))
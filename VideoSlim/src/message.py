@@ -1,8 +1,17 @@
-from wx.lib.evtmgr import MessageAdapter
+from typing import Optional
 
 
 class Message:
-    pass
+    def to_dict(self) -> dict:
+        """转换为可被 json 序列化的字典，"type" 为消息类名"""
+        return {"type": type(self).__name__, **vars(self)}
+
+    def coalesce_key(self) -> Optional[tuple]:
+        """
+        高频消息的合并键：尚未被处理的、键相同的旧消息会被新消息替换
+        :return: 合并键，None 表示不合并
+        """
+        return None
 
 
 class WarningMessage(Message):
@@ -48,8 +57,64 @@ class CompressionStartMessage(Message):
         self.total = total
 
 
+class SchedulePlanMessage(Message):
+    """批次按预计耗时排序后、开始处理前发送"""
+
+    def __init__(self, total: int, workers: int, makespan: float):
+        self.total = total
+        self.workers = workers
+        self.makespan = makespan
+
+
 class CompressionProgressMessage(Message):
     def __init__(self, current: int, total: int, file_name: str):
         self.current = current
         self.total = total
         self.file_name = file_name
+
+
+class CompressionSkippedMessage(Message):
+    def __init__(self, current: int, total: int, file_name: str, reason: str):
+        self.current = current
+        self.total = total
+        self.file_name = file_name
+        self.reason = reason
+
+
+class CompressionNotWorthMessage(CompressionSkippedMessage):
+    """抽样预测的体积节省不足，文件未压缩，源文件保留"""
+
+    def __init__(self, current: int, total: int, file_name: str, source_size: int, predicted_size: int,
+                 saving: float):
+        super().__init__(current, total, file_name, f"预计仅节省 {saving:.0%}，不值得压缩")
+        self.source_size = source_size
+        self.predicted_size = predicted_size
+        self.saving = saving
+
+
+class CompressionDuplicateMessage(CompressionSkippedMessage):
+    """文件与批次中另一个文件内容相同，直接复用了那个文件的压缩结果"""
+
+    def __init__(self, current: int, total: int, file_name: str, original: str):
+        super().__init__(current, total, file_name, f"与 {original} 内容相同，已复用其压缩结果")
+        self.original = original
+
+
+class EncodeProgressMessage(Message):
+    """编码器实时进度，由编码器输出解析而来，发送频率受限"""
+
+    def __init__(self, current: int, total: int, file_name: str, frames_done: int, total_frames: int,
+                 fps: float, bitrate: float, file_eta: Optional[float], batch_eta: Optional[float]):
+        self.current = current
+        self.total = total
+        self.file_name = file_name
+        self.frames_done = frames_done
+        self.total_frames = total_frames
+        self.fps = fps
+        self.bitrate = bitrate
+        self.file_eta = file_eta
+        self.batch_eta = batch_eta
+
+    def coalesce_key(self) -> Optional[tuple]:
+        # 每个任务只保留最新的进度
+        return type(self).__name__, self.current
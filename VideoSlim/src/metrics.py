@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from subprocess import Popen
+from typing import Any, Dict, List, Optional
+
+from .tools import save_text_atomic
+
+
+class ProcessStats:
+    """
+    一个子进程结束时的资源使用情况
+    """
+
+    def __init__(self, command: str, exit_code: int, wall_seconds: float, user_seconds: float = 0.0,
+                 system_seconds: float = 0.0, peak_rss: int = 0, read_bytes: int = 0, write_bytes: int = 0):
+        """
+        :param command: 程序名
+        :param exit_code: 退出码
+        :param wall_seconds: 从启动到退出的时间（秒）
+        :param user_seconds: 用户态 CPU 时间（秒）
+        :param system_seconds: 内核态 CPU 时间（秒）
+        :param peak_rss: 内存占用峰值（字节）
+        :param read_bytes: 读取的字节数（含管道）
+        :param write_bytes: 写入的字节数（含管道）
+        """
+        self.command = command
+        self.exit_code = exit_code
+        self.wall_seconds = wall_seconds
+        self.user_seconds = user_seconds
+        self.system_seconds = system_seconds
+        self.peak_rss = peak_rss
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _read_proc_io(pid: int) -> Optional[tuple[int, int]]:
+    """读取 Linux /proc/<pid>/io 中的 rchar 与 wchar，进程必须尚未被回收"""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _wait_posix(process: Popen) -> Dict[str, Any]:
+    io = None
+    if hasattr(os, "waitid") and sys.platform.startswith("linux"):
+        # 先等待退出但不回收，趁 /proc 条目还在时读出 IO 计数
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        io = _read_proc_io(process.pid)
+
+    _, status, usage = os.wait4(process.pid, 0)
+    # 进程已由 wait4 回收，Popen 只能从这里得知退出码
+    process.returncode = os.waitstatus_to_exitcode(status)
+    read_bytes, write_bytes = io or (usage.ru_inblock * 512, usage.ru_oublock * 512)
+    return {
+        "user_seconds": usage.ru_utime,
+        "system_seconds": usage.ru_stime,
+        # Linux 以 KiB 为单位，macOS 以字节为单位
+        "peak_rss": usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+    }
+
+
+def _wait_windows(process: Popen) -> Dict[str, Any]:
+    import ctypes
+    from ctypes import wintypes
+
+    class IoCounters(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+            "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    process.wait()
+    # Popen 在对象销毁前一直持有进程句柄，已退出进程的计数仍可查询
+    handle = wintypes.HANDLE(int(process._handle))
+    kernel32 = ctypes.WinDLL("kernel32")
+
+    creation, exit_time, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+    kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                             ctypes.byref(kernel), ctypes.byref(user))
+    io = IoCounters()
+    kernel32.GetProcessIoCounters(handle, ctypes.byref(io))
+    memory = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+    kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb)
+
+    return {
+        # FILETIME 以 100 纳秒为单位
+        "user_seconds": user.value / 1e7,
+        "system_seconds": kernel.value / 1e7,
+        "peak_rss": memory.PeakWorkingSetSize,
+        "read_bytes": io.ReadTransferCount,
+        "write_bytes": io.WriteTransferCount,
+    }
+
+
+def wait_process(process: Popen, command: List[str], started: float) -> ProcessStats:
+    """
+    Wait for a child process and collect its resource usage
+
+    POSIX uses wait4() for CPU time and peak RSS, plus /proc/<pid>/io on Linux for the bytes
+    read and written (pipes included). Windows queries the process handle. When the counters
+    cannot be read, only the exit code and wall time are recorded.
+
+    Args:
+        process: The child process
+        command: Argument list the process was started with
+        started: time.perf_counter() when the process was started
+
+    Returns:
+        Resource usage of the process
+    """
+    usage = {}
+    try:
+        if process.returncode is None:
+            usage = _wait_windows(process) if os.name == "nt" else _wait_posix(process)
+    except Exception as e:
+        logging.debug(f"无法读取进程 {process.pid} 的资源使用情况: {e}")
+    process.wait()
+    return ProcessStats(os.path.basename(command[0]), process.returncode, time.perf_counter() - started, **usage)
+
+
+def get_stage_kind(name: str) -> str:
+    """
+    去掉阶段名称末尾的序号，同类阶段汇总在一起，例如 audio_1 -> audio
+    :param name: 阶段名称
+    :return: 阶段类别
+    """
+    return re.sub(r"_\d+$", "", name)
+
+
+def _sum_processes(processes: List[ProcessStats]) -> Dict[str, Any]:
+    return {
+        "cpu_seconds": sum(p.user_seconds + p.system_seconds for p in processes),
+        "peak_rss": max((p.peak_rss for p in processes), default=0),
+        "read_bytes": sum(p.read_bytes for p in processes),
+        "write_bytes": sum(p.write_bytes for p in processes),
+    }
+
+
+class JobMetrics:
+    """
+    一个文件各处理阶段的耗时与资源使用情况，可被多个阶段线程同时写入
+    """
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: 源文件路径
+        """
+        self.file_path = file_path
+        # ok / failed / skipped
+        self.status = "ok"
+        self.stages: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, wall_seconds: float, processes: List[ProcessStats] = None, ok: bool = True):
+        """
+        记录一个已结束的阶段
+        :param name: 阶段名称
+        :param wall_seconds: 耗时（秒）
+        :param processes: 该阶段启动的子进程
+        :param ok: 是否成功
+        """
+        processes = processes or []
+        stage = {"name": name, "kind": get_stage_kind(name), "wall_seconds": wall_seconds, "ok": ok,
+                 **_sum_processes(processes), "processes": [p.to_dict() for p in processes]}
+        with self._lock:
+            self.stages.append(stage)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            "type": "job",
+            "time": time.time(),
+            "file": self.file_path,
+            "status": self.status,
+            "wall_seconds": time.perf_counter() - self._started,
+            "cpu_seconds": sum(stage["cpu_seconds"] for stage in stages),
+            "stages": stages,
+        }
+
+
+class BatchMetrics:
+    """
+    Aggregate job metrics over a batch and export them
+
+    Every finished job is appended to the records file as one JSON line. When the batch ends a
+    batch summary line follows, and the per-stage totals are written to the Prometheus textfile
+    (for node_exporter's textfile collector) if one is configured.
+    """
+
+    def __init__(self, records_file: str = None, prometheus_file: str = None):
+        """
+        :param records_file: JSON 行记录文件（追加写入），为空时不写
+        :param prometheus_file: Prometheus textfile 路径，为空时不写
+        """
+        self.records_file = records_file
+        self.prometheus_file = prometheus_file
+        self.files: Dict[str, int] = {"ok": 0, "failed": 0, "skipped": 0}
+        # 阶段类别 -> 汇总值
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        # 只保护记录文件的写入，汇总用的 _lock 不会因为磁盘慢而被长时间占用
+        self._write_lock = threading.Lock()
+
+    def _append_record(self, record: Dict[str, Any]):
+        if not self.records_file:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.records_file)), exist_ok=True)
+            with self._write_lock, open(self.records_file, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            logging.warning(f"写入指标记录 {self.records_file} 失败: {e}")
+
+    def add_job(self, job: JobMetrics):
+        """
+        汇总一个已结束的文件并写出它的记录
+        :param job: 该文件的指标
+        """
+        record = job.to_dict()
+        with self._lock:
+            self.files[job.status] = self.files.get(job.status, 0) + 1
+            for stage in record["stages"]:
+                total = self.stages.setdefault(stage["kind"], {
+                    "count": 0, "failures": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                    "peak_rss": 0, "read_bytes": 0, "write_bytes": 0})
+                total["count"] += 1
+                total["failures"] += 0 if stage["ok"] else 1
+                total["peak_rss"] = max(total["peak_rss"], stage["peak_rss"])
+                for key in ("wall_seconds", "cpu_seconds", "read_bytes", "write_bytes"):
+                    total[key] += stage[key]
+        self._append_record(record)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "type": "batch",
+                "time": time.time(),
+                "wall_seconds": time.perf_counter() - self._started,
+                "files": dict(self.files),
+                "stages": {kind: dict(total) for kind, total in self.stages.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """按 Prometheus 文本格式输出批次汇总"""
+        batch = self.to_dict()
+        lines = [
+            "# HELP videoslim_batch_files Files of the last batch by result.",
+            "# TYPE videoslim_batch_files gauge",
+            *(f'videoslim_batch_files{{status="{status}"}} {count}' for status, count in batch["files"].items()),
+            "# HELP videoslim_batch_wall_seconds Duration of the last batch.",
+            "# TYPE videoslim_batch_wall_seconds gauge",
+            f"videoslim_batch_wall_seconds {batch['wall_seconds']:.3f}",
+            "# HELP videoslim_batch_end_time_seconds Unix time the last batch ended.",
+            "# TYPE videoslim_batch_end_time_seconds gauge",
+            f"videoslim_batch_end_time_seconds {batch['time']:.0f}",
+        ]
+        metrics = [
+            ("stage_runs", "count", "Stages run"),
+            ("stage_failures", "failures", "Stages that failed"),
+            ("stage_wall_seconds", "wall_seconds", "Wall time spent in stages"),
+            ("stage_cpu_seconds", "cpu_seconds", "CPU time of the stage processes"),
+            ("stage_peak_rss_bytes", "peak_rss", "Largest peak RSS of a stage process"),
+            ("stage_read_bytes", "read_bytes", "Bytes read by the stage processes"),
+            ("stage_write_bytes", "write_bytes", "Bytes written by the stage processes"),
+        ]
+        for name, key, description in metrics:
+            lines += [f"# HELP videoslim_{name} {description} in the last batch, by stage.",
+                      f"# TYPE videoslim_{name} gauge"]
+            lines += [f'videoslim_{name}{{stage="{kind}"}} {round(total[key], 3)}'
+                      for kind, total in batch["stages"].items()]
+        return "\n".join(lines) + "\n"
+
+    def finish(self):
+        """批次结束：写出批次汇总记录与 Prometheus textfile"""
+        self._append_record(self.to_dict())
+        if self.prometheus_file:
+            try:
+                save_text_atomic(self.prometheus_file, self.to_prometheus())
+            except OSError as e:
+                logging.warning(f"写入 Prometheus 指标文件 {self.prometheus_file} 失败: {e}")
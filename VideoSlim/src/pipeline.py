@@ -0,0 +1,241 @@
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, IO, Iterator, Optional
+
+from .governor import CpuAllotment
+from .logs import EncoderLog, bind_log_context, reset_log_context, submit_with_context
+from .metrics import JobMetrics, ProcessStats, wait_process
+
+# 隐藏 Windows 下子进程的控制台窗口，其他平台没有该标志
+CREATION_FLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+def iter_output_lines(stream: IO[bytes]) -> Iterator[str]:
+    """
+    Yield lines from a process output stream as soon as they are written
+
+    Encoders redraw their progress line with a carriage return, so both CR and LF end a
+    line here.
+
+    Args:
+        stream: Binary output stream of a process
+    """
+    buffer = b""
+    while True:
+        chunk = stream.read1(4096)
+        if not chunk:
+            break
+        parts = re.split(rb"[\r\n]", buffer + chunk)
+        buffer = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.decode("utf-8", errors="replace")
+    if buffer.strip():
+        yield buffer.decode("utf-8", errors="replace")
+
+
+def _drain_to_log(stream: IO[bytes], log: EncoderLog, source: str):
+    """把子进程的一个输出流逐行写入编码器日志，直到流结束"""
+    for line in iter_output_lines(stream):
+        log.write(line, source)
+
+
+def run_pipeline(commands: list[list[str]], on_output: Callable[[str], None] = None,
+                 stats: list[ProcessStats] = None, cpu: CpuAllotment = None, log: EncoderLog = None):
+    """
+    Run commands joined by OS pipes, like ``a | b | c`` in a shell
+
+    Each command's stdout feeds the next command's stdin, so nothing is written to disk
+    between the stages. A single command is simply run on its own.
+
+    Args:
+        commands: Argument lists of the commands, in pipe order
+        on_output: Called with every stderr line of the last command while it runs
+        stats: If given, the resource usage of every process is appended to it
+        cpu: If given, its CPU affinity and priority are applied to every process
+        log: If given, the stderr of every process and the stdout of the last one are written to it
+
+    Raises:
+        subprocess.CalledProcessError: If any command in the pipeline fails
+        OSError: If a command cannot be started; the commands already started are killed
+    """
+    command_line = ' | '.join(subprocess.list2cmdline(command) for command in commands)
+    logging.info(f"执行命令: {command_line}")
+    if log:
+        log.write(f"$ {command_line}")
+
+    processes = []
+    # 在后台线程中读入编码器日志的输出流，管道缓冲区写满时子进程会被阻塞
+    readers = []
+    stdin = None
+    try:
+        for i, command in enumerate(commands):
+            is_last = i == len(commands) - 1
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                command,
+                stdin=stdin,
+                # 不记录时丢弃最后一个命令的 stdout，不能继承父进程的 stdout（命令行模式在其中输出 JSON 行）
+                stdout=subprocess.PIPE if not is_last or log else subprocess.DEVNULL,
+                stderr=subprocess.PIPE if (is_last and on_output) or log else None,
+                creationflags=CREATION_FLAGS | (cpu.creation_flags() if cpu else 0)
+            )
+            if cpu:
+                cpu.apply(process)
+            # The parent's copy must be closed so the upstream process sees SIGPIPE/EOF correctly
+            if stdin is not None:
+                stdin.close()
+            stdin = process.stdout
+            processes.append((process, started))
+
+            if log:
+                source = os.path.basename(command[0])
+                streams = [process.stderr] if not (is_last and on_output) else []
+                if is_last:
+                    streams.append(process.stdout)
+                for stream in streams:
+                    reader = threading.Thread(target=_drain_to_log, args=(stream, log, source), daemon=True)
+                    reader.start()
+                    readers.append(reader)
+
+        if on_output:
+            source = os.path.basename(commands[-1][0])
+            for line in iter_output_lines(processes[-1][0].stderr):
+                if log:
+                    log.write(line, source)
+                on_output(line)
+    except BaseException:
+        # A later command could not be started or its output handler failed: the processes
+        # already running would wait forever on their pipes, so they are stopped here
+        for process, _ in processes:
+            if process.poll() is None:
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+        if len(processes) < len(commands) and stdin is not None:
+            # Read end of the last started process that no downstream command took over
+            stdin.close()
+        raise
+    finally:
+        for command, (process, started) in zip(commands, processes):
+            process_stats = wait_process(process, command, started)
+            if stats is not None:
+                stats.append(process_stats)
+        for reader in readers:
+            reader.join()
+        if log:
+            for command, (process, _) in zip(commands, processes):
+                if process.returncode != 0:
+                    log.write(f"{os.path.basename(command[0])} 退出码 {process.returncode}")
+
+    for command, (process, _) in zip(commands, processes):
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+
+class Stage:
+    """
+    处理流程中的一个阶段：一条管道命令（或一个函数）以及它所依赖的其他阶段
+    """
+
+    def __init__(self, name: str, commands: list[list[str]] = None, depends: list[str] = None,
+                 on_output: Callable[[str], None] = None, action: Callable[[], None] = None,
+                 cpu: CpuAllotment = None, log: EncoderLog = None):
+        """
+        :param name: 阶段名称，在同一个流程中唯一
+        :param commands: 以管道相连的命令参数列表
+        :param depends: 必须先完成的阶段名称
+        :param on_output: 逐行接收管道最后一个命令的 stderr 输出
+        :param action: 代替 commands 执行的函数，用于内部还要再拆分的阶段（如分段编码），
+            其中启动的子进程应记录到 processes
+        :param cpu: 应用到 commands 中各子进程的 CPU 绑定与优先级
+        :param log: 记录 commands 中各子进程输出的编码器日志
+        """
+        self.name = name
+        self.commands = commands
+        self.depends = depends or []
+        self.on_output = on_output
+        self.action = action
+        self.cpu = cpu
+        self.log = log
+        # 执行后的耗时（秒）与各子进程的资源使用情况
+        self.elapsed = 0.0
+        self.processes: list[ProcessStats] = []
+
+    def run(self) -> float:
+        """
+        执行该阶段，失败时抛出异常
+        :return: 耗时（秒）
+        """
+        start = time.perf_counter()
+        # 阶段中产生的日志记录都带有阶段名
+        token = bind_log_context(stage=self.name)
+        try:
+            if self.action:
+                self.action()
+            else:
+                run_pipeline(self.commands, self.on_output, self.processes, self.cpu, self.log)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            reset_log_context(token)
+        return self.elapsed
+
+
+def run_stage_graph(stages: list[Stage], metrics: Optional[JobMetrics] = None):
+    """
+    Run stages as a dependency graph
+
+    A stage starts as soon as every stage it depends on has finished, so independent
+    branches (e.g. audio and video encoding) run at the same time. After a failure no new
+    stage is started; stages already running are allowed to finish.
+
+    Args:
+        stages: Stages of the pipeline
+        metrics: If given, every stage that ran is recorded in it, failed ones included
+
+    Raises:
+        Exception: The first error raised by a stage
+        ValueError: If some stages can never run because of unknown or cyclic dependencies
+    """
+    remaining = {stage.name: stage for stage in stages}
+    running = {}
+    finished = set()
+    error = None
+
+    with ThreadPoolExecutor(max_workers=max(1, len(stages))) as executor:
+        while remaining or running:
+            if error is None:
+                for name, stage in list(remaining.items()):
+                    if all(dep in finished for dep in stage.depends):
+                        logging.debug(f"开始阶段: {name}")
+                        running[submit_with_context(executor, stage.run)] = stage
+                        del remaining[name]
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    future.result()
+                    finished.add(stage.name)
+                    logging.info(f"阶段 {stage.name} 完成，耗时 {stage.elapsed:.2f} 秒",
+                                 extra={"stage": stage.name, "stage_seconds": stage.elapsed})
+                except Exception as e:
+                    logging.error(f"阶段 {stage.name} 失败: {e}")
+                    if error is None:
+                        error = e
+                if metrics:
+                    metrics.add_stage(stage.name, stage.elapsed, stage.processes, stage.name in finished)
+
+    if error is not None:
+        raise error
+    if remaining:
+        raise ValueError(f"无法执行的阶段（依赖缺失或循环依赖）: {', '.join(remaining)}")
@@ -0,0 +1,89 @@
+import logging
+import os
+from typing import Any, Dict
+
+from .commands import AUDIO_BIT_RATE, can_copy_audio, get_x264_command, get_y4m_decode_command
+from .config import Config
+from .governor import CpuAllotment
+from .logs import EncoderLog
+from .metrics import JobMetrics
+from .pipeline import Stage, run_stage_graph
+from .probe import ProbeInfo
+from .settings import META_INFO
+
+
+def get_sample_starts(duration: float, samples: int, sample_duration: float) -> list[float]:
+    """
+    在视频中均匀选取抽样片段的起始时间，避开开头和结尾
+    :param duration: 视频时长（秒）
+    :param samples: 片段数
+    :param sample_duration: 每段时长（秒）
+    :return: 各片段起始时间（秒）
+    """
+    return [max(0.0, duration * (i + 1) / (samples + 1) - sample_duration / 2) for i in range(samples)]
+
+
+def predict_output_size(file_path: str, probe: ProbeInfo, config: Config, temp_dir: str,
+                        audio_tracks: list[Dict[str, Any]], tools: dict[str, str] = None,
+                        metrics: JobMetrics = None, cpu: CpuAllotment = None, log: EncoderLog = None) -> int:
+    """
+    Predict the size of the compressed output by encoding a few short samples
+
+    Evenly spaced windows of the source are encoded with the selected x264 settings (all at
+    once), and their bitrate is extrapolated to the whole duration. Audio tracks are added at
+    their own bitrate when they will be copied, otherwise at the fixed AAC bitrate.
+
+    Args:
+        file_path: Source video
+        probe: Probe result of the source
+        config: Compression configuration
+        temp_dir: The job's temporary directory
+        audio_tracks: Audio tracks that will go into the output
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        metrics: If given, the sample stages are recorded in it
+        cpu: CPU allotment of the job; the samples encoded at once share it
+        log: If given, the output of every sample encode is written to it
+
+    Returns:
+        Predicted output size in bytes
+
+    Raises:
+        subprocess.CalledProcessError: If a sample encode fails
+    """
+    tools = tools or META_INFO["TOOLS"]
+    sample_duration = config.predict.sample_duration
+    starts = get_sample_starts(probe.duration, config.predict.samples, sample_duration)
+
+    sample_cpu = cpu.split(len(starts)) if cpu else None
+    threads = sample_cpu.threads if sample_cpu else 0
+
+    stages = []
+    outputs = []
+    for i, start in enumerate(starts):
+        output = os.path.join(temp_dir, f"sample_{i}.264")
+        outputs.append(output)
+        stages.append(Stage(f"sample_{i}", [
+            get_y4m_decode_command(file_path, tools, start=start, duration=sample_duration),
+            get_x264_command(config, '-', output, demuxer='y4m', tools=tools, threads=threads)
+        ], cpu=sample_cpu, log=log))
+    run_stage_graph(stages, metrics)
+
+    sample_bytes = sum(os.path.getsize(output) for output in outputs)
+    video_size = sample_bytes / (len(starts) * sample_duration) * probe.duration
+    audio_bit_rate = sum(track["bit_rate"] if config.audio_copy and can_copy_audio(track) else AUDIO_BIT_RATE
+                         for track in audio_tracks)
+    audio_size = audio_bit_rate / 8 * probe.duration
+    predicted = int(video_size + audio_size)
+    logging.info(f"文件 {file_path} 抽样 {len(starts)} 段，预计输出 {predicted} 字节，源文件 {probe.file_size} 字节")
+    return predicted
+
+
+def is_worth_predicting(probe: ProbeInfo, config: Config) -> bool:
+    """
+    判断是否需要抽样预测：关闭时或视频太短（抽样接近完整编码）时不预测
+    :param probe: 文件的探测结果
+    :param config: 压缩配置
+    :return: 需要预测时为 True
+    """
+    sampled = config.predict.samples * config.predict.sample_duration
+    return config.predict.enabled and probe.file_size > 0 and probe.duration >= sampled * 4
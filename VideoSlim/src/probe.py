@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from .tools import save_json_atomic
+
+# 预探测使用的线程数，探测主要在等待磁盘/网络，线程数可以比 CPU 核数多
+PROBE_WORKERS = 8
+
+
+def _to_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class ProbeInfo:
+    """
+    一个文件的探测结果，只保存处理流程用到的字段
+    """
+
+    def __init__(self, info: Dict[str, Any]):
+        """
+        :param info: 由 probe_file 生成或从缓存读出的字段字典
+        """
+        self.file_size: int = info.get("file_size", 0)
+        self.has_video: bool = info.get("has_video", False)
+        # 时长（秒）
+        self.duration: float = info.get("duration", 0.0)
+        self.width: int = info.get("width", 0)
+        self.height: int = info.get("height", 0)
+        self.frame_rate: float = info.get("frame_rate", 0.0)
+        self.frame_count: int = info.get("frame_count", 0)
+        # 旋转角度（度），没有旋转时为 0
+        self.rotation: float = info.get("rotation", 0.0)
+        self.video_codec: str = info.get("video_codec", "")
+        # 整体码率（bit/s）
+        self.bit_rate: int = info.get("bit_rate", 0)
+        # 每条音轨：{"codec", "profile", "bit_rate", "channels", "sampling_rate"}
+        self.audio_tracks: list[Dict[str, Any]] = info.get("audio_tracks", [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def probe_file(file_path: str) -> ProbeInfo:
+    """
+    Probe a media file with MediaInfo
+
+    Args:
+        file_path: Path to the media file
+
+    Returns:
+        Probe result of the file
+    """
+    # pymediainfo 加载 MediaInfo 动态库较慢，只在第一次真正探测时导入
+    from pymediainfo import MediaInfo
+
+    media_info = MediaInfo.parse(file_path)
+    info: Dict[str, Any] = {"file_size": os.path.getsize(file_path)}
+
+    if media_info.general_tracks:
+        general = media_info.general_tracks[0]
+        info["duration"] = _to_float(general.duration) / 1000
+        info["bit_rate"] = _to_int(general.overall_bit_rate)
+
+    if media_info.video_tracks:
+        video = media_info.video_tracks[0]
+        info["has_video"] = True
+        info["duration"] = _to_float(video.duration) / 1000 or info.get("duration", 0.0)
+        info["width"] = _to_int(video.width)
+        info["height"] = _to_int(video.height)
+        info["frame_rate"] = _to_float(video.frame_rate)
+        # 缺少帧数时按时长和帧率估算
+        info["frame_count"] = _to_int(video.frame_count) or int(info["duration"] * info["frame_rate"])
+        info["rotation"] = _to_float(getattr(video, "rotation", None)) % 360
+        info["video_codec"] = video.format or ""
+
+    info["audio_tracks"] = [
+        {
+            "codec": audio.format or "",
+            "profile": audio.format_profile or "",
+            "bit_rate": _to_int(audio.bit_rate),
+            "channels": _to_int(audio.channel_s),
+            "sampling_rate": _to_int(audio.sampling_rate),
+        }
+        for audio in media_info.audio_tracks
+    ]
+    return ProbeInfo(info)
+
+
+class ProbeCache:
+    """
+    持久化的探测结果缓存
+
+    以路径、大小和修改时间为键；超过 max_age 未被使用或超出 max_entries 的最旧条目会被淘汰。
+    可被多个工作线程同时调用。
+    """
+
+    # 累积这么多条新结果后写一次磁盘，长时间运行（如监视目录）时不会只在结束时保存
+    SAVE_INTERVAL = 20
+
+    def __init__(self, cache_file: str, max_entries: int = 50000, max_age: float = 30 * 24 * 3600):
+        """
+        :param cache_file: 缓存文件路径，不存在时会自动创建
+        :param max_entries: 最多保留的条目数
+        :param max_age: 条目最长保留时间（秒），从最后一次使用算起
+        """
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        # 键 -> {"probe": 字段字典, "used": 最后使用时间}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        stat = os.stat(file_path)
+        return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                self._entries = json.load(f)
+            logging.info(f"已加载探测缓存，共 {len(self._entries)} 条记录")
+        except Exception as e:
+            logging.warning(f"读取探测缓存 {self.cache_file} 失败，将重新建立: {e}")
+
+    def get(self, file_path: str) -> Optional[ProbeInfo]:
+        """
+        取得缓存的探测结果，文件大小或修改时间变化后视为未命中
+        :param file_path: 文件路径
+        :return: ProbeInfo 或 None
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry["used"] = time.time()
+            return ProbeInfo(entry["probe"])
+
+    def put(self, file_path: str, probe: ProbeInfo):
+        """
+        保存一个探测结果
+        :param file_path: 文件路径
+        :param probe: 探测结果
+        """
+        key = self._key(file_path)
+        with self._lock:
+            self._entries[key] = {"probe": probe.to_dict(), "used": time.time()}
+            self._unsaved += 1
+            should_save = self._unsaved >= self.SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def _evict(self):
+        expire_before = time.time() - self.max_age
+        self._entries = {key: entry for key, entry in self._entries.items() if entry["used"] >= expire_before}
+        if len(self._entries) > self.max_entries:
+            newest = sorted(self._entries.items(), key=lambda item: item[1]["used"], reverse=True)
+            self._entries = dict(newest[:self.max_entries])
+
+    def save(self):
+        """淘汰过期条目后将缓存原子地写入磁盘"""
+        with self._lock:
+            self._evict()
+            data = dict(self._entries)
+            self._unsaved = 0
+        try:
+            with self._save_lock:
+                save_json_atomic(self.cache_file, data)
+        except Exception as e:
+            logging.warning(f"保存探测缓存失败: {e}")
+
+
+class Prober:
+    """
+    在线程池中提前探测文件，编码任务需要时直接取用结果
+
+    结果优先从 ProbeCache 读取，未命中时调用 MediaInfo 并写回缓存。
+    """
+
+    def __init__(self, cache: Optional[ProbeCache] = None, max_workers: int = PROBE_WORKERS):
+        """
+        :param cache: 探测缓存，为空时每次都重新探测
+        :param max_workers: 探测线程数
+        """
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _probe(self, file_path: str) -> ProbeInfo:
+        if self.cache:
+            cached = self.cache.get(file_path)
+            if cached:
+                return cached
+
+        logging.info(f"探测文件信息: {file_path}")
+        probe = probe_file(file_path)
+        if self.cache:
+            self.cache.put(file_path, probe)
+        return probe
+
+    def submit(self, file_path: str) -> Future:
+        """
+        提交一个文件的探测，重复提交同一文件只会探测一次
+        :param file_path: 文件路径
+        :return: 探测结果的 Future
+        """
+        with self._lock:
+            future = self._futures.get(file_path)
+            if future is None:
+                future = self._executor.submit(self._probe, file_path)
+                self._futures[file_path] = future
+            return future
+
+    def get(self, file_path: str) -> ProbeInfo:
+        """
+        Get the probe result of a file, waiting for it if it is still running
+
+        Args:
+            file_path: Path to the media file
+
+        Returns:
+            Probe result of the file
+
+        Raises:
+            Exception: The error raised while probing the file
+        """
+        future = self.submit(file_path)
+        try:
+            return future.result()
+        finally:
+            # 取走后不再保留，避免大批次时 Future 一直占用内存
+            with self._lock:
+                self._futures.pop(file_path, None)
+
+    def discard(self, file_path: str):
+        """
+        放弃一个文件的探测结果（例如文件无需编码），尚未开始的探测会被取消
+        :param file_path: 文件路径
+        """
+        with self._lock:
+            future = self._futures.pop(file_path, None)
+        if future:
+            future.cancel()
+
+    def close(self):
+        """停止探测线程并保存缓存"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache:
+            self.cache.save()
+
+
+def open_prober(cache_dir: Optional[str]) -> Prober:
+    """
+    创建一个使用缓存目录下探测缓存的 Prober
+    :param cache_dir: 缓存目录，为空时不使用缓存
+    :return: Prober
+    """
+    cache = ProbeCache(os.path.join(cache_dir, "probes.json")) if cache_dir else None
+    return Prober(cache)
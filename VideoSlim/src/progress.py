@@ -0,0 +1,135 @@
+import re
+import threading
+import time
+from typing import Optional
+
+from .message import EncodeProgressMessage
+
+# x264 的进度行，例如：
+#   [45.2%] 452/1000 frames, 38.52 fps, 1502.33 kb/s, eta 0:00:14
+#   452 frames: 38.52 fps, 1502.33 kb/s        （总帧数未知，如从管道读取时）
+_X264_PROGRESS_PATTERN = re.compile(
+    r"(?P<frames>\d+)(?:/\d+)?\s+frames[,:]\s*(?P<fps>[\d.]+)\s*fps,\s*(?P<bitrate>[\d.]+)\s*kb/s"
+)
+
+
+def parse_x264_progress(line: str) -> Optional[tuple[int, float, float]]:
+    """
+    Parse one x264 progress line
+
+    Args:
+        line: A line of x264's stderr output
+
+    Returns:
+        (frames done, encode fps, bitrate in kb/s), or None if the line is not a progress line
+    """
+    match = _X264_PROGRESS_PATTERN.search(line)
+    if not match:
+        return None
+    return int(match.group("frames")), float(match.group("fps")), float(match.group("bitrate"))
+
+
+class _JobProgress:
+    def __init__(self, file_name: str, total_frames: int):
+        self.file_name = file_name
+        self.total_frames = total_frames
+        self.frames_done = 0
+        self.fps = 0.0
+        self.last_report = 0.0
+
+
+class BatchProgress:
+    """
+    汇总一个批次中所有任务的编码进度，并对进度消息限流
+
+    可被多个工作线程同时调用。
+    """
+
+    def __init__(self, total: int, min_interval: float = 0.5):
+        """
+        :param total: 批次中的文件总数，边扫描边处理时可通过 add_files 增加
+        :param min_interval: 同一任务两条进度消息之间的最小间隔（秒）
+        """
+        self.total = total
+        self.min_interval = min_interval
+        self._jobs: dict[int, _JobProgress] = {}
+        self._finished_frames = 0
+        self._finished_files = 0
+        # 计入 _finished_frames 的文件数；跳过或在开始编码前失败的文件没有帧数，不参与平均
+        self._measured_files = 0
+        self._lock = threading.Lock()
+
+    def add_files(self, count: int):
+        """批次中新发现了文件"""
+        with self._lock:
+            self.total += count
+
+    def start(self, index: int, file_name: str, total_frames: int):
+        """登记一个开始编码的任务"""
+        with self._lock:
+            self._jobs[index] = _JobProgress(file_name, total_frames)
+
+    def finish(self, index: int):
+        """登记一个已结束（成功或失败）的任务"""
+        with self._lock:
+            job = self._jobs.pop(index, None)
+            self._finished_files += 1
+            if job and job.total_frames:
+                self._finished_frames += max(job.frames_done, job.total_frames)
+                self._measured_files += 1
+
+    def remaining_files(self) -> int:
+        """尚未结束的文件数，包括正在编码的文件"""
+        with self._lock:
+            return max(self.total - self._finished_files, 0)
+
+    def update(self, index: int, frames_done: int, fps: float, bitrate: float) -> Optional[EncodeProgressMessage]:
+        """
+        Record encoder progress of a job
+
+        Args:
+            index: Index of the job's file
+            frames_done: Frames encoded so far
+            fps: Current encode speed
+            bitrate: Current output bitrate in kb/s
+
+        Returns:
+            A progress message, or None if the job reported too recently
+        """
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(index)
+            if job is None:
+                return None
+            job.frames_done = frames_done
+            job.fps = fps
+            if now - job.last_report < self.min_interval:
+                return None
+            job.last_report = now
+
+            remaining_frames = max(job.total_frames - frames_done, 0)
+            file_eta = remaining_frames / fps if fps > 0 and job.total_frames else None
+
+            return EncodeProgressMessage(
+                current=index,
+                total=self.total,
+                file_name=job.file_name,
+                frames_done=frames_done,
+                total_frames=job.total_frames,
+                fps=fps,
+                bitrate=bitrate,
+                file_eta=file_eta,
+                batch_eta=self._batch_eta()
+            )
+
+    def _batch_eta(self) -> Optional[float]:
+        # 以已知文件的平均帧数估算尚未开始的文件，再除以所有运行中任务的总速度
+        active_fps = sum(job.fps for job in self._jobs.values())
+        known_frames = [job.total_frames for job in self._jobs.values() if job.total_frames]
+        if active_fps <= 0 or not known_frames:
+            return None
+
+        average_frames = (sum(known_frames) + self._finished_frames) / (len(known_frames) + self._measured_files)
+        pending_files = max(self.total - self._finished_files - len(self._jobs), 0)
+        remaining = sum(max(job.total_frames - job.frames_done, 0) for job in self._jobs.values())
+        return (remaining + pending_files * average_frames) / active_fps
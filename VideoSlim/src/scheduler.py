@@ -0,0 +1,112 @@
+import fnmatch
+import heapq
+import logging
+from typing import Optional
+
+from .config import Config
+from .probe import ProbeInfo, Prober
+
+# x264 各 preset（0=ultrafast … 9=placebo）相对于 medium(5) 的编码耗时倍数，取自常见的 x264 基准测试
+PRESET_TIME_FACTORS = [0.15, 0.25, 0.35, 0.5, 0.7, 1.0, 1.4, 2.2, 4.0, 12.0]
+
+# medium 预设下单个 x264 进程每秒大约能处理的像素数，仅用于相对排序和粗略预估
+BASE_PIXELS_PER_SECOND = 60_000_000
+
+
+def estimate_cost(probe: Optional[ProbeInfo], preset: int) -> float:
+    """
+    Estimate how many seconds encoding a file takes
+
+    Args:
+        probe: Probe result of the file, None if probing failed
+        preset: x264 preset (0-9)
+
+    Returns:
+        Estimated encode time in seconds; 0 when the file could not be probed
+    """
+    if probe is None or not probe.has_video:
+        return 0.0
+    frames = probe.frame_count or probe.duration * (probe.frame_rate or 30)
+    pixels = frames * probe.width * probe.height
+    return pixels / BASE_PIXELS_PER_SECOND * PRESET_TIME_FACTORS[int(preset)]
+
+
+def get_priority(file_path: str, priorities: dict[str, int]) -> int:
+    """
+    取得文件的优先级，匹配多个通配符时取最大值
+    :param file_path: 文件路径
+    :param priorities: 路径通配符 -> 优先级
+    :return: 优先级，未匹配时为 0
+    """
+    matched = [priority for pattern, priority in priorities.items()
+               if fnmatch.fnmatch(file_path.replace("\\", "/"), pattern)]
+    return max(matched, default=0)
+
+
+def predict_makespan(costs: list[float], workers: int) -> float:
+    """
+    Predict the batch duration when jobs are handed, in order, to the first free worker
+
+    Args:
+        costs: Estimated job durations, in the order they are scheduled
+        workers: Number of parallel workers
+
+    Returns:
+        Predicted time until the last job finishes
+    """
+    loads = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+class SchedulePlan:
+    """
+    按预计耗时排好序的批次
+    """
+
+    def __init__(self, file_paths: list[str], costs: list[float], makespan: float):
+        """
+        :param file_paths: 处理顺序
+        :param costs: 每个文件的预计耗时（秒），与 file_paths 一一对应
+        :param makespan: 预计总耗时（秒）
+        """
+        self.file_paths = file_paths
+        self.costs = costs
+        self.makespan = makespan
+
+
+def schedule_files(file_paths: list[str], config: Config, prober: Prober) -> SchedulePlan:
+    """
+    Order a batch longest-first (LPT) to minimise the total duration
+
+    Higher-priority files always come first; within the same priority the most expensive jobs
+    start first, so a single long encode does not end up running alone at the end of the batch.
+
+    Args:
+        file_paths: Files of the batch
+        config: Compression configuration
+        prober: Prober used to get the probe data the costs are based on
+
+    Returns:
+        The ordered batch with its predicted makespan
+    """
+    for file_path in file_paths:
+        prober.submit(file_path)
+
+    jobs = []
+    for file_path in file_paths:
+        try:
+            # 不使用 get()，让结果留在 prober 中供稍后的编码任务直接取用
+            probe = prober.submit(file_path).result()
+        except Exception as e:
+            logging.warning(f"探测文件 {file_path} 失败，无法估算耗时: {e}")
+            probe = None
+        cost = estimate_cost(probe, config.X264.preset)
+        jobs.append((get_priority(file_path, config.schedule.priorities), cost, file_path))
+
+    jobs.sort(key=lambda job: (-job[0], -job[1]))
+    costs = [cost for _, cost, _ in jobs]
+    makespan = predict_makespan(costs, config.max_parallel_jobs)
+    logging.info(f"已按预计耗时排序 {len(jobs)} 个文件，预计总耗时 {makespan:.0f} 秒")
+    return SchedulePlan([file_path for _, _, file_path in jobs], costs, makespan)
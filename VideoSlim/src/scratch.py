@@ -0,0 +1,223 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, IO, List, Optional
+
+from .commands import AUDIO_BIT_RATE, can_copy_audio
+from .config import Config
+from .probe import ProbeInfo
+from .segment import should_segment
+
+# 每次运行在各临时目录下建立一个以此开头的运行目录，任务目录都在其中
+RUN_DIR_PREFIX = "videoslim_run_"
+_LOCK_FILE = ".lock"
+
+# 估算时额外预留的比例，MediaInfo 给出的码率与实际写出的字节数并不精确一致
+_ESTIMATE_MARGIN = 1.2
+
+# 每隔多少秒重新检查一次剩余空间：空间也可能被其他程序释放
+_RECHECK_INTERVAL = 5.0
+
+
+def estimate_scratch_bytes(probe: ProbeInfo, config: Config, audio_tracks: List[Dict[str, Any]]) -> int:
+    """
+    Estimate the largest amount of temporary data a job writes
+
+    The outputs of x264 are assumed to be no larger than the source, which holds for all but
+    pathological inputs. Streams that are piped between processes take no space.
+
+    Args:
+        probe: Probe result of the source
+        config: Compression configuration
+        audio_tracks: Audio tracks that go into the output
+
+    Returns:
+        Estimated peak size of the job's temporary directory in bytes
+    """
+    total = 0
+    if audio_tracks:
+        # The video is written to the temporary directory first and muxed afterwards
+        total += probe.file_size
+    if should_segment(probe, config):
+        # Stream-copied segments plus their encoded versions
+        total += 2 * probe.file_size
+
+    for track in audio_tracks:
+        if config.audio_copy and can_copy_audio(track):
+            total += track["bit_rate"] / 8 * probe.duration
+            continue
+        if not config.streaming:
+            # 16-bit PCM WAV, 2 channels / 48 kHz when MediaInfo does not know
+            total += probe.duration * (track.get("sampling_rate") or 48000) * (track.get("channels") or 2) * 2
+        total += AUDIO_BIT_RATE / 8 * probe.duration
+
+    if config.predict.enabled:
+        total += probe.file_size * config.predict.samples * config.predict.sample_duration / max(probe.duration, 1)
+    return int(total * _ESTIMATE_MARGIN)
+
+
+def _try_lock(path: str) -> Optional[IO]:
+    """
+    以非阻塞方式对文件加排他锁，进程退出（包括崩溃）时操作系统会自动释放
+    :param path: 锁文件路径
+    :return: 加锁成功时返回打开的文件，需保持打开；已被其他进程锁定时返回 None
+    """
+    f = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except OSError:
+        f.close()
+        return None
+
+
+def clean_orphans(root: str) -> int:
+    """
+    删除崩溃的运行遗留的运行目录：仍在运行的进程持有目录中的锁，因此不会被误删
+    :param root: 临时目录
+    :return: 删除的目录数
+    """
+    removed = 0
+    try:
+        entries = [entry.path for entry in os.scandir(root)
+                   if entry.is_dir() and entry.name.startswith(RUN_DIR_PREFIX)]
+    except OSError:
+        return 0
+
+    for run_dir in entries:
+        try:
+            lock = _try_lock(os.path.join(run_dir, _LOCK_FILE))
+        except OSError:
+            continue
+        if lock is None:
+            continue
+        lock.close()
+        shutil.rmtree(run_dir, ignore_errors=True)
+        logging.info(f"已删除上次运行遗留的临时目录: {run_dir}")
+        removed += 1
+    return removed
+
+
+class ScratchManager:
+    """
+    Place job temporary directories and admit jobs only when there is room for them
+
+    Roots are tried in order, so a tmpfs or fast local disk listed first takes every job that
+    fits. Each admitted job reserves its estimated footprint until it is released; a job that
+    fits nowhere waits until running jobs free enough space. Every run keeps its directories in
+    a run directory locked for the lifetime of the process, so directories of crashed runs can
+    be told apart and are removed when the next manager starts.
+    """
+
+    def __init__(self, roots: List[str], reserve: int = 0):
+        """
+        :param roots: 临时目录，按优先顺序排列
+        :param reserve: 每个临时目录所在磁盘至少保留的剩余空间（字节）
+        """
+        self.roots = list(dict.fromkeys(os.path.abspath(root) for root in roots))
+        self.reserve = reserve
+        self._cond = threading.Condition()
+        self._reserved: Dict[str, int] = {root: 0 for root in self.roots}
+        self._jobs: Dict[str, tuple[str, int]] = {}
+        # 临时目录 -> (运行目录, 持有的锁)
+        self._runs: Dict[str, tuple[str, IO]] = {}
+
+        for root in self.roots:
+            clean_orphans(root)
+
+    def _available(self, root: str) -> int:
+        try:
+            os.makedirs(root, exist_ok=True)
+            free = shutil.disk_usage(root).free
+        except OSError as e:
+            logging.warning(f"临时目录 {root} 不可用: {e}")
+            return -1
+        # 已运行任务写出的数据同时计入了 free 与预留量，估算偏保守
+        return free - self._reserved[root] - self.reserve
+
+    def _get_run_dir(self, root: str) -> str:
+        if root not in self._runs:
+            run_dir = tempfile.mkdtemp(prefix=RUN_DIR_PREFIX, dir=root)
+            lock = _try_lock(os.path.join(run_dir, _LOCK_FILE))
+            self._runs[root] = (run_dir, lock)
+        return self._runs[root][0]
+
+    def acquire(self, size: int, index: int) -> str:
+        """
+        Create a temporary directory for a job, waiting until some root has room for it
+
+        Args:
+            size: Estimated peak size of the job's temporary data in bytes
+            index: Index of the file the job belongs to
+
+        Returns:
+            Path of the job's temporary directory
+
+        Raises:
+            OSError: If the job does not fit even when no other job is running
+        """
+        waiting = False
+        with self._cond:
+            while True:
+                for root in self.roots:
+                    if self._available(root) < size:
+                        continue
+                    try:
+                        job_dir = tempfile.mkdtemp(prefix=f"job_{index}_", dir=self._get_run_dir(root))
+                    except OSError as e:
+                        logging.warning(f"无法在临时目录 {root} 中建立任务目录: {e}")
+                        continue
+                    self._reserved[root] += size
+                    self._jobs[job_dir] = (root, size)
+                    return job_dir
+
+                if not self._jobs:
+                    raise OSError(f"临时空间不足：需要约 {size} 字节，所有临时目录的剩余空间都不够")
+                if not waiting:
+                    logging.info(f"临时空间不足（需要约 {size} 字节），等待其他任务完成")
+                    waiting = True
+                self._cond.wait(_RECHECK_INTERVAL)
+
+    def release(self, job_dir: str):
+        """
+        删除任务的临时目录并归还预留的空间
+        :param job_dir: acquire 返回的目录
+        """
+        if os.path.exists(job_dir):
+            try:
+                shutil.rmtree(job_dir)
+            except Exception as e:
+                logging.warning(f"删除临时目录 {job_dir} 失败: {e}")
+        with self._cond:
+            root, size = self._jobs.pop(job_dir, (None, 0))
+            if root:
+                self._reserved[root] -= size
+            self._cond.notify_all()
+
+    def close(self):
+        """删除本次运行的全部运行目录并释放锁"""
+        with self._cond:
+            runs, self._runs = self._runs, {}
+        for run_dir, lock in runs.values():
+            if lock:
+                lock.close()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def open_scratch(config: Config, temp_root: str) -> ScratchManager:
+    """
+    按配置建立临时空间管理器
+    :param config: 压缩配置
+    :param temp_root: 默认临时目录，排在配置的目录之后
+    :return: ScratchManager
+    """
+    roots = ([config.scratch.hot_dir] if config.scratch.hot_dir else []) + config.scratch.dirs + [temp_root]
+    return ScratchManager(roots, config.scratch.reserve_mb * 1024 * 1024)
@@ -0,0 +1,142 @@
+import glob
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from .commands import get_join_command, get_split_command, get_video_encode_commands
+from .config import Config
+from .governor import CpuAllotment
+from .logs import EncoderLog, submit_with_context
+from .metrics import ProcessStats
+from .pipeline import run_pipeline
+from .probe import ProbeInfo, probe_file
+from .progress import parse_x264_progress
+from .settings import META_INFO
+
+
+def should_segment(probe: ProbeInfo, config: Config) -> bool:
+    """
+    判断文件是否应分段并行编码
+    :param probe: 文件的探测结果
+    :param config: 压缩配置
+    :return: 开启了分段编码且时长超过阈值时为 True
+    """
+    return (config.segment.enabled and probe.duration >= config.segment.min_duration
+            and probe.duration > config.segment.segment_duration)
+
+
+class _SegmentProgress:
+    """
+    汇总各分段 x264 的进度，作为整个文件的进度上报
+    """
+
+    def __init__(self, report: Callable[[int, float, float], None]):
+        self._report = report
+        self._frames: dict[int, int] = {}
+        self._fps: dict[int, float] = {}
+        self._bitrates: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def update(self, segment: int, line: str):
+        parsed = parse_x264_progress(line)
+        if not parsed:
+            return
+        with self._lock:
+            self._frames[segment], self._fps[segment], self._bitrates[segment] = parsed
+            frames = sum(self._frames.values())
+            fps = sum(self._fps.values())
+            bitrate = sum(self._bitrates.values()) / len(self._bitrates)
+        self._report(frames, fps, bitrate)
+
+    def finish(self, segment: int):
+        # 已完成的分段不再贡献编码速度
+        with self._lock:
+            self._fps[segment] = 0.0
+
+
+def verify_output(probe: ProbeInfo, output_path: str):
+    """
+    Check that a joined output has the same frame count and duration as its source
+
+    Args:
+        probe: Probe result of the source
+        output_path: Joined output file
+
+    Raises:
+        ValueError: If the frame count differs or the duration is off by more than two frames
+    """
+    output = probe_file(output_path)
+    if probe.frame_count and output.frame_count != probe.frame_count:
+        raise ValueError(f"分段合并后帧数不一致: 源 {probe.frame_count} 帧，输出 {output.frame_count} 帧")
+
+    tolerance = max(2 / probe.frame_rate if probe.frame_rate else 0.0, 0.1)
+    if abs(output.duration - probe.duration) > tolerance:
+        raise ValueError(f"分段合并后时长不一致: 源 {probe.duration:.3f} 秒，输出 {output.duration:.3f} 秒")
+
+
+def encode_segmented(file_path: str, probe: ProbeInfo, config: Config, temp_dir: str, output_path: str,
+                     report: Callable[[int, float, float], None], tools: dict[str, str] = None,
+                     stats: list[ProcessStats] = None, cpu: CpuAllotment = None, log: EncoderLog = None):
+    """
+    Encode the video stream of a long file as segments in parallel
+
+    The video stream is copied (not re-encoded) into segments by ffmpeg's segment muxer, which
+    can only cut at keyframes, so every segment starts on a GOP boundary. The segments are
+    encoded concurrently with the same x264 settings and joined losslessly with mp4box.
+
+    Args:
+        file_path: Source video
+        probe: Probe result of the source
+        config: Compression configuration
+        temp_dir: The job's temporary directory
+        output_path: File the joined video stream is written to
+        report: Called with (frames done, fps, bitrate) of the whole file
+        tools: Paths of the external tools, see META_INFO["TOOLS"]
+        stats: If given, the resource usage of every process is appended to it
+        cpu: CPU allotment of the job; the segment encoders running at once share it
+        log: If given, the output of every process is written to it
+
+    Raises:
+        subprocess.CalledProcessError: If a command fails
+        ValueError: If the joined output does not match the source
+    """
+    tools = tools or META_INFO["TOOLS"]
+    segment_dir = os.path.join(temp_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+
+    run_pipeline([get_split_command(file_path, config.segment.segment_duration,
+                                    os.path.join(segment_dir, 'seg_%05d.mp4'), tools)], stats=stats, cpu=cpu,
+                 log=log)
+    segments = sorted(glob.glob(os.path.join(segment_dir, 'seg_*.mp4')))
+    if not segments:
+        raise ValueError("分段失败，没有生成任何分段")
+
+    budget = cpu.threads if cpu and cpu.threads else (os.cpu_count() or 2) // config.max_parallel_jobs
+    workers = config.segment.max_workers or max(2, budget)
+    # 同时运行的各分段编码器平分任务的线程数，不会各自按核心数开线程
+    segment_cpu = cpu.split(workers) if cpu else None
+    logging.info(f"文件 {file_path} 分为 {len(segments)} 段，使用 {workers} 个进程并行编码")
+
+    progress = _SegmentProgress(report)
+    encoded = [f"{os.path.splitext(segment)[0]}_x264.mp4" for segment in segments]
+
+    def encode(i: int):
+        try:
+            threads = segment_cpu.threads if segment_cpu else 0
+            run_pipeline(get_video_encode_commands(config, segments[i], encoded[i], bool(probe.rotation), tools,
+                                                   threads),
+                         on_output=lambda line: progress.update(i, line), stats=stats, cpu=segment_cpu, log=log)
+        finally:
+            progress.finish(i)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [submit_with_context(executor, encode, i) for i in range(len(segments))]
+        # result() re-raises the first failure
+        for future in futures:
+            future.result()
+
+    run_pipeline([get_join_command(encoded, output_path, tools)], stats=stats, cpu=cpu, log=log)
+
+    verify_output(probe, output_path)
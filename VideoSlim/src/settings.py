@@ -0,0 +1,85 @@
+import atexit
+import logging
+import os
+import tempfile
+from logging.handlers import QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from queue import SimpleQueue
+
+from .logs import ContextFilter, JsonFormatter, LogQueueHandler, configure_job_logs
+
+# Constants
+META_INFO = {
+    "VERSION": "v1.8",
+    "VIDEO_EXTENSIONS": [".mp4", ".mkv", ".mov", ".avi"],
+    "CONFIG_FILE": "config.json",
+    # 默认临时目录，使用系统临时目录（本地磁盘）而不是可能位于网络共享上的工作目录
+    "TEMP_DIR": tempfile.gettempdir(),
+    "CACHE_DIR": "./cache",
+    # 各任务外部工具输出的日志目录
+    "JOB_LOG_DIR": "./logs",
+    # 外部工具路径，可在 config.json 的 "tools" 中覆盖（例如换成 Linux 版本或测试用的替身程序）
+    "TOOLS": {
+        "ffmpeg": "./tools/ffmpeg.exe",
+        "x264": "./tools/x264_64-8bit.exe",
+        "neroaacenc": "./tools/neroAacEnc.exe",
+        "mp4box": "./tools/mp4box.exe"
+    }
+}
+
+# 文本日志单个文件的大小上限（字节）与保留的旧文件数
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 结构化日志按天轮换，保留的天数
+JSON_LOG_BACKUP_DAYS = 7
+
+# setup_logging 安装的队列处理器与后台写入线程，再次调用时被替换
+_queue_handler = None
+_listener = None
+
+
+def _stop_logging():
+    """从根日志记录器移除队列处理器，写完剩余的记录并关闭日志文件"""
+    global _queue_handler, _listener
+    if _queue_handler:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logging(filename: str = 'log.txt', job_log_dir: str = None):
+    """
+    配置日志记录功能
+    日志记录经队列交给后台线程写入文件，产生日志的线程（包括并行的编码任务）不会因写磁盘而阻塞。
+    文本日志追加写入并按大小轮换；同名的 .jsonl 文件每行一条 JSON 记录，带有所属文件与处理阶段，按天轮换。
+    可以重复调用，之前的配置会被替换，记录不会重复写入。
+    :param filename: 文本日志文件路径
+    :param job_log_dir: 各任务外部工具输出的日志目录，默认为 META_INFO["JOB_LOG_DIR"]，为空字符串时不记录
+    """
+    global _queue_handler, _listener
+    _stop_logging()
+
+    text_handler = RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding='utf-8')
+    text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    json_handler = TimedRotatingFileHandler(f"{os.path.splitext(filename)[0]}.jsonl", when='midnight',
+                                            backupCount=JSON_LOG_BACKUP_DAYS, encoding='utf-8')
+    json_handler.setFormatter(JsonFormatter())
+
+    log_queue = SimpleQueue()
+    _queue_handler = LogQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(_queue_handler)
+
+    # 后台写入线程，程序退出时停止并写完剩余的记录
+    _listener = QueueListener(log_queue, text_handler, json_handler)
+    _listener.start()
+    atexit.unregister(_stop_logging)
+    atexit.register(_stop_logging)
+
+    configure_job_logs(META_INFO["JOB_LOG_DIR"] if job_log_dir is None else job_log_dir)
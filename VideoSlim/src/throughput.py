@@ -0,0 +1,144 @@
+import copy
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .config import Config
+from .probe import ProbeInfo
+from .scheduler import estimate_cost
+
+# 新测量值在速度校正系数中所占的权重
+_SMOOTHING = 0.3
+
+
+def parse_deadline(value: str, now: datetime = None) -> Optional[datetime]:
+    """
+    解析批次截止时间
+    :param value: "HH:MM" 表示下一次到达该时刻，也可以是完整的 ISO 8601 时间（如 2024-05-01T08:00）
+    :param now: 当前时间，默认为 datetime.now()
+    :return: 截止时间，为空时返回 None
+    :raises ValueError: 格式无法识别
+    """
+    value = value.strip()
+    if not value:
+        return None
+    now = now or datetime.now()
+    if len(value) <= 5 and ":" in value:
+        hour, minute = (int(part) for part in value.split(":"))
+        deadline = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return deadline if deadline > now else deadline + timedelta(days=1)
+    return datetime.fromisoformat(value)
+
+
+def with_preset(config: Config, preset: int) -> Config:
+    """
+    复制一份只有 x264 preset 不同的配置，原配置不变
+    :param config: 压缩配置
+    :param preset: 新的 preset
+    :return: 新配置
+    """
+    file_config = copy.copy(config)
+    file_config.X264 = copy.copy(config.X264)
+    file_config.X264.preset = preset
+    return file_config
+
+
+class PresetSelector:
+    """
+    Choose each file's x264 preset so the batch meets a throughput goal
+
+    The goal is either a number of files per hour or a deadline for the whole batch. Either
+    one is turned into a time budget for the file about to start. The budget is the time a job
+    slot has per file, scaled by how expensive this file is compared with the files seen so far.
+    Encode times come from the probe-based estimate of the scheduler, corrected by the speed
+    measured on earlier jobs of the batch. The slowest preset (best compression) that is
+    predicted to fit the budget is used. It is never slower than the configured preset and
+    never faster than min_preset. CRF is left alone, so quality stays the same and only the
+    file size changes.
+    """
+
+    def __init__(self, config: Config, now: datetime = None):
+        """
+        :param config: 压缩配置
+        :param now: 批次开始的时间，默认为 datetime.now()
+        :raises ValueError: 截止时间格式无法识别
+        """
+        now = now or datetime.now()
+        self.config = config
+        self.deadline = None
+        if config.throughput.mode == "deadline":
+            self.deadline = parse_deadline(config.throughput.deadline, now)
+        # 截止时间换算为单调时钟，不受系统时间调整的影响
+        self._deadline_at = time.monotonic() + (self.deadline - now).total_seconds() if self.deadline else None
+        # preset -> 实测耗时与估算耗时之比
+        self._scales: dict[int, float] = {}
+        self._scale: Optional[float] = None
+        self._total_cost = 0.0
+        self._files = 0
+        self._lock = threading.Lock()
+
+    def _get_scale(self, preset: int) -> float:
+        if preset in self._scales:
+            return self._scales[preset]
+        return self._scale or 1.0
+
+    def _get_budget(self, cost: float, remaining_files: int) -> Optional[float]:
+        # 每个并行任务名额平均每个文件可用的时间，再按本文件相对于平均文件的估算耗时缩放
+        settings = self.config.throughput
+        slots = self.config.max_parallel_jobs
+        if settings.mode == "files_per_hour" and settings.files_per_hour > 0:
+            slot_time = 3600 * slots / settings.files_per_hour
+        elif self._deadline_at is not None:
+            slot_time = (self._deadline_at - time.monotonic()) * slots / max(1, remaining_files)
+        else:
+            return None
+        average_cost = self._total_cost / self._files
+        return slot_time * (cost / average_cost if average_cost > 0 else 1.0)
+
+    def select(self, file_path: str, probe: ProbeInfo, remaining_files: int) -> int:
+        """
+        为一个即将开始编码的文件选择 preset
+        :param file_path: 文件路径
+        :param probe: 文件的探测结果
+        :param remaining_files: 批次中尚未结束的文件数（包括本文件与正在编码的文件）
+        :return: preset
+        """
+        base_preset = int(self.config.X264.preset)
+        cost = estimate_cost(probe, base_preset)
+        with self._lock:
+            self._total_cost += cost
+            self._files += 1
+            budget = self._get_budget(cost, remaining_files)
+            if budget is None or cost <= 0:
+                return base_preset
+
+            min_preset = min(self.config.throughput.min_preset, base_preset)
+            preset = min_preset
+            for candidate in range(base_preset, min_preset - 1, -1):
+                if estimate_cost(probe, candidate) * self._get_scale(candidate) <= budget:
+                    preset = candidate
+                    break
+            predicted = estimate_cost(probe, preset) * self._get_scale(preset)
+
+        logging.info(f"文件 {file_path} 使用 preset {preset}，预计编码 {predicted:.0f} 秒，预算 {max(budget, 0):.0f} 秒")
+        return preset
+
+    def record(self, probe: ProbeInfo, preset: int, seconds: float):
+        """
+        记录一个文件实际的编码耗时，用于校正之后的估算
+        :param probe: 文件的探测结果
+        :param preset: 编码使用的 preset
+        :param seconds: 视频编码阶段的耗时（秒）
+        """
+        estimated = estimate_cost(probe, preset)
+        if estimated <= 0 or seconds <= 0:
+            return
+        scale = seconds / estimated
+        with self._lock:
+            previous = self._scales.get(preset)
+            self._scales[preset] = scale if previous is None else previous + _SMOOTHING * (scale - previous)
+            self._scale = scale if self._scale is None else self._scale + _SMOOTHING * (scale - self._scale)
+        if probe.frame_count:
+            logging.info(f"preset {preset} 实测编码速度 {probe.frame_count / seconds:.1f} fps")
@@ -1,2 +1,48 @@
+import json
+import os
+
+
 def clamp(value, a=0, b=1):
     return max(a, min(b, value))
+
+
+def get_dir_size(directory: str) -> int:
+    """
+    统计目录下所有文件的总字节数
+    :param directory: 目录路径
+    :return: 字节数，目录不存在时为 0
+    """
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def save_json_atomic(file_path: str, data):
+    """
+    先写入临时文件再替换，保证中途崩溃时不会留下写了一半的 JSON 文件
+    :param file_path: 目标文件路径
+    :param data: 可被 json 序列化的数据
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_file = f"{file_path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_file, file_path)
+
+
+def save_text_atomic(file_path: str, text: str):
+    """
+    与 save_json_atomic 相同，写入的是文本
+    :param file_path: 目标文件路径
+    :param text: 文件内容
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_file = f"{file_path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_file, file_path)
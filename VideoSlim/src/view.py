@@ -1,20 +1,38 @@
 import os
 import threading
+import time
 import webbrowser
 from queue import Queue
+from typing import Optional
 
 import tkinter as tk
-from tkinter import messagebox, StringVar, BooleanVar, END, TOP, W, NE
+from tkinter import messagebox, StringVar, BooleanVar, TOP, W, NE
 import tkinter.ttk as ttk
-import windnd
 
 from .message import *
 from .controller import Controller
+from .listview import VirtualListView
+from .manifest import Manifest
+
+
+def _format_eta(seconds: Optional[float]) -> str:
+    """将剩余秒数格式化为 h:mm:ss，未知时显示 --"""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
 
 
 class View:
     """Main application class for VideoSlim"""
 
+    # Virtual event posted when the message bus receives messages
+    BUS_EVENT = "<<MessageBus>>"
+    # Minimum seconds between two dispatches, limits redraws during fast progress updates
+    MIN_REDRAW_INTERVAL = 0.1
+    # Milliseconds between checks of the fallback poll
+    FALLBACK_POLL_INTERVAL = 2000
+
     def __init__(self, root: tk.Tk, controller: Controller):
         """
         Initialize VideoSlim application
@@ -27,11 +45,21 @@ class View:
         self.queue = Queue()
         self.configs_name_list = []
         self.configs_dict = {}
+        # Files of the next batch, kept outside the widget
+        self.manifest = Manifest()
 
         self._setup_ui()
 
-        # Setup message queue checking
-        self.root.after(1000, self._check_message_queue)
+        # Messages are pushed by the bus instead of being polled
+        self._dispatch_scheduled = False
+        self._dispatching = False
+        self._last_dispatch = 0.0
+        self._subscribe()
+        self.root.bind(self.BUS_EVENT, self._on_bus_wake)
+        self.controller.queue.set_waker(self._wake)
+        # Messages sent while the controller was starting up
+        self.root.after_idle(self._on_bus_wake)
+        self.root.after(self.FALLBACK_POLL_INTERVAL, self._poll_fallback)
 
     def _setup_ui(self):
         """Set up the application's user interface"""
@@ -64,9 +92,10 @@ class View:
         self.title_label = tk.Label(self.root, textvariable=self.title_var, anchor=W)
         self.title_label.place(x=26, y=8, width=380, height=24)
 
-        # File list text box
-        self.text_box = tk.Text(self.root, width=100, height=20)
-        self.text_box.place(x=24, y=40, width=480, height=220)
+        # File list, only the visible rows are drawn
+        self.file_list = VirtualListView(self.root, self.manifest)
+        self.file_list.place(x=24, y=40, width=480, height=220)
+        self.manifest.subscribe(self._on_file_list_change)
 
         # Clear button
         clear_btn_text = StringVar()
@@ -96,8 +125,8 @@ class View:
                                             variable=self.delete_audio_var, onvalue=True, offvalue=False)
         delete_audio_check.place(x=20, y=313)
 
-        # Setup drag and drop
-        windnd.hook_dropfiles(self.root, func=self._on_drop_files)
+        # Setup drag and drop once the window is shown
+        self.root.after_idle(self._hook_drop_files)
 
         # Configuration selection
         config_label = tk.Label(self.root, text="选择参数配置")
@@ -108,6 +137,13 @@ class View:
                                             values=[], textvariable=self.select_config_name)
         self.config_combobox.place(x=388, y=291)
 
+    def _hook_drop_files(self):
+        """Accept files dropped onto the window"""
+        # Imported here so that loading windnd does not delay the first paint
+        import windnd
+
+        windnd.hook_dropfiles(self.root, func=self._on_drop_files)
+
     def _on_drop_files(self, file_paths):
         """
         Handle files dropped into application
@@ -115,74 +151,106 @@ class View:
         Args:
             file_paths: List of file paths dropped
         """
-        files = '\n'.join(item.decode('gbk') for item in file_paths)
-        self.text_box.insert(END, files + "\n")
+        self.manifest.extend(item.decode('gbk') for item in file_paths)
 
     def _clear_file_list(self):
-        """Clear the file list text box"""
-        self.text_box.delete("1.0", END)
-
-    def _check_message_queue(self):
-        """Process messages from compression worker thread"""
-        queue = self.controller.queue
-        while not queue.empty():
-            message = queue.get()
-
-            if not isinstance(message, Message):
-                continue
-
-            if isinstance(message, WarningMessage):
-                # Display warning message
-                messagebox.showwarning(message.title, message.message)
-                continue
-
-            if isinstance(message, UpdateMessage):
-                # Update message box
-                messagebox.showinfo("更新提示", "有新版本可用，请前往官网更新")
-                continue
-
-            if isinstance(message, ErrorMessage):
-                # Display error message
-                messagebox.showerror(message.title, message.message)
-                continue
-
-            if isinstance(message, ExitMessage):
-                # Exit application
-                self.root.destroy()
-                continue
-
-            if isinstance(message, ConfigLoadMessage):
-                # 将加载的配置显示在选项框，并自动选中第一个
-                self.config_combobox.config(values=message.config_names)
-                self.select_config_name.set(message.config_names[0])
-                continue
-
-            if isinstance(message, CompressionStartMessage):
-                # Disable button
-                self.compress_btn.config(state=tk.DISABLED)
-                continue
-
-            if isinstance(message, CompressionProgressMessage):
-                # Update progress display
-                self.title_var.set(f"[{message.current}/{message.total}] "
-                                   f"当前处理文件：{message.file_name}，进度：{message.current / message.total: .2f}%")
-                self.title_label.update()
-                continue
-
-            if isinstance(message, CompressionErrorMessage):
-                # Display error message
-                messagebox.showerror(message.title, message.message)
-                self.compress_btn.config(state=tk.NORMAL)
-
-            if isinstance(message, CompressionFinishedMessage):
-                # All files processed
-                self.title_var.set(f"处理完成！已经处理 {message.total} 个文件")
-                self.title_label.update()
-                messagebox.showinfo("提示", "转换完成")
-                self.compress_btn.config(state=tk.NORMAL)
-
-        # Schedule next check
-        self.root.after(1000, self._check_message_queue)
+        """Clear the file list"""
+        self.manifest.clear()
+
+    def _on_file_list_change(self):
+        count = len(self.manifest)
+        self.title_var.set(f"已添加 {count} 个文件/文件夹，可选中后按 Delete 移除" if count else '将视频拖拽到此窗口:')
+
+    def _subscribe(self):
+        """Register a handler for every message type the window reacts to"""
+        bus = self.controller.queue
+        bus.subscribe(WarningMessage, lambda message: messagebox.showwarning(message.title, message.message))
+        bus.subscribe(UpdateMessage, lambda message: messagebox.showinfo("更新提示", "有新版本可用，请前往官网更新"))
+        bus.subscribe(ErrorMessage, lambda message: messagebox.showerror(message.title, message.message))
+        bus.subscribe(ExitMessage, lambda message: self.root.destroy())
+        bus.subscribe(ConfigLoadMessage, self._on_config_load)
+        bus.subscribe(CompressionStartMessage, lambda message: self.compress_btn.config(state=tk.DISABLED))
+        bus.subscribe(SchedulePlanMessage, self._on_schedule_plan)
+        bus.subscribe(CompressionProgressMessage, self._on_compression_progress)
+        # Also receives CompressionNotWorthMessage
+        bus.subscribe(CompressionSkippedMessage, self._on_compression_skipped)
+        bus.subscribe(EncodeProgressMessage, self._on_encode_progress)
+        bus.subscribe(CompressionErrorMessage, self._on_compression_error)
+        bus.subscribe(CompressionFinishedMessage, self._on_compression_finished)
+
+    def _wake(self):
+        """
+        Called by the bus from a worker thread when messages arrive
+
+        Only posts a virtual event; Tk runs the handlers on its own thread.
+        """
+        self.root.event_generate(self.BUS_EVENT, when="tail")
+
+    def _on_bus_wake(self, event=None):
+        """Schedule a dispatch, at most one per MIN_REDRAW_INTERVAL"""
+        if self._dispatch_scheduled:
+            return
+        self._dispatch_scheduled = True
+        delay = max(0.0, self._last_dispatch + self.MIN_REDRAW_INTERVAL - time.monotonic())
+        self.root.after(int(delay * 1000), self._dispatch_messages)
+
+    def _dispatch_messages(self):
+        """Process all pending messages on the Tk thread"""
+        self._dispatch_scheduled = False
+        if self._dispatching:
+            # A dialog opened by a handler runs a nested event loop; keep the message order
+            self._on_bus_wake()
+            return
+
+        self._dispatching = True
+        try:
+            self._last_dispatch = time.monotonic()
+            self.controller.queue.dispatch_pending()
+        finally:
+            self._dispatching = False
+
+    def _poll_fallback(self):
+        """Safety net in case a wake-up event could not be posted from a worker thread"""
+        if not self.controller.queue.empty():
+            self._on_bus_wake()
+        self.root.after(self.FALLBACK_POLL_INTERVAL, self._poll_fallback)
+
+    def _on_config_load(self, message: ConfigLoadMessage):
+        # 将加载的配置显示在选项框，并自动选中第一个
+        self.config_combobox.config(values=message.config_names)
+        self.select_config_name.set(message.config_names[0])
+
+    def _on_schedule_plan(self, message: SchedulePlanMessage):
+        # Show the predicted batch duration before encoding starts
+        self.title_var.set(f"共 {message.total} 个文件，{message.workers} 个并行任务，"
+                           f"预计耗时 {_format_eta(message.makespan)}")
+
+    def _on_compression_progress(self, message: CompressionProgressMessage):
+        # 多个文件并行处理，序号不代表完成比例；编码开始后由 _on_encode_progress 显示帧进度与剩余时间
+        self.title_var.set(f"[{message.current}/{message.total}] 当前处理文件：{message.file_name}")
+
+    def _on_compression_skipped(self, message: CompressionSkippedMessage):
+        # Skipped files are only shown in the title, no dialog
+        self.title_var.set(f"[{message.current}/{message.total}] "
+                           f"跳过文件：{message.file_name}（{message.reason}）")
+
+    def _on_encode_progress(self, message: EncodeProgressMessage):
+        frames = f"{message.frames_done}/{message.total_frames}" if message.total_frames \
+            else f"{message.frames_done}"
+        file_eta = _format_eta(message.file_eta)
+        batch_eta = _format_eta(message.batch_eta)
+        self.title_var.set(f"[{message.current}/{message.total}] {os.path.basename(message.file_name)} "
+                           f"帧 {frames}，{message.fps:.1f} fps，{message.bitrate:.0f} kb/s，"
+                           f"剩余 {file_eta}，全部剩余 {batch_eta}")
+
+    def _on_compression_error(self, message: CompressionErrorMessage):
+        messagebox.showerror(message.title, message.message)
+        self.compress_btn.config(state=tk.NORMAL)
+
+    def _on_compression_finished(self, message: CompressionFinishedMessage):
+        self.title_var.set(f"处理完成！已经处理 {message.total} 个文件")
+        messagebox.showinfo("提示", "转换完成")
+        self.compress_btn.config(state=tk.NORMAL)
 
     def _start_compression(self):
         """Start video compression process"""
@@ -193,15 +261,12 @@ class View:
         delete_audio = self.delete_audio_var.get()
         recurse = self.recurse_var.get()
 
-        # Get file list
-        text_content = self.text_box.get("1.0", END)
-        lines = [line for line in text_content.splitlines() if line.strip()]
-
-        if not lines:
+        if not len(self.manifest):
             messagebox.showwarning("提示", "请先拖拽文件到此处")
             return
 
         # 禁用按钮
         self.compress_btn.config(state=tk.DISABLED)
 
-        self.controller.compression(config_name, delete_audio, delete_source, lines, recurse)
+        # The worker streams the paths from the manifest instead of a copy of the list
+        self.controller.compression(config_name, delete_audio, delete_source, self.manifest.iter_paths(), recurse)
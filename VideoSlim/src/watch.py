@@ -0,0 +1,243 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+from typing import Iterator, List, Optional
+
+from .logic import is_output_file
+
+# inotify 事件掩码，见 <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """
+    基于 ctypes 的最小 inotify 封装，只在 Linux 上可用
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._paths: dict[int, str] = {}
+
+    def add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            logging.warning(f"无法监视目录 {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._paths[wd] = directory
+
+    def read(self, timeout: float) -> Optional[list[tuple[str, bool]]]:
+        """
+        等待并读取事件
+        :param timeout: 最长等待时间（秒）
+        :return: [(路径, 是否为目录)]；事件队列溢出时返回 None
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if wd in self._paths and name:
+                events.append((os.path.join(self._paths[wd], os.fsdecode(name)), bool(mask & _IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    持续监视目录，把新增或改动后已停止写入的视频文件交给压缩流程
+
+    Linux 上使用 inotify；其他平台或 inotify 不可用时退化为轮询，轮询只 stat 已知目录与已交出的文件，
+    仅对修改时间变化的目录重新列出内容，不会每轮遍历整个目录树。
+    迭代本对象得到一个不会结束的文件路径生成器，可直接作为 compression_files 的 file_paths。
+    """
+
+    # 清理已交出文件记录的间隔（秒）
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, directories: List[str], video_extensions: List[str], settle_time: float = 10.0,
+                 poll_interval: float = 2.0, backlog: int = 100, use_inotify: bool = True):
+        """
+        :param directories: 要监视的目录（递归）
+        :param video_extensions: 视频文件扩展名
+        :param settle_time: 文件大小和修改时间保持不变多久（秒）后才视为写入完成
+        :param poll_interval: 检查间隔（秒）
+        :param backlog: 已就绪但尚未被取走的文件数上限，超过后新文件暂留在等待列表中
+        :param use_inotify: 是否尝试使用 inotify
+        """
+        self.directories = directories
+        self.video_extensions = video_extensions
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.backlog = backlog
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except Exception as e:
+                logging.warning(f"inotify 不可用，改用轮询: {e}")
+        # 轮询模式下已知目录及其修改时间
+        self._dir_mtimes: dict[str, int] = {}
+        # 尚未稳定的文件 -> (大小, 修改时间, 开始保持不变的时刻)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # 已交出的文件 -> (大小, 修改时间)，改动后会再次交出；已删除或移走的文件定期清除
+        self._delivered: dict[str, tuple[int, int]] = {}
+        self._last_prune = time.monotonic()
+        self._ready = deque()
+        self._stopped = False
+
+    def stop(self):
+        """停止监视，生成器会在当前检查周期结束后退出"""
+        self._stopped = True
+
+    def _is_candidate(self, path: str) -> bool:
+        return (os.path.splitext(path)[1].lower() in self.video_extensions
+                and not is_output_file(path))
+
+    def _scan_directory(self, directory: str):
+        """
+        列出目录内容并记录候选文件
+
+        新出现的子目录会被登记并继续扫描；已登记的子目录只在其自身修改时间变化时才重新列出。
+        """
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            is_new = current not in self._dir_mtimes
+            try:
+                self._dir_mtimes[current] = os.stat(current).st_mtime_ns
+                if is_new and self._inotify:
+                    self._inotify.add_watch(current)
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path not in self._dir_mtimes:
+                                stack.append(entry.path)
+                        elif entry.is_file() and self._is_candidate(entry.path):
+                            self._touch(entry.path)
+            except OSError as e:
+                logging.warning(f"扫描目录 {current} 失败: {e}")
+                self._dir_mtimes.pop(current, None)
+
+    def _touch(self, path: str):
+        """文件可能发生了变化，放入等待列表等待其稳定"""
+        if path not in self._pending:
+            self._pending[path] = (-1, -1, time.monotonic())
+
+    def _collect_changes(self):
+        if self._inotify:
+            events = self._inotify.read(self.poll_interval)
+            if events is None:
+                logging.warning("inotify 事件队列溢出，重新列出全部已知目录")
+                for directory in list(self._dir_mtimes):
+                    self._scan_directory(directory)
+                return
+            for path, is_dir in events:
+                if is_dir:
+                    self._scan_directory(path)
+                elif self._is_candidate(path):
+                    self._touch(path)
+            return
+
+        time.sleep(self.poll_interval)
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._dir_mtimes.pop(directory, None)
+                continue
+            if current_mtime != mtime:
+                self._scan_directory(directory)
+
+        # 原地改写文件不会改变目录的修改时间，已交出的文件每轮 stat 一次
+        for path, (size, mtime) in list(self._delivered.items()):
+            if path in self._pending:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._delivered[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._touch(path)
+
+    def _promote_stable_files(self):
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 文件已被删除或移走
+                self._pending.pop(path)
+                self._delivered.pop(path, None)
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif self._delivered.get(path) == (size, mtime):
+                # 没有实际变化（例如只是目录被重新列出）
+                self._pending.pop(path)
+            elif now - since >= self.settle_time and len(self._ready) < self.backlog:
+                self._pending.pop(path)
+                self._delivered[path] = (size, mtime)
+                self._ready.append(path)
+
+    def _prune_delivered(self):
+        """
+        忘记已删除或移走的已交出文件（例如压缩后删除了源文件），记录不会随运行时间无限增长
+
+        删除事件不在监视范围内，所以按 PRUNE_INTERVAL 定期检查，每个记录只需一次 stat。
+        """
+        now = time.monotonic()
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        for path in list(self._delivered):
+            if path not in self._pending and not os.path.exists(path):
+                del self._delivered[path]
+
+    def __iter__(self) -> Iterator[str]:
+        logging.info(f"开始监视目录: {', '.join(self.directories)}（{'inotify' if self._inotify else '轮询'}）")
+        for directory in self.directories:
+            self._scan_directory(directory)
+
+        try:
+            while not self._stopped:
+                self._collect_changes()
+                self._promote_stable_files()
+                self._prune_delivered()
+                while self._ready and not self._stopped:
+                    yield self._ready.popleft()
+        finally:
+            if self._inotify:
+                self._inotify.close()
+            logging.info("停止监视目录")
@@ -0,0 +1,56 @@
+import os
+import sys
+from queue import Queue
+
+import pytest
+
+# 测试从 VideoSlim 目录导入 src 与 benchmarks，与程序运行时的工作目录一致
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.clips import CLIPS, generate_clips  # noqa: E402
+from benchmarks.run import write_stub_tools  # noqa: E402
+from src import logic, probe  # noqa: E402
+from src.config import Config  # noqa: E402
+from src.settings import META_INFO  # noqa: E402
+
+
+def probe_clip(file_path: str):
+    """代替 MediaInfo：按文件名取 benchmarks 片段的探测结果，流式传输时工作节点上的文件名不变"""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    spec = next(clip for clip in CLIPS if clip.name == name)
+    return spec.to_probe(os.path.getsize(file_path))
+
+
+@pytest.fixture
+def stub_tools(tmp_path, monkeypatch) -> dict[str, str]:
+    """benchmarks 的替身编码器；探测也改为读取片段参数，不需要 MediaInfo"""
+    if sys.platform == "win32":
+        pytest.skip("stub tools need a POSIX shell")
+    monkeypatch.setattr(logic, "probe_file", probe_clip)
+    monkeypatch.setattr(probe, "probe_file", probe_clip)
+    directory = tmp_path / "tools"
+    directory.mkdir()
+    return write_stub_tools(str(directory))
+
+
+@pytest.fixture
+def clips(tmp_path) -> list[str]:
+    """benchmarks 的替身片段，与 CLIPS 一一对应"""
+    return generate_clips(str(tmp_path / "clips"), True)
+
+
+@pytest.fixture
+def run_batch(tmp_path, stub_tools):
+    """用替身编码器运行一个批次的函数：run_batch(输入, 配置参数, 缓存目录) -> 收到的消息"""
+
+    def run(paths: list[str], config_params: dict = None, cache_dir: str = None) -> list:
+        queue = Queue()
+        config = Config(dict({"metrics": {"records_file": ""}}, **(config_params or {})))
+        logic.compression_files(queue, config, False, False, paths, True, META_INFO["VIDEO_EXTENSIONS"],
+                                str(tmp_path / "temp"), cache_dir, stub_tools)
+        messages = []
+        while not queue.empty():
+            messages.append(queue.get())
+        return messages
+
+    return run
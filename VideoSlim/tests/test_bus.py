@@ -0,0 +1,85 @@
+import threading
+from queue import Empty
+
+import pytest
+
+from src.bus import MessageBus
+from src.message import (CompressionDuplicateMessage, CompressionSkippedMessage, EncodeProgressMessage,
+                         ErrorMessage, Message)
+
+
+def make_progress(current: int, frames_done: int) -> EncodeProgressMessage:
+    return EncodeProgressMessage(current, 2, "a.mp4", frames_done, 100, 10.0, 1000.0, None, None)
+
+
+def test_messages_keep_their_order():
+    bus = MessageBus()
+    messages = [ErrorMessage("错误", str(i)) for i in range(3)]
+    for message in messages:
+        bus.put(message)
+    assert [bus.get(timeout=0) for _ in messages] == messages
+    assert bus.empty()
+
+
+def test_progress_messages_are_coalesced_per_job():
+    bus = MessageBus()
+    bus.put(make_progress(1, 10))
+    bus.put(ErrorMessage("错误", "x"))
+    bus.put(make_progress(2, 5))
+    bus.put(make_progress(1, 20))
+    messages = bus.drain()
+    # 合并后的消息保留第一次出现的位置，内容为最新的值
+    assert [type(message).__name__ for message in messages] == \
+        ["EncodeProgressMessage", "ErrorMessage", "EncodeProgressMessage"]
+    assert [(message.current, message.frames_done) for message in (messages[0], messages[2])] == [(1, 20), (2, 5)]
+
+
+def test_get_times_out():
+    with pytest.raises(Empty):
+        MessageBus().get(timeout=0.05)
+
+
+def test_get_waits_for_a_message():
+    bus = MessageBus()
+    message = ErrorMessage("错误", "x")
+    threading.Timer(0.05, bus.put, args=(message,)).start()
+    assert bus.get(timeout=5) is message
+
+
+def test_dispatch_calls_handlers_of_base_classes():
+    bus = MessageBus()
+    received = []
+    bus.subscribe(Message, lambda message: received.append("message"))
+    bus.subscribe(CompressionSkippedMessage, lambda message: received.append("skipped"))
+    bus.subscribe(ErrorMessage, lambda message: received.append("error"))
+    bus.dispatch(CompressionDuplicateMessage(1, 2, "b.mp4", "a.mp4"))
+    assert sorted(received) == ["message", "skipped"]
+
+
+def test_failing_handler_does_not_stop_dispatch():
+    bus = MessageBus()
+    received = []
+
+    def handler(message: ErrorMessage):
+        if message.message == "1":
+            raise RuntimeError("handler failed")
+        received.append(message.message)
+
+    bus.subscribe(ErrorMessage, handler)
+    bus.put(ErrorMessage("错误", "1"))
+    bus.put(ErrorMessage("错误", "2"))
+    assert bus.dispatch_pending() == 2
+    assert received == ["2"]
+    assert bus.empty()
+
+
+def test_waker_is_called_when_the_bus_becomes_non_empty():
+    bus = MessageBus()
+    wakes = []
+    bus.set_waker(lambda: wakes.append(1))
+    bus.put(ErrorMessage("错误", "1"))
+    bus.put(ErrorMessage("错误", "2"))
+    assert wakes == [1]
+    bus.drain()
+    bus.put(ErrorMessage("错误", "3"))
+    assert wakes == [1, 1]
@@ -0,0 +1,69 @@
+import os
+import shutil
+
+from src.cache import ResultCache, get_encode_key
+from src.config import Config
+from src.logic import get_output_filename
+from src.message import CompressionProgressMessage, CompressionSkippedMessage
+
+
+def write_file(path, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_result_is_found_after_reload(tmp_path):
+    source = write_file(tmp_path / "a.mp4", b"source")
+    output = write_file(tmp_path / "a_x264.mp4", b"output")
+    key = get_encode_key(Config({}), False)
+    cache = ResultCache(str(tmp_path / "results.json"))
+    cache.record(source, output, key)
+    cache.save()
+
+    cache = ResultCache(str(tmp_path / "results.json"))
+    assert cache.has_result(source, key)
+    assert cache.lookup(source, output, key)
+    # 编码参数不同时不能复用
+    other_key = get_encode_key(Config({"x264": {"crf": 30}}), False)
+    assert not cache.lookup(source, output, other_key)
+
+
+def test_changed_source_is_encoded_again(tmp_path):
+    source = write_file(tmp_path / "a.mp4", b"source")
+    output = write_file(tmp_path / "a_x264.mp4", b"output")
+    key = get_encode_key(Config({}), False)
+    cache = ResultCache(str(tmp_path / "results.json"))
+    cache.record(source, output, key)
+
+    write_file(source, b"edited")
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not cache.has_result(source, key)
+    assert not cache.lookup(source, output, key)
+
+
+def test_copied_source_reuses_the_output(tmp_path):
+    source = write_file(tmp_path / "a.mp4", b"source")
+    output = write_file(tmp_path / "a_x264.mp4", b"output")
+    key = get_encode_key(Config({}), False)
+    cache = ResultCache(str(tmp_path / "results.json"))
+    cache.record(source, output, key)
+
+    # 内容与修改时间相同、路径不同的副本
+    os.mkdir(tmp_path / "copy")
+    copy = str(tmp_path / "copy" / "a.mp4")
+    shutil.copy2(source, copy)
+    assert cache.lookup(copy, get_output_filename(copy), key)
+    with open(get_output_filename(copy), "rb") as f:
+        assert f.read() == b"output"
+
+
+def test_second_run_skips_encoded_files(tmp_path, run_batch, clips):
+    cache_dir = str(tmp_path / "cache")
+    first = run_batch(clips, cache_dir=cache_dir)
+    assert len([message for message in first if isinstance(message, CompressionProgressMessage)]) == len(clips)
+
+    second = run_batch(clips, cache_dir=cache_dir)
+    assert not [message for message in second if isinstance(message, CompressionProgressMessage)]
+    assert len([message for message in second if isinstance(message, CompressionSkippedMessage)]) == len(clips)
@@ -0,0 +1,10 @@
+import json
+
+import cli
+
+
+def test_serve_refuses_watch(tmp_path, capsys):
+    code = cli.run(cli.parse_args(["--serve", "127.0.0.1:0", "--watch", str(tmp_path)]))
+    assert code == 2
+    message = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert "--watch" in message["message"]
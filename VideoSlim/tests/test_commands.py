@@ -0,0 +1,37 @@
+import os
+
+from src import logic
+from src.commands import can_copy_audio
+
+
+def test_only_suitable_aac_is_copied():
+    assert can_copy_audio({"codec": "AAC", "profile": "LC", "bit_rate": 96000})
+    assert can_copy_audio({"codec": "AAC", "bit_rate": 128000})
+    # 码率高于重编码的目标码率、HE-AAC、其他编码或码率未知时都重新编码
+    assert not can_copy_audio({"codec": "AAC", "profile": "LC", "bit_rate": 192000})
+    assert not can_copy_audio({"codec": "AAC", "profile": "HE-AAC", "bit_rate": 64000})
+    assert not can_copy_audio({"codec": "MPEG Audio", "bit_rate": 96000})
+    assert not can_copy_audio({"codec": "AAC", "profile": "LC"})
+
+
+def test_batch_copies_suitable_tracks(run_batch, clips, monkeypatch):
+    stages = {}
+    run_stage_graph = logic.run_stage_graph
+
+    def record_stages(graph, job):
+        stages.update((stage.name, stage.commands) for stage in graph)
+        return run_stage_graph(graph, job)
+
+    monkeypatch.setattr(logic, "run_stage_graph", record_stages)
+    # 第一条音轨为 96 kbps 的 AAC，第二条为 192 kbps
+    clip = next(clip for clip in clips if os.path.basename(clip) == "hd_two_tracks.mp4")
+    run_batch([clip])
+
+    copied, = stages["audio_0"]
+    assert copied[copied.index("-c") + 1] == "copy"
+    assert [os.path.basename(command[0]) for command in stages["audio_1"]] == ["ffmpeg", "neroaacenc"]
+    assert os.path.getsize(logic.get_output_filename(clip)) > 0
+
+    stages.clear()
+    run_batch([clip], {"audio_copy": False})
+    assert [os.path.basename(command[0]) for command in stages["audio_0"]] == ["ffmpeg", "neroaacenc"]
@@ -0,0 +1,37 @@
+import os
+
+from src.cache import PARTIAL_HASH_BLOCK
+from src.dedup import find_duplicates
+
+
+def write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_identical_files_are_grouped_in_batch_order(tmp_path):
+    b = write(tmp_path / "b.mp4", b"same")
+    a = write(tmp_path / "a.mp4", b"same")
+    c = write(tmp_path / "c.mp4", b"same")
+    other = write(tmp_path / "other.mp4", b"diff")
+    files, duplicates = find_duplicates([b, other, a, c])
+    assert files == [b, other]
+    assert duplicates == {b: [a, c]}
+
+
+def test_files_differing_only_in_the_middle_are_not_duplicates(tmp_path):
+    # 开头与结尾相同，部分哈希一致，需要完整哈希才能区分
+    head = b"h" * PARTIAL_HASH_BLOCK
+    tail = b"t" * PARTIAL_HASH_BLOCK
+    a = write(tmp_path / "a.mp4", head + b"1" + tail)
+    b = write(tmp_path / "b.mp4", head + b"2" + tail)
+    c = write(tmp_path / "c.mp4", head + b"1" + tail)
+    files, duplicates = find_duplicates([a, b, c])
+    assert files == [a, b]
+    assert duplicates == {a: [c]}
+
+
+def test_missing_files_are_kept(tmp_path):
+    a = write(tmp_path / "a.mp4", b"x")
+    missing = os.path.join(str(tmp_path), "missing.mp4")
+    assert find_duplicates([missing, a]) == ([missing, a], {})
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from queue import Queue
+
+import pytest
+
+from src import distributed, governor, logic
+from src.distributed import Coordinator, is_loopback, run_worker
+from src.message import CompressionErrorMessage, CompressionFinishedMessage
+from src.settings import META_INFO
+
+
+def run_loopback_batch(tmp_path, config_params: dict, tools: dict[str, str], clips: list[str], shared: bool,
+                       workers: int = 2) -> tuple[list, int]:
+    """
+    在本机回环地址上运行协调节点与若干工作节点（线程），直到批次结束
+    :return: 协调节点发出的消息，各工作节点处理的文件总数
+    """
+    queue = Queue()
+    coordinator = Coordinator(queue, dict(config_params, metrics={"records_file": ""}), False, False,
+                              shared=shared, token="secret", lease_seconds=10)
+    coordinator.add_files(clips, False, META_INFO["VIDEO_EXTENSIONS"])
+    thread = threading.Thread(target=coordinator.run, args=(("127.0.0.1", 0),), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while coordinator.address is None:
+        assert time.monotonic() < deadline, "coordinator did not start"
+        time.sleep(0.01)
+
+    processed = []
+    threads = [threading.Thread(target=lambda i=i: processed.append(run_worker(
+        coordinator.address, tools, str(tmp_path / f"worker{i}"), name=f"worker{i}", token="secret")), daemon=True)
+        for i in range(workers)]
+    for worker in threads:
+        worker.start()
+    for worker in threads + [thread]:
+        worker.join(60)
+        assert not worker.is_alive(), "distributed batch did not finish"
+
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get())
+    return messages, sum(processed)
+
+
+@pytest.mark.parametrize("shared", [True, False], ids=["shared", "streamed"])
+def test_loopback_batch(tmp_path, stub_tools, clips, shared):
+    messages, processed = run_loopback_batch(tmp_path, {"name": "test"}, stub_tools, clips, shared)
+    assert not [message for message in messages if isinstance(message, CompressionErrorMessage)]
+    assert isinstance(messages[-1], CompressionFinishedMessage)
+    assert processed == len(clips)
+    for clip in clips:
+        assert os.path.getsize(logic.get_output_filename(clip)) > 0
+        assert os.path.exists(clip)
+
+
+def test_worker_encodes_with_the_whole_machine(tmp_path, stub_tools, clips, monkeypatch):
+    allotments = []
+    process_single_file = distributed.process_single_file
+
+    def record_allotment(*args, governor=None, **kwargs):
+        allotment = governor.acquire()
+        allotments.append(allotment.threads)
+        governor.release(allotment)
+        return process_single_file(*args, governor=governor, **kwargs)
+
+    monkeypatch.setattr(distributed, "process_single_file", record_allotment)
+    monkeypatch.setattr(governor, "get_available_cpus", lambda: [0, 1, 2, 3])
+    # 协调节点按 4 个并行任务配置，但每个工作节点一次只处理一个文件
+    run_loopback_batch(tmp_path, {"name": "test", "max_parallel_jobs": 4, "governor": {"enabled": True}},
+                       stub_tools, clips[:1], True, workers=1)
+    # 0 表示不限制编码线程数，即使用整台机器
+    assert allotments == [0]
+
+
+def test_token_is_checked():
+    coordinator = Coordinator(Queue(), {"name": "test"}, False, False, token="secret")
+    assert coordinator.hello({"token": "secret"})["ok"]
+    for token in ("wrong", "", None, 123):
+        assert not coordinator.hello({"token": token})["ok"]
+
+
+def test_non_loopback_bind_requires_a_token():
+    assert is_loopback("localhost") and is_loopback("127.0.0.1") and is_loopback("::1")
+    assert not is_loopback("0.0.0.0")
+    with pytest.raises(ValueError):
+        Coordinator(Queue(), {"name": "test"}, False, False).serve(("0.0.0.0", 0))
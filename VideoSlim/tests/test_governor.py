@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.config import Config
+from src.governor import CpuAllotment, CpuGovernor
+
+CPUS = list(range(8))
+
+
+def test_parallel_jobs_share_the_cores():
+    governor = CpuGovernor(Config({"max_parallel_jobs": 2, "governor": {"affinity": True}}), CPUS)
+    first = governor.acquire()
+    second = governor.acquire()
+    assert (first.threads, second.threads) == (4, 4)
+    # 各任务绑定到互不重叠的核心
+    assert sorted(first.cpus + second.cpus) == CPUS
+
+    governor.release(first)
+    third = governor.acquire()
+    assert third.threads == 4
+    assert not set(third.cpus) & set(second.cpus)
+
+
+def test_a_job_alone_keeps_the_encoder_default():
+    governor = CpuGovernor(Config({"max_parallel_jobs": 1}), CPUS)
+    allotment = governor.acquire()
+    assert allotment.threads == 0
+    assert allotment.cpus is None
+    governor.release(allotment)
+
+
+def test_fixed_threads_and_split():
+    governor = CpuGovernor(Config({"max_parallel_jobs": 4, "governor": {"threads": 3, "nice": 5}}), CPUS)
+    allotment = governor.acquire()
+    assert (allotment.threads, allotment.nice) == (3, 5)
+    # 并行的分段平分任务的线程数，至少各一个
+    assert allotment.split(2).threads == 1
+    assert CpuAllotment(0, [0, 1, 2, 3]).split(2).threads == 2
+
+
+# 先启动几个线程再报告就绪，之后一直等待
+THREADED_CHILD = [sys.executable, "-c", "import threading, time\n"
+                  "for _ in range(3): threading.Thread(target=time.sleep, args=(30,), daemon=True).start()\n"
+                  "print('ready', flush=True)\ntime.sleep(30)"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="per-thread affinity and priority are Linux only")
+def test_limits_reach_every_thread_of_the_encoder():
+    process = subprocess.Popen(THREADED_CHILD, stdout=subprocess.PIPE)
+    try:
+        assert process.stdout.readline().strip() == b"ready"
+        CpuAllotment(0, [0], nice=5).apply(process)
+        threads = [int(tid) for tid in os.listdir(f"/proc/{process.pid}/task")]
+        assert len(threads) == 4
+        for tid in threads:
+            assert os.sched_getaffinity(tid) == {0}
+            assert os.getpriority(os.PRIO_PROCESS, tid) == 5
+    finally:
+        process.kill()
+        process.wait()
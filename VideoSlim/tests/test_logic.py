@@ -0,0 +1,164 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from queue import Empty, Queue
+
+from src import logic
+from src.config import Config
+from src.logic import compression_files, get_output_filename, iter_video_files
+from src.message import (CompressionErrorMessage, CompressionFinishedMessage, CompressionProgressMessage,
+                         CompressionStartMessage, WarningMessage)
+from src.settings import META_INFO
+
+
+def run_watched_batch(tmp_path, config: Config, tools: dict[str, str], clips: list[str]) -> list:
+    """
+    以不会自行结束的输入（如目录监视）运行 compression_files，等到第一个任务开始或出错后停止输入
+    :return: 收到的消息
+    """
+    stop = threading.Event()
+
+    def watch():
+        yield from clips
+        stop.wait()
+
+    queue = Queue()
+    thread = threading.Thread(target=compression_files, daemon=True,
+                              args=(queue, config, False, False, watch(), False, META_INFO["VIDEO_EXTENSIONS"],
+                                    str(tmp_path / "temp"), None, tools, True))
+    thread.start()
+    messages = []
+    try:
+        while True:
+            message = queue.get(timeout=10)
+            messages.append(message)
+            if isinstance(message, (CompressionProgressMessage, CompressionErrorMessage)):
+                return messages
+    except Empty:
+        return messages
+    finally:
+        stop.set()
+        thread.join(30)
+        assert not thread.is_alive()
+
+
+def test_watch_mode_ignores_dedup(tmp_path, stub_tools, clips):
+    config = Config({"dedup": {"enabled": True}, "metrics": {"records_file": ""}})
+    messages = run_watched_batch(tmp_path, config, stub_tools, clips)
+    assert any(isinstance(message, WarningMessage) for message in messages)
+    assert isinstance(messages[-1], CompressionProgressMessage)
+
+
+def test_watch_mode_rejects_cost_schedule(tmp_path, stub_tools, clips):
+    config = Config({"schedule": {"mode": "cost"}, "metrics": {"records_file": ""}})
+    messages = run_watched_batch(tmp_path, config, stub_tools, clips)
+    assert isinstance(messages[-1], CompressionErrorMessage)
+    assert "cost" in messages[-1].message
+
+
+def test_watch_mode_rejects_deadline(tmp_path, stub_tools, clips):
+    config = Config({"throughput": {"mode": "deadline", "deadline": "23:59"}, "metrics": {"records_file": ""}})
+    messages = run_watched_batch(tmp_path, config, stub_tools, clips)
+    assert isinstance(messages[-1], CompressionErrorMessage)
+    assert "deadline" in messages[-1].message
+
+
+def test_parallel_jobs_get_their_own_temp_dirs(tmp_path, run_batch, clips, monkeypatch):
+    temp_dirs = []
+    running = []
+    lock = threading.Lock()
+    run_stage_graph = logic.run_stage_graph
+    get_dir_size = logic.get_dir_size
+
+    def count_running(stages, job):
+        # 记录同时执行的任务数，稍作停留让并行任务有机会重叠
+        with lock:
+            running.append(running[-1] + 1 if running else 1)
+        time.sleep(0.2)
+        try:
+            return run_stage_graph(stages, job)
+        finally:
+            with lock:
+                running.append(running[-1] - 1)
+
+    def record_temp_dir(temp_dir):
+        # 各阶段结束后统计中间文件大小时取得任务的临时目录
+        temp_dirs.append(temp_dir)
+        return get_dir_size(temp_dir)
+
+    monkeypatch.setattr(logic, "run_stage_graph", count_running)
+    monkeypatch.setattr(logic, "get_dir_size", record_temp_dir)
+    messages = run_batch(clips, {"max_parallel_jobs": 3})
+
+    assert not [message for message in messages if isinstance(message, CompressionErrorMessage)]
+    assert 1 < max(running) <= 3
+    assert len(set(temp_dirs)) == len(clips)
+    assert not any(os.path.exists(temp_dir) for temp_dir in temp_dirs)
+    assert os.listdir(tmp_path / "temp") == []
+    for clip in clips:
+        assert os.path.getsize(get_output_filename(clip)) > 0
+
+
+def test_batch_reports_every_index(run_batch, clips):
+    messages = run_batch(clips, {"max_parallel_jobs": 2})
+    assert isinstance(messages[0], CompressionStartMessage)
+    started = [message for message in messages if isinstance(message, CompressionProgressMessage)]
+    assert sorted(message.current for message in started) == list(range(1, len(clips) + 1))
+    assert sorted(message.file_name for message in started) == sorted(clips)
+    assert isinstance(messages[-1], CompressionFinishedMessage)
+    assert messages[-1].total == len(clips)
+
+
+def test_discovery_skips_outputs_and_links(tmp_path):
+    (tmp_path / "a.mp4").write_bytes(b"video")
+    (tmp_path / "a_x264.mp4").write_bytes(b"output")
+    (tmp_path / "notes.txt").write_bytes(b"text")
+    os.link(tmp_path / "a.mp4", tmp_path / "b.mp4")
+    files = list(iter_video_files([str(tmp_path)], True, META_INFO["VIDEO_EXTENSIONS"]))
+    # 硬链接指向同一个文件，只压缩一次
+    assert len(files) == 1 and os.path.basename(files[0]) in ("a.mp4", "b.mp4")
+    # 不递归时忽略目录
+    assert list(iter_video_files([str(tmp_path)], False, META_INFO["VIDEO_EXTENSIONS"])) == []
+
+
+def test_discovery_survives_symlink_loops(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.mp4").write_bytes(b"video")
+    os.symlink(tmp_path, tmp_path / "sub" / "loop")
+    assert list(iter_video_files([str(tmp_path)], True, META_INFO["VIDEO_EXTENSIONS"])) == [
+        str(tmp_path / "sub" / "a.mp4")]
+
+
+def test_discovery_is_iterative_and_lazy(tmp_path, monkeypatch):
+    depth = 200
+    (tmp_path / "first.mp4").write_bytes(b"video")
+    directory = tmp_path
+    for _ in range(depth):
+        directory = directory / "d"
+        directory.mkdir()
+    (directory / "deep.mp4").write_bytes(b"video")
+
+    scanned = []
+    scandir = os.scandir
+
+    def count_scandir(path):
+        scanned.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", count_scandir)
+    files = iter_video_files([str(tmp_path)], True, META_INFO["VIDEO_EXTENSIONS"])
+    # 第一个文件在扫描其余目录之前就交出
+    assert next(files) == str(tmp_path / "first.mp4")
+    assert len(scanned) == 1
+
+    # 递归深度上限远小于目录树深度，逐层递归的遍历会失败
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(traceback.extract_stack()) + 50)
+    try:
+        rest = list(files)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert rest == [str(directory / "deep.mp4")]
+    assert len(scanned) == depth + 1
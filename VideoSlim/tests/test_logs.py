@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue
+
+from src import logs
+from src.logs import (ContextFilter, EncoderLog, JsonFormatter, LogQueueHandler, bind_log_context,
+                      open_encoder_log, reset_log_context, submit_with_context)
+
+
+def test_encoder_log_keeps_the_start_and_the_end(tmp_path):
+    path = tmp_path / "job.log"
+    log = EncoderLog(str(path), max_bytes=2000)
+    for i in range(1000):
+        log.write(f"line {i}", "x264")
+    log.close()
+
+    text = path.read_text(encoding="utf-8")
+    assert text.startswith("[x264] line 0\n")
+    assert text.endswith("[x264] line 999\n")
+    assert "省略" in text
+    assert len(text.encode("utf-8")) < 2100
+
+
+def test_records_carry_the_job_context_across_threads():
+    queue = SimpleQueue()
+    handler = LogQueueHandler(queue)
+    handler.addFilter(ContextFilter())
+    logger = logging.getLogger("test_logs")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        token = bind_log_context(file_path="a.mp4", job=3)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            submit_with_context(executor, logger.info, "编码完成").result()
+        reset_log_context(token)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("失败")
+    finally:
+        logger.removeHandler(handler)
+
+    formatter = JsonFormatter()
+    finished = json.loads(formatter.format(queue.get()))
+    assert (finished["message"], finished["file_path"], finished["job"]) == ("编码完成", "a.mp4", 3)
+    failed = json.loads(formatter.format(queue.get()))
+    assert "file_path" not in failed
+    assert "ValueError: boom" in failed["exception"]
+
+
+def test_old_encoder_logs_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "_job_log_dir", str(tmp_path))
+    monkeypatch.setattr(logs, "JOB_LOG_KEEP", 3)
+    for index in range(1, 6):
+        open_encoder_log(f"/videos/clip {index}.mp4", index).close()
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 3
+    assert names[-1].endswith("_0005_clip_5.log")
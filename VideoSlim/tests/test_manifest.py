@@ -0,0 +1,55 @@
+import os
+
+from src.manifest import Manifest, get_path_key
+
+
+def test_extend_skips_duplicates_and_blank_lines():
+    manifest = Manifest()
+    assert manifest.extend(["a.mp4", " ", "b.mp4", "a.mp4", os.path.join(".", "b.mp4")]) == 2
+    assert list(manifest.iter_paths()) == ["a.mp4", "b.mp4"]
+    assert len(manifest) == 2 and manifest[1] == "b.mp4"
+
+
+def test_path_key_normalizes_relative_paths():
+    assert get_path_key("a.mp4") == get_path_key(os.path.abspath("a.mp4"))
+
+
+def test_remove_rows():
+    manifest = Manifest()
+    manifest.extend(["a.mp4", "b.mp4", "c.mp4", "d.mp4"])
+    assert manifest.remove([0, 2, 7]) == 2
+    assert list(manifest.iter_paths()) == ["b.mp4", "d.mp4"]
+    # 删除后可以再次添加
+    assert manifest.extend(["a.mp4"]) == 1
+    assert manifest.remove([]) == 0
+
+
+def test_clear():
+    manifest = Manifest()
+    manifest.extend(["a.mp4"])
+    manifest.clear()
+    assert len(manifest) == 0
+    assert manifest.extend(["a.mp4"]) == 1
+
+
+def test_listeners_are_notified_of_changes_only():
+    manifest = Manifest()
+    changes = []
+    manifest.subscribe(lambda: changes.append(len(manifest)))
+    manifest.extend(["a.mp4", "b.mp4"])
+    manifest.extend(["a.mp4"])
+    manifest.remove([5])
+    manifest.remove([0])
+    manifest.clear()
+    assert changes == [2, 1, 0]
+
+
+def test_running_iterator_is_not_affected_by_changes():
+    manifest = Manifest()
+    manifest.extend(["a.mp4", "b.mp4"])
+    paths = manifest.iter_paths()
+    assert next(paths) == "a.mp4"
+    manifest.extend(["c.mp4"])
+    manifest.remove([1])
+    manifest.clear()
+    assert list(paths) == ["b.mp4"]
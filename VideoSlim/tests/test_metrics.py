@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+import time
+
+from src.metrics import get_stage_kind, wait_process
+
+
+def test_child_resource_usage_is_collected():
+    command = [sys.executable, "-c", "import sys; sys.stdout.write('x' * 1000000)"]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    stats = wait_process(process, command, started)
+    assert stats.exit_code == 0
+    assert stats.wall_seconds > 0
+    if sys.platform.startswith("linux"):
+        assert stats.user_seconds + stats.system_seconds > 0
+        assert stats.peak_rss > 0
+        assert stats.write_bytes >= 1000000
+
+
+def test_numbered_stages_are_summed_by_kind():
+    assert get_stage_kind("audio_1") == "audio"
+    assert get_stage_kind("extract_audio_0") == "extract_audio"
+    assert get_stage_kind("video") == "video"
+
+
+def test_batch_exports_records_and_prometheus(tmp_path, run_batch, clips):
+    records_file = tmp_path / "metrics" / "records.jsonl"
+    prometheus_file = tmp_path / "metrics" / "videoslim.prom"
+    run_batch(clips, {"metrics": {"records_file": str(records_file), "prometheus_file": str(prometheus_file)}})
+
+    records = [json.loads(line) for line in records_file.read_text(encoding="utf-8").splitlines()]
+    jobs, batch = records[:-1], records[-1]
+    assert sorted(job["file"] for job in jobs) == sorted(clips)
+    assert all(job["status"] == "ok" and job["stages"] for job in jobs)
+    assert batch["type"] == "batch"
+    assert batch["files"]["ok"] == len(clips)
+    assert batch["stages"]["video"]["count"] == len(clips)
+
+    prometheus = prometheus_file.read_text(encoding="utf-8")
+    assert f'videoslim_batch_files{{status="ok"}} {len(clips)}' in prometheus
+    assert 'videoslim_stage_runs{stage="video"}' in prometheus
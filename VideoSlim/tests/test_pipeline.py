@@ -0,0 +1,127 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from src.metrics import JobMetrics
+from src.pipeline import Stage, run_pipeline, run_stage_graph
+
+# 不停向 stdout 写数据的上游命令，下游不读时会阻塞在写管道上
+ENDLESS_WRITER = [sys.executable, "-c", "import sys\nwhile True: sys.stdout.write('y\\n' * 2048)"]
+
+
+def run_with_timeout(target, timeout: float = 10.0):
+    """在线程中运行 target，超时未结束时测试失败；返回其抛出的异常"""
+    errors = []
+
+    def run():
+        try:
+            target()
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_pipeline hung"
+    return errors[0] if errors else None
+
+
+def test_single_command_output():
+    lines = []
+    run_pipeline([[sys.executable, "-c", "import sys; sys.stderr.write('a\\rb\\nc')"]], on_output=lines.append)
+    assert lines == ["a", "b", "c"]
+
+
+def test_pipe_passes_data(tmp_path):
+    output = tmp_path / "out.txt"
+    run_pipeline([[sys.executable, "-c", "print('hello')"],
+                  [sys.executable, "-c", f"import sys; open({str(output)!r}, 'w').write(sys.stdin.read())"]])
+    assert output.read_text().strip() == "hello"
+
+
+def test_output_does_not_reach_our_stdout(capfd):
+    # 命令行模式的 stdout 只能有 JSON 行
+    run_pipeline([[sys.executable, "-c", "print('encoder output')"]])
+    assert capfd.readouterr().out == ""
+
+
+def test_failing_command_raises():
+    with pytest.raises(subprocess.CalledProcessError):
+        run_pipeline([[sys.executable, "-c", "print('x')"], [sys.executable, "-c", "raise SystemExit(3)"]])
+
+
+def test_downstream_that_cannot_start_does_not_hang():
+    error = run_with_timeout(lambda: run_pipeline([ENDLESS_WRITER, ["/nonexistent/x264"]]))
+    assert isinstance(error, OSError)
+
+
+def test_failing_output_handler_does_not_hang():
+    def on_output(line: str):
+        raise RuntimeError("handler failed")
+
+    reader = [sys.executable, "-c", "import sys\nfor line in sys.stdin: sys.stderr.write(line[:8] + '\\n')"]
+    error = run_with_timeout(lambda: run_pipeline([ENDLESS_WRITER, reader], on_output=on_output))
+    assert isinstance(error, RuntimeError)
+
+
+def test_stats_are_recorded_for_every_process():
+    stats = []
+    run_pipeline([[sys.executable, "-c", "print(1)"], [sys.executable, "-c", "import sys; sys.stdin.read()"]],
+                 stats=stats)
+    assert [process.exit_code for process in stats] == [0, 0]
+
+
+def test_stage_graph_runs_dependencies_first():
+    order = []
+    lock = threading.Lock()
+
+    def action(name: str):
+        def run():
+            with lock:
+                order.append(name)
+        return run
+
+    run_stage_graph([
+        Stage("mux", depends=["video", "audio"], action=action("mux")),
+        Stage("video", action=action("video")),
+        Stage("audio", depends=["extract"], action=action("audio")),
+        Stage("extract", action=action("extract")),
+    ])
+    assert order.index("extract") < order.index("audio") < order.index("mux")
+    assert order.index("video") < order.index("mux")
+    assert len(order) == 4
+
+
+def test_stage_graph_runs_independent_stages_in_parallel():
+    # 两个阶段互相等待对方开始，只有同时运行时才能完成
+    barrier = threading.Barrier(2, timeout=5)
+    run_stage_graph([Stage("video", action=barrier.wait), Stage("audio", action=barrier.wait)])
+
+
+def test_stage_graph_stops_after_failure():
+    ran = []
+
+    def fail():
+        raise RuntimeError("video failed")
+
+    metrics = JobMetrics("a.mp4")
+    with pytest.raises(RuntimeError, match="video failed"):
+        run_stage_graph([Stage("video", action=fail), Stage("mux", depends=["video"], action=lambda: ran.append(1))],
+                        metrics)
+    assert ran == []
+    assert [(stage["name"], stage["ok"]) for stage in metrics.to_dict()["stages"]] == [("video", False)]
+
+
+def test_stage_graph_rejects_cyclic_dependencies():
+    with pytest.raises(ValueError):
+        run_stage_graph([Stage("a", depends=["b"], action=lambda: None),
+                         Stage("b", depends=["a"], action=lambda: None)])
+
+
+def test_stage_graph_runs_commands():
+    lines = []
+    run_stage_graph([Stage("echo", [[sys.executable, "-c", "import sys; sys.stderr.write('done')"]],
+                           on_output=lines.append)])
+    assert lines == ["done"]
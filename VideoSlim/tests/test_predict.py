@@ -0,0 +1,32 @@
+import os
+
+from src.config import Config
+from src.logic import get_output_filename
+from src.message import CompressionNotWorthMessage
+from src.predict import get_sample_starts, is_worth_predicting
+from src.probe import ProbeInfo
+
+
+def test_samples_are_spread_over_the_video():
+    starts = get_sample_starts(100, 3, 10)
+    assert starts == [20, 45, 70]
+    assert all(0 <= start and start + 10 <= 100 for start in starts)
+
+
+def test_short_videos_are_not_sampled():
+    config = Config({"predict": {"enabled": True, "samples": 3, "sample_duration": 10}})
+    assert is_worth_predicting(ProbeInfo({"file_size": 1000, "duration": 120}), config)
+    # 抽样时长接近完整编码时直接编码
+    assert not is_worth_predicting(ProbeInfo({"file_size": 1000, "duration": 60}), config)
+    assert not is_worth_predicting(ProbeInfo({"file_size": 1000, "duration": 120}), Config({}))
+
+
+def test_files_not_worth_compressing_are_kept(run_batch, clips):
+    # 替身编码器的抽样输出按源文件大小计算，预计输出比源文件大
+    clip = next(clip for clip in clips if os.path.basename(clip) == "hd_reencode_audio.mp4")
+    messages = run_batch([clip], {"predict": {"enabled": True, "samples": 3, "sample_duration": 5}})
+    skipped, = [message for message in messages if isinstance(message, CompressionNotWorthMessage)]
+    assert skipped.predicted_size > skipped.source_size
+    assert os.path.exists(clip)
+    assert not os.path.exists(get_output_filename(clip))
+
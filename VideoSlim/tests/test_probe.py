@@ -0,0 +1,79 @@
+import itertools
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from src import probe
+from src.probe import ProbeCache, ProbeInfo, Prober
+
+
+def make_probe(duration: float) -> ProbeInfo:
+    return ProbeInfo({"has_video": True, "duration": duration, "width": 640, "height": 360})
+
+
+def write_files(tmp_path, count: int) -> list[str]:
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"{i}.mp4"
+        path.write_bytes(b"video" * (i + 1))
+        paths.append(str(path))
+    return paths
+
+
+def test_cache_survives_reload_and_misses_changed_files(tmp_path):
+    path, = write_files(tmp_path, 1)
+    cache = ProbeCache(str(tmp_path / "probes.json"))
+    cache.put(path, make_probe(12.5))
+    cache.save()
+
+    cache = ProbeCache(str(tmp_path / "probes.json"))
+    assert cache.get(path).duration == 12.5
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert cache.get(path) is None
+
+
+def test_cache_evicts_the_least_recently_used(tmp_path, monkeypatch):
+    paths = write_files(tmp_path, 3)
+    # 每次取时间都晚一秒，使用顺序不会因为时钟精度而并列
+    clock = itertools.count(time.time())
+    monkeypatch.setattr(probe, "time", SimpleNamespace(time=lambda: next(clock)))
+    cache = ProbeCache(str(tmp_path / "probes.json"), max_entries=2)
+    for path in paths:
+        cache.put(path, make_probe(1))
+    cache.get(paths[0])
+    cache.save()
+
+    cache = ProbeCache(str(tmp_path / "probes.json"), max_entries=2)
+    assert cache.get(paths[0]) is not None
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[2]) is not None
+
+
+def test_prober_probes_in_parallel_and_once_per_file(tmp_path, monkeypatch):
+    paths = write_files(tmp_path, 2)
+    calls = []
+    # 两个探测同时进行时才能都通过屏障
+    barrier = threading.Barrier(2, timeout=5)
+
+    def probe_file(file_path):
+        calls.append(file_path)
+        barrier.wait()
+        return make_probe(1)
+
+    monkeypatch.setattr(probe, "probe_file", probe_file)
+    prober = Prober(ProbeCache(str(tmp_path / "probes.json")))
+    for path in paths + paths:
+        prober.submit(path)
+    assert [prober.get(path).duration for path in paths] == [1, 1]
+    assert sorted(calls) == sorted(paths)
+    prober.close()
+
+    # 缓存写入磁盘后，下一次运行不再调用 MediaInfo
+    calls.clear()
+    prober = Prober(ProbeCache(str(tmp_path / "probes.json")))
+    assert prober.get(paths[0]).duration == 1
+    assert calls == []
+    prober.close()
+    assert os.path.exists(tmp_path / "probes.json")
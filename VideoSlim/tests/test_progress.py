@@ -0,0 +1,56 @@
+import pytest
+
+from src.progress import BatchProgress, parse_x264_progress
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("[45.2%] 452/1000 frames, 38.52 fps, 1502.33 kb/s, eta 0:00:14", (452, 38.52, 1502.33)),
+    ("452 frames: 38.52 fps, 1502.33 kb/s", (452, 38.52, 1502.33)),
+    ("1 frames: 0.00 fps, 0.00 kb/s", (1, 0.0, 0.0)),
+    ("encoded 1000 frames, 38.52 fps, 1502.33 kb/s", (1000, 38.52, 1502.33)),
+])
+def test_parse_x264_progress(line, expected):
+    assert parse_x264_progress(line) == expected
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    "x264 [info]: profile High, level 4.0",
+    "x264 [info]: frame I:12    Avg QP:18.52  size: 41234",
+])
+def test_parse_x264_progress_ignores_other_lines(line):
+    assert parse_x264_progress(line) is None
+
+
+def test_progress_messages_are_throttled():
+    progress = BatchProgress(1, min_interval=60)
+    progress.start(1, "a.mp4", 100)
+    assert progress.update(1, 10, 10.0, 1000.0) is not None
+    assert progress.update(1, 20, 10.0, 1000.0) is None
+
+
+def test_progress_message_fields():
+    progress = BatchProgress(2, min_interval=0)
+    progress.start(1, "a.mp4", 100)
+    message = progress.update(1, 40, 10.0, 1000.0)
+    assert (message.current, message.total, message.frames_done, message.total_frames) == (1, 2, 40, 100)
+    assert message.file_eta == pytest.approx(6.0)
+    # 剩余 60 帧，加上一个尚未开始、按平均 100 帧估算的文件
+    assert message.batch_eta == pytest.approx(16.0)
+
+
+def test_batch_eta_ignores_files_without_frames():
+    progress = BatchProgress(5, min_interval=0)
+    # 跳过的文件与开始编码前失败的文件没有帧数，不应拉低平均值
+    progress.finish(1)
+    progress.finish(2)
+    progress.start(3, "c.mp4", 1000)
+    progress.finish(3)
+    progress.start(4, "d.mp4", 1000)
+    message = progress.update(4, 500, 100.0, 1000.0)
+    assert message.batch_eta == pytest.approx((500 + 1000) / 100.0)
+    assert progress.remaining_files() == 2
+
+
+def test_unknown_job_is_ignored():
+    assert BatchProgress(1).update(1, 10, 10.0, 1000.0) is None
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from src.config import Config
+from src.probe import ProbeCache, ProbeInfo, Prober
+from src.scheduler import estimate_cost, get_priority, predict_makespan, schedule_files
+
+
+def make_probe(frames: int, width: int = 1920, height: int = 1080) -> ProbeInfo:
+    return ProbeInfo({"has_video": True, "width": width, "height": height, "frame_rate": 25.0,
+                      "frame_count": frames, "duration": frames / 25.0})
+
+
+def test_estimate_cost_scales_with_pixels_and_preset():
+    cost = estimate_cost(make_probe(1000), 5)
+    assert cost > 0
+    assert estimate_cost(make_probe(2000), 5) == pytest.approx(2 * cost)
+    assert estimate_cost(make_probe(1000), 8) > cost > estimate_cost(make_probe(1000), 2)
+
+
+def test_estimate_cost_without_video_is_zero():
+    assert estimate_cost(None, 5) == 0.0
+    assert estimate_cost(ProbeInfo({"has_video": False}), 5) == 0.0
+
+
+def test_estimate_cost_falls_back_to_duration():
+    probe = ProbeInfo({"has_video": True, "width": 1280, "height": 720, "frame_rate": 30.0, "duration": 10.0})
+    assert estimate_cost(probe, 5) == estimate_cost(make_probe(300, 1280, 720), 5)
+
+
+def test_predict_makespan():
+    assert predict_makespan([4, 3, 3, 2], 2) == 6
+    assert predict_makespan([4, 3, 3, 2], 1) == 12
+    assert predict_makespan([], 4) == 0
+
+
+def test_get_priority_takes_the_highest_match():
+    priorities = {"*/urgent/*": 10, "*.mkv": 1}
+    assert get_priority("C:\\videos\\urgent\\a.mkv", priorities) == 10
+    assert get_priority("/videos/a.mkv", priorities) == 1
+    assert get_priority("/videos/a.mp4", priorities) == 0
+
+
+def test_schedule_files_orders_by_priority_then_cost(tmp_path):
+    frames = {"short.mp4": 100, "long.mp4": 3000, "medium.mp4": 1000, "urgent_short.mp4": 50}
+    cache = ProbeCache(str(tmp_path / "probes.json"))
+    paths = []
+    for name, count in frames.items():
+        path = tmp_path / name
+        path.write_bytes(b"x")
+        cache.put(str(path), make_probe(count))
+        paths.append(str(path))
+    config = Config({"max_parallel_jobs": 2, "schedule": {"mode": "cost", "priorities": {"*urgent*": 1}}})
+    prober = Prober(cache)
+    try:
+        plan = schedule_files(paths, config, prober)
+    finally:
+        prober.close()
+
+    assert [os.path.basename(path) for path in plan.file_paths] == \
+        ["urgent_short.mp4", "long.mp4", "medium.mp4", "short.mp4"]
+    assert plan.costs[1:] == sorted(plan.costs[1:], reverse=True)
+    assert plan.makespan == predict_makespan(plan.costs, 2)
+
+
+def test_schedule_files_keeps_files_that_cannot_be_probed(tmp_path):
+    prober = Prober(ProbeCache(str(tmp_path / "probes.json")))
+    try:
+        plan = schedule_files([str(tmp_path / "missing.mp4")], Config({}), prober)
+    finally:
+        prober.close()
+    assert plan.costs == [0.0]
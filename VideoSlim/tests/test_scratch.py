@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import namedtuple
+
+import pytest
+
+from src import scratch
+from src.scratch import RUN_DIR_PREFIX, ScratchManager
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+def limit_free_space(monkeypatch, free: dict):
+    """让 free 中的各目录报告给定的剩余空间（字节）"""
+    monkeypatch.setattr(scratch.shutil, "disk_usage", lambda root: DiskUsage(0, 0, free[root]))
+
+
+def test_jobs_go_to_the_first_root_with_room(tmp_path, monkeypatch):
+    hot, disk = str(tmp_path / "hot"), str(tmp_path / "disk")
+    limit_free_space(monkeypatch, {hot: 100, disk: 10000})
+    manager = ScratchManager([hot, disk])
+
+    first = manager.acquire(80, 1)
+    assert first.startswith(hot)
+    # 热目录剩余的 20 字节不够，第二个任务放到下一个目录
+    second = manager.acquire(80, 2)
+    assert second.startswith(disk)
+
+    manager.release(first)
+    assert not os.path.exists(first)
+    assert manager.acquire(80, 3).startswith(hot)
+    manager.close()
+    assert not [name for name in os.listdir(hot) if name.startswith(RUN_DIR_PREFIX)]
+
+
+def test_job_waits_until_there_is_room(tmp_path, monkeypatch):
+    root = str(tmp_path / "root")
+    limit_free_space(monkeypatch, {root: 100})
+    manager = ScratchManager([root])
+    first = manager.acquire(80, 1)
+
+    acquired = []
+    waiting = threading.Thread(target=lambda: acquired.append(manager.acquire(80, 2)))
+    waiting.start()
+    waiting.join(0.2)
+    assert waiting.is_alive()
+
+    manager.release(first)
+    waiting.join(5)
+    assert acquired and os.path.isdir(acquired[0])
+    manager.release(acquired[0])
+    # 没有其他任务在运行时仍放不下，不再等待
+    with pytest.raises(OSError):
+        manager.acquire(200, 3)
+    manager.close()
+
+
+def test_directories_of_crashed_runs_are_removed(tmp_path):
+    root = str(tmp_path / "root")
+    running = ScratchManager([root])
+    job = running.acquire(0, 1)
+    crashed = os.path.join(root, RUN_DIR_PREFIX + "crashed")
+    os.makedirs(crashed)
+
+    # 新的管理器只删除没有进程持有锁的运行目录
+    ScratchManager([root]).close()
+    assert not os.path.exists(crashed)
+    assert os.path.isdir(job)
+    running.close()
+    assert not os.path.exists(job)
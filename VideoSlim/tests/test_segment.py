@@ -0,0 +1,66 @@
+import os
+import threading
+
+import pytest
+
+from src import segment
+from src.config import Config
+from src.probe import ProbeInfo
+from src.segment import encode_segmented, should_segment, verify_output
+
+TOOLS = {"ffmpeg": "ffmpeg", "x264": "x264", "neroaacenc": "neroaacenc", "mp4box": "mp4box"}
+
+
+def make_probe(duration: float, frame_count: int = 0) -> ProbeInfo:
+    return ProbeInfo({"has_video": True, "duration": duration, "frame_rate": 30.0, "frame_count": frame_count,
+                      "width": 1280, "height": 720})
+
+
+def test_only_long_files_are_segmented():
+    config = Config({"segment": {"enabled": True, "min_duration": 600, "segment_duration": 300}})
+    assert should_segment(make_probe(3600), config)
+    assert not should_segment(make_probe(300), config)
+    assert not should_segment(make_probe(3600), Config({}))
+
+
+def test_segments_are_encoded_in_parallel_and_joined_in_order(tmp_path, monkeypatch):
+    segments = 3
+    # 各分段的 x264 同时运行时才能都通过屏障
+    barrier = threading.Barrier(segments, timeout=5)
+    joined = []
+    reports = []
+
+    def run_pipeline(commands, on_output=None, stats=None, cpu=None, log=None):
+        command = commands[-1]
+        if command[0] == "ffmpeg":
+            pattern = command[-1]
+            for i in range(segments):
+                with open(pattern % i, "wb") as f:
+                    f.write(b"segment")
+        elif command[0] == "x264":
+            on_output("100 frames: 50.00 fps, 1000.00 kb/s")
+            barrier.wait()
+            with open(command[command.index("-o") + 1], "wb") as f:
+                f.write(b"encoded")
+        else:
+            joined.extend(os.path.basename(path) for path in command[2:-2:2])
+            with open(command[-1], "wb") as f:
+                f.write(b"joined")
+
+    monkeypatch.setattr(segment, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(segment, "probe_file", lambda path: make_probe(900, 300))
+    config = Config({"segment": {"enabled": True, "max_workers": segments}})
+    output = str(tmp_path / "video.mp4")
+    encode_segmented(str(tmp_path / "source.mp4"), make_probe(900, 300), config, str(tmp_path), output,
+                     lambda *progress: reports.append(progress), TOOLS)
+
+    assert joined == [f"seg_{i:05d}_x264.mp4" for i in range(segments)]
+    assert os.path.getsize(output) > 0
+    # 整个文件的进度是各分段进度之和
+    assert max(frames for frames, _, _ in reports) == 100 * segments
+
+
+def test_joined_output_must_match_the_source(monkeypatch):
+    monkeypatch.setattr(segment, "probe_file", lambda path: make_probe(900, 299))
+    with pytest.raises(ValueError):
+        verify_output(make_probe(900, 300), "joined.mp4")
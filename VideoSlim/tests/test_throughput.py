@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from src.config import Config
+from src.probe import ProbeInfo
+from src.scheduler import estimate_cost
+from src.throughput import PresetSelector, parse_deadline, with_preset
+
+# 1000 帧 1080p，preset 1 到 7 的估算耗时约为 8.6、12.1、17.3、24.2、34.6、48.4、76.0 秒
+PROBE = ProbeInfo({"has_video": True, "width": 1920, "height": 1080, "frame_rate": 25.0, "frame_count": 1000,
+                   "duration": 40.0})
+
+
+def make_selector(files_per_hour: float, min_preset: int = 0) -> PresetSelector:
+    return PresetSelector(Config({
+        "max_parallel_jobs": 1,
+        "x264": {"preset": 7},
+        "throughput": {"mode": "files_per_hour", "files_per_hour": files_per_hour, "min_preset": min_preset},
+    }))
+
+
+def test_off_keeps_the_configured_preset():
+    selector = PresetSelector(Config({"x264": {"preset": 7}}))
+    assert selector.select("a.mp4", PROBE, 10) == 7
+
+
+def test_generous_budget_keeps_the_configured_preset():
+    assert make_selector(1).select("a.mp4", PROBE, 10) == 7
+
+
+def test_slowest_preset_that_fits_the_budget_is_chosen():
+    # 每个文件 10 秒
+    assert make_selector(360).select("a.mp4", PROBE, 10) == 1
+
+
+def test_preset_is_not_faster_than_min_preset():
+    assert make_selector(1_000_000, min_preset=3).select("a.mp4", PROBE, 10) == 3
+
+
+def test_measured_speed_corrects_the_estimate():
+    selector = make_selector(360)
+    # 本机比估算快 4 倍，preset 5 预计 8.6 秒，可以放进 10 秒的预算
+    selector.record(PROBE, 1, estimate_cost(PROBE, 1) / 4)
+    assert selector.select("a.mp4", PROBE, 10) == 5
+
+
+def test_with_preset_copies_the_config():
+    config = Config({"x264": {"preset": 7}})
+    file_config = with_preset(config, 3)
+    assert (file_config.X264.preset, config.X264.preset) == (3, 7)
+    assert file_config.X264.crf == config.X264.crf
+
+
+def test_parse_deadline():
+    now = datetime(2024, 5, 1, 12, 0)
+    assert parse_deadline("18:30", now) == datetime(2024, 5, 1, 18, 30)
+    assert parse_deadline("08:00", now) == datetime(2024, 5, 2, 8, 0)
+    assert parse_deadline("2024-05-03T08:00", now) == datetime(2024, 5, 3, 8, 0)
+    assert parse_deadline(" ", now) is None
+    with pytest.raises(ValueError):
+        parse_deadline("tomorrow", now)
@@ -0,0 +1,41 @@
+import os
+import threading
+
+from src.logic import iter_video_files
+from src.watch import FolderWatcher
+
+
+def next_file(watcher: FolderWatcher, files) -> str:
+    """取下一个就绪的文件，5 秒内没有则停止监视并返回 None"""
+    timer = threading.Timer(5, watcher.stop)
+    timer.start()
+    try:
+        return next(files, None)
+    finally:
+        timer.cancel()
+
+
+def test_poll_sees_a_file_rewritten_in_place(tmp_path):
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"first")
+    watcher = FolderWatcher([str(tmp_path)], [".mp4"], settle_time=0, poll_interval=0.01, use_inotify=False)
+    files = iter(watcher)
+    assert next_file(watcher, files) == str(path)
+
+    # 原地改写：目录的修改时间不变
+    dir_mtime = os.stat(tmp_path).st_mtime_ns
+    with open(path, "r+b") as f:
+        f.write(b"again")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert os.stat(tmp_path).st_mtime_ns == dir_mtime
+    assert next_file(watcher, files) == str(path)
+    watcher.stop()
+
+
+def test_watched_input_is_not_remembered(tmp_path):
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"video")
+    assert list(iter_video_files([str(path), str(path)], False, [".mp4"])) == [str(path)]
+    # FolderWatcher 已保证每个版本只交出一次，监视模式下不再记录所有交出过的文件
+    assert list(iter_video_files([str(path), str(path)], False, [".mp4"], unique=False)) == [str(path)] * 2